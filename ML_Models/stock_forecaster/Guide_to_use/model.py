@@ -1,9 +1,14 @@
 import joblib
 import os
+import sys
 import numpy as np
 import pandas as pd
 import json
 
+# BoosterPredictor is shared with New_ML_Models/Guide_to_use/guide.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+from booster_predictor import BoosterPredictor, benchmark_predictor
+
 def date_to_features(date):
     """
     Transforms a date to month feature.
@@ -48,20 +53,8 @@ class StockForecaster:
         """Get the MAE for a category"""
         return self.errors.get(category_name, None)
     
-    def predict(self, category_name, month, last_qty, day_of_week=None, is_weekend=None, is_holiday=None):
-        """
-        Predict demand for a category (supports both 2-feature and 5-feature models)
-        Args:
-            category_name: Category name (e.g., 'Beverages', 'Handhelds', 'Sodavand')
-            month: Month number (1-12)
-            last_qty: Last known quantity
-            day_of_week: Day of week (0-6, Monday=0) - optional, defaults to current day
-            is_weekend: Whether it's weekend (0 or 1) - optional, auto-calculated if not provided
-            is_holiday: Whether it's holiday (0 or 1) - optional, defaults to 0
-        Returns:
-            Predicted quantity (non-negative)
-        """
-        # Load model and scaler if not cached
+    def _load(self, category_name):
+        """Load (and cache) the model and scaler for a category"""
         if category_name not in self.model_cache:
             model_path = os.path.join(self.model_dir, f"{category_name}.joblib")
             scaler_path = os.path.join(self.scaler_dir, f"{category_name}_scaler.joblib")
@@ -69,15 +62,29 @@ class StockForecaster:
             if not os.path.exists(model_path):
                 raise ValueError(f"Model for category '{category_name}' not found. Available: {self.categories}")
             
-            self.model_cache[category_name] = joblib.load(model_path)
+            self.model_cache[category_name] = BoosterPredictor(joblib.load(model_path))
             
             if os.path.exists(scaler_path):
                 self.scaler_cache[category_name] = joblib.load(scaler_path)
             else:
                 self.scaler_cache[category_name] = None
         
-        model = self.model_cache[category_name]
-        scaler = self.scaler_cache[category_name]
+        return self.model_cache[category_name], self.scaler_cache[category_name]
+    
+    def predict(self, category_name, month, last_qty, day_of_week=None, is_weekend=None, is_holiday=None):
+        """
+        Predict demand for a category (supports both 2-feature and 5-feature models)
+        Args:
+            category_name: Category name (e.g., 'Beverages', 'Handhelds', 'Sodavand')
+            month: Month number (1-12)
+            last_qty: Last known quantity
+            day_of_week: Day of week (0-6, Monday=0) - optional, defaults to current day
+            is_weekend: Whether it's weekend (0 or 1) - optional, auto-calculated if not provided
+            is_holiday: Whether it's holiday (0 or 1) - optional, defaults to 0
+        Returns:
+            Predicted quantity (non-negative)
+        """
+        model, scaler = self._load(category_name)
         
         # Detect model feature count
         n_features = model.n_features_in_ if hasattr(model, 'n_features_in_') else 5
@@ -113,6 +120,69 @@ class StockForecaster:
         prediction = max(0, prediction)
         
         return prediction
+    
+    def predict_many(self, category_names, last_qty, number_of_days=1, start_date=None,
+                     is_holiday=0, multiplier=1.0):
+        """
+        Recursive daily forecasts for many series at once
+        
+        A series is one (category, starting quantity, holiday flag, multiplier)
+        combination, e.g. every category x scenario pair. All series advance
+        together: each day is one scaler.transform and one model.predict per
+        category over all of that category's series, instead of one call per
+        series per day. Each day's prediction (after the multiplier) is the
+        next day's last_qty, as in calling predict() in a loop.
+        
+        Args:
+            category_names: Category per series
+            last_qty: Starting quantity per series (scalar or array)
+            number_of_days: Days to forecast
+            start_date: First forecast date (defaults to tomorrow); month,
+                day_of_week and is_weekend are derived per day from it
+            is_holiday: 0/1 per series (scalar or array)
+            multiplier: Factor applied to each day's prediction per series,
+                e.g. 1.2 for an active campaign (scalar or array)
+        Returns:
+            Array of shape (n_series, number_of_days) with non-negative
+            daily quantities
+        """
+        category_names = np.asarray(category_names)
+        n_series = len(category_names)
+        qty = np.broadcast_to(np.asarray(last_qty, dtype=np.float64), (n_series,)).copy()
+        holiday = np.broadcast_to(np.asarray(is_holiday, dtype=np.float64), (n_series,))
+        multiplier = np.broadcast_to(np.asarray(multiplier, dtype=np.float64), (n_series,))
+        
+        if start_date is None:
+            start_date = pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+        dates = pd.date_range(pd.to_datetime(start_date), periods=number_of_days, freq='D')
+        
+        groups = []
+        for category_name in np.unique(category_names):
+            model, scaler = self._load(category_name)
+            n_features = model.n_features_in_ if hasattr(model, 'n_features_in_') else 5
+            rows = np.flatnonzero(category_names == category_name)
+            features = np.zeros((len(rows), n_features), dtype=np.float64)
+            if n_features != 2:
+                features[:, 2] = holiday[rows]
+            groups.append((rows, model, scaler, n_features, features))
+        
+        predictions = np.zeros((n_series, number_of_days), dtype=np.float64)
+        for day, date in enumerate(dates):
+            for rows, model, scaler, n_features, features in groups:
+                qty_scaled = scaler.transform(qty[rows].reshape(-1, 1))[:, 0] if scaler else qty[rows]
+                if n_features == 2:
+                    features[:, 0] = date.month
+                    features[:, 1] = qty_scaled
+                else:
+                    features[:, 0] = date.weekday()
+                    features[:, 1] = 1 if date.weekday() >= 5 else 0
+                    features[:, 3] = date.month
+                    features[:, 4] = qty_scaled
+                predictions[rows, day] = np.maximum(0, np.asarray(model.predict(features), dtype=np.float64))
+            predictions[:, day] *= multiplier
+            qty = predictions[:, day].copy()
+        
+        return predictions
 
 class Customer_Churn_Detection:
     """Check if customer will lose interest or not"""
@@ -205,7 +275,7 @@ class RevenuePredictor:
     """
     def __init__(self, models_dir="ML_Models"):
         self.model_path = os.path.join(models_dir, "revenue_predictor/revenue_predictor_xgb.pkl")
-        self.model = joblib.load(self.model_path)
+        self.model = BoosterPredictor(joblib.load(self.model_path))
         self.feature_names = ["is_weekend", "is_holiday", "lagged_revenue"]
         
         # Load metadata
@@ -244,6 +314,43 @@ if __name__ == '__main__':
         print("Beverages (month=1, qty=100):", stock_model.predict("Beverages", 1, 100))
         print("MAE for Beverages:", stock_model.get_mean_absolute_error("Beverages"))
     
+    # Batched vs looped inference: 10 categories x 100 scenarios x 30 days
+    categories = stock_model.categories[:10]
+    if categories:
+        import time
+        number_of_days, scenarios = 30, 100
+        series = np.repeat(categories, scenarios)
+        start_qty = np.tile(np.linspace(10, 500, scenarios), len(categories))
+        start_date = pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+        dates = pd.date_range(start_date, periods=number_of_days, freq='D')
+        stock_model.predict_many(categories, 50.0, 1)  # load models
+        
+        started = time.perf_counter()
+        looped = np.zeros((len(series), number_of_days))
+        for i, (category, qty) in enumerate(zip(series, start_qty)):
+            for day, date in enumerate(dates):
+                qty = stock_model.predict(category, date.month, qty, day_of_week=date.weekday(), is_holiday=0)
+                looped[i, day] = qty
+        loop_seconds = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        batched = stock_model.predict_many(series, start_qty, number_of_days, start_date=start_date)
+        batch_seconds = time.perf_counter() - started
+        
+        print(f"\npredict() loop:  {loop_seconds:.2f}s for {len(series)} series x {number_of_days} days")
+        print(f"predict_many(): {batch_seconds:.3f}s ({loop_seconds / batch_seconds:.0f}x faster, "
+              f"max abs diff {np.abs(looped - batched).max():.2e})")
+        
+        # sklearn wrapper vs native booster, single row and 1,000 rows
+        print("\nXGBRegressor.predict vs BoosterPredictor.predict:")
+        for category in categories:
+            model = joblib.load(os.path.join(stock_model.model_dir, f"{category}.joblib"))
+            n_features = getattr(model, 'n_features_in_', 5)
+            for rows in (1, 1000):
+                wrapper, booster, diff = benchmark_predictor(model, n_features, rows)
+                print(f"  {category:<22} {rows:>5} rows: {wrapper * 1e6:8.1f}us -> {booster * 1e6:8.1f}us "
+                      f"({wrapper / booster:.1f}x, max abs diff {diff:.1e})")
+    
     print("\n" + "=" * 60)
     print("All ML Models Loaded Successfully!")
     print("=" * 60)
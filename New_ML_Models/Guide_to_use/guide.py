@@ -1,9 +1,219 @@
 import joblib
 import os
+import sys
 import numpy as np
 import pandas as pd
 import json
 
+# BoosterPredictor is shared with ML_Models/stock_forecaster/Guide_to_use/model.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from booster_predictor import BoosterPredictor, benchmark_predictor
+
+def _scaler_functions(scaler):
+    """
+    (transform, inverse) on 1-D float64 arrays, doing the same arithmetic as
+    the fitted StandardScaler/MinMaxScaler so results match bit for bit
+    """
+    if hasattr(scaler, 'with_mean') and hasattr(scaler, 'with_std'):
+        mean = float(scaler.mean_[0]) if scaler.with_mean else 0.0
+        scale = float(scaler.scale_[0]) if scaler.with_std else 1.0
+        return (lambda x: (x - mean) / scale), (lambda x: x * scale + mean)
+    if hasattr(scaler, 'data_range_') and not getattr(scaler, 'clip', False):
+        scale, offset = float(scaler.scale_[0]), float(scaler.min_[0])
+        return (lambda x: x * scale + offset), (lambda x: (x - offset) / scale)
+    return (
+        lambda x: scaler.transform(x.reshape(-1, 1))[:, 0],
+        lambda x: scaler.inverse_transform(x.reshape(-1, 1))[:, 0]
+    )
+
+def qty_thresholds(booster, feature=1):
+    """
+    Sorted unique float32 split thresholds on one feature across all trees
+    (read from the JSON model, so they are the exact values XGBoost compares)
+    """
+    learner = json.loads(booster.save_raw(raw_format='json'))['learner']
+    gbm = learner['gradient_booster']
+    if gbm['name'] == 'dart':
+        gbm = gbm['gbtree']
+    if gbm['name'] != 'gbtree':
+        raise ValueError(f"Cannot compile a '{gbm['name']}' booster")
+    thresholds = []
+    for tree in gbm['model']['trees']:
+        left = np.asarray(tree['left_children'])
+        split = (left != -1) & (np.asarray(tree['split_indices']) == feature)
+        thresholds.append(np.asarray(tree['split_conditions'], dtype=np.float32)[split])
+    return np.unique(np.concatenate(thresholds)) if thresholds else np.zeros(0, dtype=np.float32)
+
+class CompiledStockForecaster:
+    """
+    Lookup-table form of StockForecaster's [month, qty_scaled] models
+
+    For a fixed month a tree ensemble is a step function of qty_scaled that
+    only changes at split thresholds (XGBoost goes left when x < threshold,
+    in float32). Per category and month the compiler keeps the sorted
+    thresholds and the model's output on each interval, evaluated once at the
+    interval's left end, so a prediction is one np.searchsorted.
+
+    After the first day a forecast can only take one of those interval
+    values, so each interval also stores the interval the next day falls in.
+    All (category, month) tables share one state space: a recursive forecast
+    is one searchsorted per series to find the starting state, then one
+    integer gather per day for all series and categories together.
+    """
+    def __init__(self, forecaster, months=range(1, 13)):
+        self.tables = {}
+        state_qty, next_state = [], []
+        offset = 0
+        for cat, model in forecaster.model.items():
+            booster = getattr(model, 'booster', None)
+            if booster is None or getattr(model, 'n_features_in_', 2) != 2:
+                continue
+            thresholds = qty_thresholds(booster)
+            transform, inverse = _scaler_functions(forecaster.scaler[cat])
+            left_ends = np.concatenate([
+                [np.nextafter(thresholds[0], np.float32(-np.inf)) if len(thresholds) else np.float32(0)],
+                thresholds
+            ]).astype(np.float32)
+            for month in months:
+                X = np.column_stack([np.full(len(left_ends), month, dtype=np.float32), left_ends])
+                qty = inverse(np.asarray(model.predict(X), dtype=np.float64))
+                following = np.searchsorted(thresholds, transform(qty).astype(np.float32), side='right')
+                self.tables[(cat, int(month))] = (offset, thresholds, transform)
+                state_qty.append(qty)
+                next_state.append(offset + following)
+                offset += len(left_ends)
+        self.state_qty = np.concatenate(state_qty) if state_qty else np.zeros(0)
+        self.next_state = np.concatenate(next_state) if next_state else np.zeros(0, dtype=np.int64)
+
+    def covers(self, category_names, months):
+        months = np.broadcast_to(np.asarray(months), (len(category_names),))
+        return all(
+            float(month).is_integer() and (cat, int(month)) in self.tables
+            for cat, month in set(zip(np.asarray(category_names).tolist(), months.tolist()))
+        )
+
+    def predict_many(self, category_names, months, last_qty, number_of_days=1):
+        """Same contract as StockForecaster.predict_many"""
+        category_names = np.asarray(category_names)
+        n_series = len(category_names)
+        qty = np.broadcast_to(np.asarray(last_qty, dtype=np.float64), (n_series,))
+        months = np.broadcast_to(np.asarray(months), (n_series,)).astype(np.int64)
+
+        state = np.zeros(n_series, dtype=np.int64)
+        for cat, month in set(zip(category_names.tolist(), months.tolist())):
+            rows = np.flatnonzero((category_names == cat) & (months == month))
+            offset, thresholds, transform = self.tables[(cat, month)]
+            state[rows] = offset + np.searchsorted(thresholds, transform(qty[rows]).astype(np.float32), side='right')
+
+        predictions = np.zeros((n_series, number_of_days), dtype=np.float64)
+        for day in range(number_of_days):
+            predictions[:, day] = self.state_qty[state]
+            state = self.next_state[state]
+        return np.maximum(0, predictions)
+
+    def save(self, directory, sources=None):
+        """
+        Write the tables as uncompressed .npy arrays plus index.json, so
+        load() can memory-map them. sources (category -> model file stamp)
+        lets load() detect retrained models.
+        """
+        os.makedirs(directory, exist_ok=True)
+        index, thresholds, start = [], [], 0
+        for (cat, month), (offset, cat_thresholds, _) in self.tables.items():
+            index.append([cat, month, int(offset), start, start + len(cat_thresholds)])
+            thresholds.append(np.asarray(cat_thresholds, dtype=np.float32))
+            start += len(cat_thresholds)
+        arrays = {
+            'state_qty': np.ascontiguousarray(self.state_qty, dtype=np.float64),
+            'next_state': np.ascontiguousarray(self.next_state, dtype=np.int64),
+            'thresholds': np.concatenate(thresholds) if thresholds else np.zeros(0, dtype=np.float32),
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+        with open(os.path.join(directory, "index.json"), 'w', encoding='utf-8') as f:
+            json.dump({'tables': index, 'sources': sources or {}}, f)
+
+    @classmethod
+    def load(cls, directory, scalers, sources=None, mmap_mode='r'):
+        """
+        Tables written by save(), mapped read-only by default so every
+        process using them shares one copy through the page cache. Returns
+        None when the directory is missing or sources differ from the
+        stamps it was saved with.
+        """
+        path = os.path.join(directory, "index.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if sources is not None and index['sources'] != sources:
+            return None
+        compiled = cls.__new__(cls)
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ('state_qty', 'next_state', 'thresholds')
+        }
+        compiled.state_qty, compiled.next_state = arrays['state_qty'], arrays['next_state']
+        compiled.tables = {}
+        for cat, month, offset, start, end in index['tables']:
+            transform, _ = _scaler_functions(scalers[cat])
+            compiled.tables[(cat, int(month))] = (offset, arrays['thresholds'][start:end], transform)
+        return compiled
+
+def file_stamp(path):
+    """Size and modification time of a file, as a string (changes on retrain)"""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+class _LazyModels(dict):
+    """Category -> model mapping that loads each model on first access"""
+    def __init__(self, categories, loader):
+        super().__init__()
+        self.categories = list(categories)
+        self.loader = loader
+
+    def __missing__(self, cat):
+        if cat not in self.categories:
+            raise KeyError(cat)
+        model = self[cat] = self.loader(cat)
+        return model
+
+    def __contains__(self, cat):
+        return cat in self.categories
+
+    def __iter__(self):
+        return iter(self.categories)
+
+    def __len__(self):
+        return len(self.categories)
+
+    def keys(self):
+        return list(self.categories)
+
+    def items(self):
+        return [(cat, self[cat]) for cat in self.categories]
+
+def check_compiled_equivalence(forecaster, compiled, number_of_days=30, points=2000, rtol=1e-9):
+    """
+    Compare compiled and model predict_many for every category and month over
+    the whole quantity range: a grid from 0 to twice the largest threshold,
+    plus both sides of every threshold. Returns the max abs difference.
+    """
+    worst = 0.0
+    for (cat, month), (_, thresholds, _) in compiled.tables.items():
+        _, inverse = _scaler_functions(forecaster.scaler[cat])
+        edges = inverse(np.concatenate([
+            thresholds, np.nextafter(thresholds, np.float32(-np.inf))
+        ]).astype(np.float64))
+        top = max(float(edges.max()) if len(edges) else 0.0, 1.0) * 2
+        qty = np.concatenate([np.linspace(0, top, points), edges[edges >= 0]])
+        expected = forecaster.predict_many([cat] * len(qty), month, qty, number_of_days, use_compiled=False)
+        actual = compiled.predict_many([cat] * len(qty), month, qty, number_of_days)
+        if not np.allclose(actual, expected, rtol=rtol, atol=1e-9):
+            raise AssertionError(f"Compiled forecaster differs for {cat}, month {month}")
+        worst = max(worst, float(np.abs(actual - expected).max()))
+    return worst
+
 def date_to_features(date):
     """
     Transforms a date to day_of_week, is_weekend, is_holiday, month.
@@ -20,13 +230,20 @@ class StockForecaster:
     """
     Forecasts next day's stock quantity for a given item using per-category XGBoost models.
     """
-    def __init__(self):
+    def __init__(self, mapped=False):
+        """
+        Args:
+            mapped: Memory-map the compiled tables saved by save_compiled()
+                when they match the model files; the XGBoost models are then
+                only unpickled if a request falls outside the tables.
+        """
         # Paths - use relative paths from project root
         # model.py is in New_ML_Models/Guide_to_use/, so go up 2 levels to get project root
         current_file = os.path.abspath(__file__)
         base_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_file)))
         self.model_dir = os.path.join(base_dir, "New_ML_Models", "stock_forecaster", "models", "xgb_models") + os.sep
         self.scaler_dir = os.path.join(base_dir, "New_ML_Models", "stock_forecaster", "models", "scalers") + os.sep
+        self.compiled_dir = os.path.join(base_dir, "New_ML_Models", "stock_forecaster", "models", "compiled")
         
         self.model = {}
         self.scaler = {}
@@ -40,21 +257,52 @@ class StockForecaster:
         ]
 
         for cat in categories:
-            model_path = f"{self.model_dir}{cat}.joblib"
-            self.model[cat] = joblib.load(model_path)
             self.scaler[cat] = joblib.load(f"{self.scaler_dir}{cat}_scaler.joblib")
+
+        self.compiled = None
+        if mapped:
+            self.compiled = CompiledStockForecaster.load(self.compiled_dir, self.scaler, self.model_stamps(categories))
+        if self.compiled is not None:
+            self.model = _LazyModels(categories, self._load_model)
+        else:
+            for cat in categories:
+                self.model[cat] = self._load_model(cat)
             
         path = os.path.join(base_dir, "New_ML_Models", "stock_forecaster", "MSE.json")
         with open(path, 'r', encoding='utf-8') as f:
             self.errors = json.load(f)
         self.base_dir = base_dir  # Store for reference  
 
+    def _load_model(self, category_name):
+        return BoosterPredictor(joblib.load(f"{self.model_dir}{category_name}.joblib"))
+
+    def model_stamps(self, categories=None):
+        """file_stamp of each category's model and scaler files"""
+        return {
+            cat: [file_stamp(f"{self.model_dir}{cat}.joblib"), file_stamp(f"{self.scaler_dir}{cat}_scaler.joblib")]
+            for cat in (categories if categories is not None else self.model)
+        }
+
+    def compile(self):
+        """Build lookup tables (CompiledStockForecaster) that predict and predict_many use from then on"""
+        self.compiled = CompiledStockForecaster(self)
+        return self.compiled
+
+    def save_compiled(self):
+        """Compile if needed and write the tables for StockForecaster(mapped=True)"""
+        if self.compiled is None:
+            self.compile()
+        self.compiled.save(self.compiled_dir, self.model_stamps())
+        return self.compiled_dir
+
     def get_mean_absolute_error(self, category_name):        
         return self.errors[category_name]
 
     def predict(self, category_name, month, last_qty,number_of_days=1):
         if category_name not in self.model:
             raise ValueError(f"Category '{category_name}' not found.")
+        if self.compiled is not None and self.compiled.covers([category_name], month):
+            return float(self.compiled.predict_many([category_name], month, last_qty, number_of_days)[0, -1])
 
         model = self.model[category_name]
         scaler = self.scaler[category_name]
@@ -73,8 +321,50 @@ class StockForecaster:
 
             prediction = float(scaler.inverse_transform(prediction_scaled)[0][0])
         return max(0, prediction)
-    def stock_reorder_recommendation(self, category_name, month,last_qty,number_of_days,current_stock,multipler):
-        prediction = self.predict(category_name, month, last_qty, number_of_days)
+    def predict_many(self, category_names, months, last_qty, number_of_days=1, use_compiled=True):
+        """
+        Recursive forecasts for many series at once.
+        Each day is one scaler.transform, one model.predict and one
+        scaler.inverse_transform per category over all of its series,
+        instead of one of each per series per day.
+        Args:
+            category_names: Category per series
+            months: Month per series (scalar or array)
+            last_qty: Starting quantity per series (scalar or array)
+            number_of_days: Days to forecast
+            use_compiled: Use the lookup tables after compile() when they
+                cover every (category, month)
+        Returns:
+            Array of shape (n_series, number_of_days); the last column equals
+            predict(category, month, last_qty, number_of_days) per series.
+        """
+        category_names = np.asarray(category_names)
+        if use_compiled and self.compiled is not None and self.compiled.covers(category_names, months):
+            return self.compiled.predict_many(category_names, months, last_qty, number_of_days)
+        n_series = len(category_names)
+        qty = np.broadcast_to(np.asarray(last_qty, dtype=np.float64), (n_series,)).copy()
+        months = np.broadcast_to(np.asarray(months, dtype=np.float64), (n_series,))
+
+        groups = []
+        for cat in np.unique(category_names):
+            if cat not in self.model:
+                raise ValueError(f"Category '{cat}' not found.")
+            rows = np.flatnonzero(category_names == cat)
+            features = np.zeros((len(rows), 2), dtype=np.float64)
+            features[:, 0] = months[rows]
+            groups.append((rows, self.model[cat], self.scaler[cat], features))
+
+        predictions = np.zeros((n_series, number_of_days), dtype=np.float64)
+        for day in range(number_of_days):
+            for rows, model, scaler, features in groups:
+                features[:, 1] = scaler.transform(qty[rows].reshape(-1, 1))[:, 0]
+                prediction_scaled = np.asarray(model.predict(features), dtype=np.float64).reshape(-1, 1)
+                qty[rows] = scaler.inverse_transform(prediction_scaled)[:, 0]
+            predictions[:, day] = qty
+        return np.maximum(0, predictions)
+    def stock_reorder_recommendation(self, category_name, month,last_qty,number_of_days,current_stock,multipler,prediction=None):
+        if prediction is None:
+            prediction = self.predict(category_name, month, last_qty, number_of_days)
         reorder_qty = max(0, prediction - current_stock)
         reorder_qty = reorder_qty * multipler
         if reorder_qty > current_stock:
@@ -137,7 +427,7 @@ class RevenuePredictor:
         current_file = os.path.abspath(__file__)
         base_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_file)))
         self.model_path = os.path.join(base_dir, "New_ML_Models", "revenue_predictor", "revenue_predictor_xgb.pkl")
-        self.model = joblib.load(self.model_path)
+        self.model = BoosterPredictor(joblib.load(self.model_path))
         self.metadata_path = os.path.join(base_dir, "New_ML_Models", "revenue_predictor", "revenue_predictor_metadata.json")
         if os.path.exists(self.metadata_path):
             with open(self.metadata_path, "r") as f:
@@ -149,3 +439,55 @@ class RevenuePredictor:
         prediction = float(self.model.predict(features)[0])
         return max(0, prediction)
 model = Operational_risk_predictor()
+
+if __name__ == '__main__':
+    import time
+    # Batched vs looped inference: 10 categories x 100 scenarios x 30 days
+    forecaster = StockForecaster()
+    categories = list(forecaster.model)
+    number_of_days, scenarios = 30, 100
+    series = np.repeat(categories, scenarios)
+    start_qty = np.tile(np.linspace(10, 500, scenarios), len(categories))
+    month = pd.Timestamp.now().month
+
+    started = time.perf_counter()
+    looped = np.array([forecaster.predict(cat, month, qty, number_of_days) for cat, qty in zip(series, start_qty)])
+    loop_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batched = forecaster.predict_many(series, month, start_qty, number_of_days)
+    batch_seconds = time.perf_counter() - started
+
+    print(f"predict() loop:  {loop_seconds:.2f}s for {len(series)} series x {number_of_days} days")
+    print(f"predict_many(): {batch_seconds:.3f}s ({loop_seconds / batch_seconds:.0f}x faster, "
+          f"max abs diff {np.abs(looped - batched[:, -1]).max():.2e})")
+
+    # sklearn wrapper vs native booster: single row and 1,000 rows
+    revenue = RevenuePredictor()
+    models = [(f"category {cat}", forecaster.model[cat].model, 2) for cat in categories]
+    models.append(("revenue", revenue.model.model, 3))
+    print("\nXGBRegressor.predict vs BoosterPredictor.predict:")
+    for name, xgb_model, n_features in models:
+        for rows in (1, 1000):
+            wrapper, booster, diff = benchmark_predictor(xgb_model, n_features, rows)
+            print(f"  {name:<30} {rows:>5} rows: {wrapper * 1e6:8.1f}us -> {booster * 1e6:8.1f}us "
+                  f"({wrapper / booster:.1f}x, max abs diff {diff:.1e})")
+
+    # Lookup-table compilation: exactness over the full input range, then a
+    # 30-day recursive forecast for every category
+    started = time.perf_counter()
+    compiled = forecaster.compile()
+    print(f"\ncompile(): {time.perf_counter() - started:.2f}s, {len(compiled.state_qty):,} states "
+          f"over {len(compiled.tables)} (category, month) tables")
+    print(f"equivalence: max abs diff {check_compiled_equivalence(forecaster, compiled):.2e} "
+          f"(every category and month, 0..2x the largest threshold and both sides of each threshold)")
+    repeats = 1000
+    started = time.perf_counter()
+    for _ in range(repeats):
+        forecaster.predict_many(categories, month, 50.0, number_of_days)
+    compiled_seconds = (time.perf_counter() - started) / repeats
+    started = time.perf_counter()
+    forecaster.predict_many(categories, month, 50.0, number_of_days, use_compiled=False)
+    model_seconds = time.perf_counter() - started
+    print(f"{number_of_days}-day forecast, all {len(categories)} categories: "
+          f"{model_seconds * 1e3:.1f}ms with the models -> {compiled_seconds * 1e6:.1f}us compiled")
@@ -6,6 +6,7 @@ Entry point for the REST API
 from src.api import create_app
 from src.api.database import close_db
 
+# Background jobs are opt-in: FFM_ENABLE_SCHEDULER=1 python app.py
 app = create_app(db_path='database/fresh_flow_markets.db')
 
 # Register teardown function
@@ -33,6 +34,7 @@ if __name__ == '__main__':
     print("  - GET  /api/analytics/places        - Place analytics")
     print("  - GET  /api/places                  - List places")
     print("  - GET  /api/places/<id>             - Get place details")
+    print("  - GET  /api/admin/jobs              - Background job status")
     
     print("\n" + "=" * 80)
     print("MACHINE LEARNING PREDICTION ENDPOINTS")
@@ -41,6 +43,9 @@ if __name__ == '__main__':
     print("  - POST /api/ml/forecast/demand                - Predict item demand")
     print("  - POST /api/ml/forecast/reorder-recommendations - Get reorder advice")
     print("  - POST /api/ml/forecast/bulk-items            - Bulk demand forecast")
+    print("  - GET  /api/ml/forecast/accuracy              - Live forecast accuracy")
+    print("  - POST /api/ml/jobs/reorder-all               - Reorder advice for every active item (job)")
+    print("  - GET  /api/ml/jobs/<id>                      - Reorder job progress")
     
     print("\n🔹 2. Campaign ROI & Redemption Prediction")
     print("  - POST /api/ml/campaigns/predict              - Predict campaign performance")
@@ -57,6 +62,7 @@ if __name__ == '__main__':
     
     print("\n🔹 ML Service Status")
     print("  - GET  /api/ml/health                         - ML service health")
+    print("  - GET  /api/ml/ready                          - ML readiness (models warmed up)")
     print("  - GET  /api/ml/models/status                  - Available models status")
     
     print("\n" + "=" * 80)
@@ -0,0 +1,84 @@
+"""
+Fresh Flow Markets - Item Hierarchy Benchmark
+Times item-level forecasts for a synthetic catalog: item shares from
+agg_item_daily (SQL read, dense items x days matrix), then disaggregation
+of the category forecasts to every item. Checks that each category's item
+forecasts add up to the category forecast.
+
+Usage:
+    python benchmark_hierarchy.py                  # 100k items x 30 days
+    python benchmark_hierarchy.py --items 20000 --days 14
+"""
+
+import argparse
+import sqlite3
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from src.services.item_categories import CATEGORY_KEYWORDS
+from src.services.item_hierarchy import compute_item_shares, disaggregate
+from src.services.rollups import ensure_rollup_schema
+
+AS_OF = date(2024, 6, 30)
+
+
+def build_dataset(conn, n_items, window_days, sell_rate, rng):
+    """dim_items titled after category keywords, and sparse agg_item_daily rows"""
+    keywords = [words[0] for words in CATEGORY_KEYWORDS.values() if words]
+    conn.execute("CREATE TABLE dim_items (id INTEGER, title TEXT)")
+    conn.executemany(
+        "INSERT INTO dim_items VALUES (?, ?)",
+        ((i, f"{keywords[i % len(keywords)]} {i}") for i in range(1, n_items + 1))
+    )
+    ensure_rollup_schema(conn)
+    popularity = rng.pareto(1.5, n_items) + 0.1
+    sold = rng.random((n_items, window_days)) < sell_rate
+    item_idx, age = np.nonzero(sold)
+    quantity = rng.poisson(popularity[item_idx] * 3) + 1
+    days = [(AS_OF - timedelta(days=int(a))).isoformat() for a in range(window_days)]
+    conn.executemany(
+        "INSERT INTO agg_item_daily (item_id, day, quantity) VALUES (?, ?, ?)",
+        ((int(i) + 1, days[a], float(q)) for i, a, q in zip(item_idx, age, quantity))
+    )
+    conn.commit()
+    return len(item_idx)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark item-level forecast disaggregation")
+    parser.add_argument('--items', type=int, default=100_000, help="Catalog size")
+    parser.add_argument('--days', type=int, default=30, help="Forecast horizon")
+    parser.add_argument('--sell-rate', type=float, default=0.3, help="Chance an item sells on a given day")
+    parser.add_argument('--repeats', type=int, default=5, help="Runs per step (median reported)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    conn = sqlite3.connect(':memory:')
+    started = time.perf_counter()
+    rows = build_dataset(conn, args.items, 28, args.sell_rate, rng)
+    print(f"[1/3] {args.items:,} items, {rows:,} daily rows in {time.perf_counter() - started:.1f}s")
+
+    timings = []
+    for _ in range(args.repeats):
+        started = time.perf_counter()
+        shares = compute_item_shares(conn, as_of=AS_OF)
+        timings.append(time.perf_counter() - started)
+    print(f"[2/3] shares: {np.median(timings) * 1e3:.0f}ms "
+          f"({len(shares.item_ids):,} items, {len(shares.categories)} categories)")
+
+    category_daily = rng.uniform(50, 500, (len(shares.categories), args.days))
+    timings = []
+    for _ in range(args.repeats):
+        started = time.perf_counter()
+        daily = disaggregate(category_daily, shares.category_index, shares.shares)
+        timings.append(time.perf_counter() - started)
+    reconciled = np.zeros_like(category_daily)
+    np.add.at(reconciled, shares.category_index, daily)
+    print(f"[3/3] disaggregate {daily.shape[0]:,} x {daily.shape[1]}: {np.median(timings) * 1e3:.1f}ms "
+          f"(max reconciliation error {np.abs(reconciled - category_daily).max():.1e})")
+
+
+if __name__ == '__main__':
+    main()
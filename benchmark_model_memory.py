@@ -0,0 +1,119 @@
+"""
+Fresh Flow Markets - Model Memory Benchmark
+Starts N worker processes that hold the ML models at the same time and
+reports each worker's RSS and PSS (proportional set size: shared pages are
+split between the processes mapping them) before and after loading.
+
+Scenarios:
+    dashboard   Each worker builds the dashboard StockForecaster: unpickled
+                XGBoost models compiled in-process vs the memory-mapped
+                tables from convert_models.py
+    api         Each worker warms its own MLPredictionService (gunicorn
+                without --preload) vs workers forked from a master that
+                warmed it (gunicorn.conf.py, preload_app)
+
+Usage:
+    python benchmark_model_memory.py                  # 4 workers, both scenarios
+    python benchmark_model_memory.py --workers 8 --scenario dashboard
+
+Linux only (/proc/self/smaps_rollup).
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def memory():
+    """(rss, pss) of this process in MiB"""
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                values[parts[0]] = int(parts[1]) / 1024
+    return values['Rss:'], values['Pss:']
+
+
+def report(before, load, barrier, results):
+    """Exercise the models, then measure once every worker holds them"""
+    load()
+    barrier.wait()
+    results.put((os.getpid(), before, memory()))
+    barrier.wait()
+
+
+def dashboard_worker(mapped, barrier, results):
+    sys.path.insert(0, os.path.join(ROOT, 'New_ML_Models', 'Guide_to_use'))
+    import numpy as np
+    from guide import StockForecaster
+    before = memory()
+
+    def load():
+        forecaster = StockForecaster(mapped=mapped)
+        if forecaster.compiled is None:
+            forecaster.compile()
+        forecaster.predict_many(list(forecaster.model), 6, np.linspace(0, 500, len(forecaster.model)), 30)
+        dashboard_worker.forecaster = forecaster
+
+    report(before, load, barrier, results)
+
+
+def api_worker(preloaded, barrier, results):
+    sys.path.insert(0, ROOT)
+    from src.services.ml_prediction_service import MLPredictionService
+    before = memory()
+
+    def load():
+        service = preloaded or MLPredictionService()
+        if not preloaded:
+            service.warm_up()
+        service.predict_demand(1, forecast_days=7, item_name='Latte', last_qty=50.0)
+        api_worker.service = service
+
+    report(before, load, barrier, results)
+
+
+def run(name, context, target, arg, workers):
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=target, args=(arg, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    print(f"\n{name}")
+    print(f"  {'pid':>8} {'RSS before':>11} {'RSS after':>10} {'PSS after':>10}")
+    for pid, (rss_before, _), (rss_after, pss_after) in sorted(rows):
+        print(f"  {pid:>8} {rss_before:>9.1f}Mi {rss_after:>8.1f}Mi {pss_after:>8.1f}Mi")
+    print(f"  total PSS {sum(pss for _, _, (_, pss) in rows):.1f}Mi for {workers} workers")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--scenario', choices=['dashboard', 'api', 'all'], default='all')
+    args = parser.parse_args()
+
+    spawn = multiprocessing.get_context('spawn')
+    if args.scenario in ('dashboard', 'all'):
+        run("dashboard: unpickled models, compiled per process", spawn, dashboard_worker, False, args.workers)
+        run("dashboard: memory-mapped tables (convert_models.py)", spawn, dashboard_worker, True, args.workers)
+
+    if args.scenario in ('api', 'all'):
+        run("api: every worker warms its own models", spawn, api_worker, None, args.workers)
+        sys.path.insert(0, ROOT)
+        from src.services.ml_prediction_service import MLPredictionService
+        service = MLPredictionService()
+        service.warm_up()
+        run("api: workers forked after warm-up (preload)", multiprocessing.get_context('fork'),
+            api_worker, service, args.workers)
+
+
+if __name__ == '__main__':
+    main()
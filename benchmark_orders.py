@@ -0,0 +1,206 @@
+"""
+Fresh Flow Markets - Orders Filter Benchmark
+Times /api/orders queries for every filter combination on a synthetic
+fct_orders table, before and after the composite indexes.
+
+Usage:
+    python benchmark_orders.py                 # 10M orders
+    python benchmark_orders.py --orders 1000000 --db /tmp/orders_bench.db
+"""
+
+import argparse
+import itertools
+import os
+import sqlite3
+import statistics
+import time
+
+from src.api.order_queries import ORDER_INDEX_DDL, build_orders_query, describe_plan, get_order_indexes
+
+STATUSES = ['Closed', 'Closed', 'Closed', 'Closed', 'Closed', 'Closed', 'Closed', 'Open', 'Cancelled', 'Pending']
+PLACES = 1800
+USERS = 25000
+START_TS = 1609459200          # 2021-01-01
+SPAN_SECONDS = 4 * 365 * 86400
+
+# Indexes created by setup_database.py before the composite ones
+LEGACY_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_dim_places_id ON dim_places(id)",
+    "CREATE INDEX IF NOT EXISTS idx_fct_orders_user_id ON fct_orders(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_fct_orders_place_id ON fct_orders(place_id)",
+    "CREATE INDEX IF NOT EXISTS idx_fct_orders_created ON fct_orders(created)",
+]
+
+PAGE_COLUMNS = """
+    o.id, o.created, o.status, o.type, o.channel,
+    o.total_amount, o.items_amount, o.discount_amount,
+    o.delivery_charge, o.vat_amount, o.payment_method,
+    o.user_id, o.place_id,
+    p.title as place_name
+"""
+PLACE_JOIN = "LEFT JOIN dim_places p ON o.place_id = p.id"
+
+
+def build_dataset(conn, n_orders):
+    """Create dim_places and n_orders synthetic fct_orders rows"""
+    print(f"\n[1/3] Generating {n_orders:,} orders...")
+    started = time.perf_counter()
+    conn.executescript("""
+        DROP TABLE IF EXISTS fct_orders;
+        DROP TABLE IF EXISTS dim_places;
+        CREATE TABLE dim_places (id INTEGER, title TEXT);
+        CREATE TABLE fct_orders (
+            id INTEGER, user_id INTEGER, created INTEGER, updated INTEGER,
+            status TEXT, type TEXT, channel TEXT, place_id INTEGER,
+            total_amount REAL, items_amount REAL, discount_amount REAL,
+            delivery_charge REAL, vat_amount REAL, payment_method TEXT
+        );
+    """)
+    conn.executemany(
+        "INSERT INTO dim_places VALUES (?, ?)",
+        [(place_id, f"Place {place_id}") for place_id in range(1, PLACES + 1)]
+    )
+    status_case = "CASE abs(random()) % {n} {whens} END".format(
+        n=len(STATUSES),
+        whens=" ".join(f"WHEN {i} THEN '{s}'" for i, s in enumerate(STATUSES))
+    )
+    # Orders arrive in time order; place popularity is skewed (square of a uniform)
+    conn.execute(f"""
+        WITH RECURSIVE seq(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM seq WHERE x < ?)
+        INSERT INTO fct_orders
+        SELECT
+            x,
+            1 + abs(random()) % {USERS},
+            {START_TS} + (x * {SPAN_SECONDS}) / ?,
+            NULL,
+            {status_case},
+            'Takeaway', 'App',
+            1 + ((abs(random()) % 1000) * (abs(random()) % 1000)) % {PLACES},
+            10 + abs(random()) % 9000 / 100.0,
+            0, 0, 0, 0, 'Card'
+        FROM seq
+    """, (n_orders, n_orders))
+    for ddl in LEGACY_INDEXES:
+        conn.execute(ddl)
+    conn.execute("ANALYZE")
+    conn.commit()
+    print(f"   DONE: {time.perf_counter() - started:.1f}s")
+
+
+def legacy_queries(status, place_id, start_ts, end_ts):
+    """Query shapes used by get_orders before the query builder"""
+    query = f"SELECT {PAGE_COLUMNS} FROM fct_orders o {PLACE_JOIN} WHERE 1=1"
+    params = []
+    if status:
+        query += " AND o.status = ?"
+        params.append(status)
+    if place_id:
+        query += " AND o.place_id = ?"
+        params.append(place_id)
+    if start_ts is not None:
+        query += " AND o.created >= ?"
+        params.append(start_ts)
+    if end_ts is not None:
+        query += " AND o.created <= ?"
+        params.append(end_ts)
+    count_query = f"SELECT COUNT(*) as total FROM ({query})"
+    page_query = query + " ORDER BY o.created DESC LIMIT ? OFFSET ?"
+    return count_query, page_query, params
+
+
+def builder_queries(conn):
+    available = get_order_indexes(conn)
+
+    def build(status, place_id, start_ts, end_ts):
+        return build_orders_query(
+            PAGE_COLUMNS, PLACE_JOIN,
+            status=status, place_id=place_id, start_ts=start_ts, end_ts=end_ts,
+            available_indexes=available
+        )
+    return build
+
+
+def time_query(conn, sql, params, repeats):
+    """Median wall time in milliseconds (after one warm-up run)"""
+    conn.execute(sql, params).fetchall()
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def run_matrix(conn, make_queries, repeats):
+    """Time count, first page and a deep page for all 8 filter combinations"""
+    # A mid-sized place, a minority status and the last 90 days
+    place_id = 250
+    status = 'Cancelled'
+    end_ts = START_TS + SPAN_SECONDS
+    start_ts = end_ts - 90 * 86400
+
+    results = {}
+    print(f"\n   {'filters':<24} {'count ms':>10} {'page 1 ms':>10} {'page 20 ms':>11}  plan")
+    for use_status, use_place, use_range in itertools.product([False, True], repeat=3):
+        combo = '+'.join(
+            name for name, used in (('status', use_status), ('place', use_place), ('range', use_range)) if used
+        ) or 'none'
+        count_sql, page_sql, params = make_queries(
+            status if use_status else None,
+            place_id if use_place else None,
+            start_ts if use_range else None,
+            end_ts if use_range else None
+        )
+        count_ms = time_query(conn, count_sql, params, repeats)
+        first_ms = time_query(conn, page_sql, params + [50, 0], repeats)
+        deep_ms = time_query(conn, page_sql, params + [50, 950], repeats)
+        plan = '; '.join(describe_plan(conn, page_sql, params + [50, 0]))
+        results[combo] = (count_ms, first_ms, deep_ms)
+        print(f"   {combo:<24} {count_ms:>10.2f} {first_ms:>10.2f} {deep_ms:>11.2f}  {plan[:70]}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /api/orders filter queries")
+    parser.add_argument('--orders', type=int, default=10_000_000, help="Number of synthetic orders")
+    parser.add_argument('--db', default='orders_benchmark.db', help="Scratch database path")
+    parser.add_argument('--repeats', type=int, default=5, help="Runs per query (median reported)")
+    parser.add_argument('--keep', action='store_true', help="Keep the scratch database")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("FRESH FLOW MARKETS - ORDERS FILTER BENCHMARK")
+    print("=" * 80)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        build_dataset(conn, args.orders)
+
+        print(f"\n[2/3] Single-column indexes, original query shapes")
+        before = run_matrix(conn, legacy_queries, args.repeats)
+
+        print(f"\n[3/3] Composite indexes, query builder")
+        started = time.perf_counter()
+        for ddl in ORDER_INDEX_DDL:
+            conn.execute(ddl)
+        conn.execute("ANALYZE")
+        conn.commit()
+        print(f"   Indexes built in {time.perf_counter() - started:.1f}s")
+        after = run_matrix(conn, builder_queries(conn), args.repeats)
+
+        print("\n" + "=" * 80)
+        print("SPEEDUP (before / after)")
+        print("=" * 80)
+        print(f"   {'filters':<24} {'count':>8} {'page 1':>8} {'page 20':>8}")
+        for combo, old in before.items():
+            new = after[combo]
+            ratios = [o / n if n > 0 else float('inf') for o, n in zip(old, new)]
+            print(f"   {combo:<24} {ratios[0]:>7.1f}x {ratios[1]:>7.1f}x {ratios[2]:>7.1f}x")
+    finally:
+        conn.close()
+        if not args.keep and os.path.exists(args.db):
+            os.remove(args.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Fresh Flow Markets - Native XGBoost Prediction
+Shared by the forecaster guides (ML_Models/stock_forecaster/Guide_to_use/model.py
+and New_ML_Models/Guide_to_use/guide.py), which add the project root to
+sys.path to import it.
+"""
+
+import time
+import numpy as np
+
+
+class BoosterPredictor:
+    """
+    Fast predict() for a fitted XGBRegressor
+
+    Calls inplace_predict on the model's native booster with a contiguous
+    float32 array, skipping the sklearn wrapper's per-call validation and
+    input conversion. XGBoost works in float32 internally, so results match
+    model.predict exactly. The booster is a copy pinned to `nthread`
+    threads; for the small batches of the forecast loop, extra threads cost
+    more to start than they save, and batch callers already parallelize
+    across chunks. Models that are not XGBoost models are called as-is.
+    Other attributes (e.g. n_features_in_) come from the wrapped model.
+    """
+    def __init__(self, model, nthread=1):
+        self.model = model
+        self.booster = None
+        if hasattr(model, 'get_booster'):
+            try:
+                booster = model.get_booster().copy()
+                booster.set_param({'nthread': nthread})
+                self.booster = booster
+            except Exception:
+                self.booster = None
+        try:
+            # Early-stopped models predict with their best iteration, as predict() does
+            self.iteration_range = (0, int(model.best_iteration) + 1)
+        except (AttributeError, TypeError, ValueError):
+            self.iteration_range = (0, 0)
+        self.missing = getattr(model, 'missing', np.nan)
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__['model'], name)
+
+    def predict(self, X):
+        if self.booster is None:
+            return self.model.predict(X)
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return self.booster.inplace_predict(
+            X, iteration_range=self.iteration_range, predict_type='value', missing=self.missing
+        )
+
+
+def benchmark_predictor(model, n_features, rows, repeats=200, seed=0):
+    """
+    Time model.predict against BoosterPredictor(model).predict on `rows` random rows
+    Returns:
+        (wrapper seconds per call, booster seconds per call, max abs difference)
+    """
+    X = np.random.default_rng(seed).uniform(0, 12, size=(rows, n_features))
+    fast = BoosterPredictor(model)
+    timings = []
+    for predict in (model.predict, fast.predict):
+        predict(X)  # warm up
+        started = time.perf_counter()
+        for _ in range(repeats):
+            predict(X)
+        timings.append((time.perf_counter() - started) / repeats)
+    diff = float(np.abs(np.asarray(model.predict(X), dtype=np.float64) - fast.predict(X)).max())
+    return timings[0], timings[1], diff
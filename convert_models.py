@@ -0,0 +1,49 @@
+"""
+Fresh Flow Markets - Model Conversion
+Compiles the dashboard's category stock forecasters into lookup tables and
+writes them as uncompressed .npy arrays under
+New_ML_Models/stock_forecaster/models/compiled/. StockForecaster(mapped=True)
+maps them read-only, so every dashboard process shares one physical copy
+and none unpickles the XGBoost models. Re-run after retraining; stale tables
+(model or scaler files changed) are ignored by the loader.
+
+Usage:
+    python convert_models.py
+    python convert_models.py --check    # verify against the models first
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'New_ML_Models', 'Guide_to_use'))
+
+from guide import StockForecaster, check_compiled_equivalence
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--check', action='store_true', help='compare compiled and model predictions before saving')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    forecaster = StockForecaster()
+    compiled = forecaster.compile()
+    print(f"Compiled {len(compiled.tables)} (category, month) tables, {len(compiled.state_qty):,} states "
+          f"in {time.perf_counter() - started:.2f}s")
+    if args.check:
+        print(f"Equivalence: max abs diff {check_compiled_equivalence(forecaster, compiled):.2e}")
+
+    directory = forecaster.save_compiled()
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    print(f"Wrote {directory} ({size / 1024:.1f} KiB)")
+
+    mapped = StockForecaster(mapped=True)
+    if mapped.compiled is None:
+        raise SystemExit("Saved tables did not load back")
+    print(f"StockForecaster(mapped=True) maps them; {len(mapped.model.categories)} models left unloaded")
+
+
+if __name__ == '__main__':
+    main()
@@ -16,11 +16,28 @@ ml_guide_path = os.path.join(current_dir, 'New_ML_Models', 'Guide_to_use')
 sys.path.insert(0, ml_guide_path)
 
 from guide import *
-stock_forecaster = StockForecaster()
-customer_churn_detector = Customer_Churn_Detection()
-campaign_detector = Campaign_Detector()
-opr_risk_predictor = Operational_risk_predictor()
-revenue_predictor = RevenuePredictor()
+from src.services.item_categories import FALLBACK_CATEGORY, broad_category, categorize
+
+
+@st.cache_resource(show_spinner=False)
+def load_models():
+    """Load the models once per process; every rerun and session shares them."""
+    # Memory-mapped lookup tables from convert_models.py when they match the
+    # model files; otherwise compile them here
+    forecaster = StockForecaster(mapped=True)
+    if forecaster.compiled is None:
+        try:
+            forecaster.compile()  # exact lookup tables; predict() falls back to the models otherwise
+        except Exception as e:
+            print(f"Warning: Could not compile stock forecaster: {e}")
+    return (
+        forecaster, Customer_Churn_Detection(), Campaign_Detector(),
+        Operational_risk_predictor(), RevenuePredictor()
+    )
+
+
+(stock_forecaster, customer_churn_detector, campaign_detector,
+ opr_risk_predictor, revenue_predictor) = load_models()
 
 def fetch_data(endpoint, params=None):
     try:
@@ -38,49 +55,56 @@ def safe_columns(df, required_cols):
 
 
 def get_category_from_item(item_name):
-    """Derive category from item name using keyword matching."""
-    if not item_name or not isinstance(item_name, str):
-        return "Other/Uncategorized"
-    item_lower = item_name.strip().lower()
-    if any(k in item_lower for k in ["soda", "cola", "vin", "beer", "øl", "juice", "coffee", "kaffe", "tea", "the", "latte", "drink", "water", "vand", "lassi", "shake"]):
-        return "Beverages"
-    elif any(k in item_lower for k in ["sushi", "maki", "nigiri", "gyoza", "tempura", "sashimi", "edamame", "hosomaki"]):
-        return "Sushi & Asian"
-    elif any(k in item_lower for k in ["sandwich", "wrap", "burger", "pita", "durum", "rulle"]):
-        return "Handhelds"
-    elif any(k in item_lower for k in ["pizza", "pasta", "steak", "chicken", "meal", "kylling", "kebab", "curry", "bolognese", "lasagna"]):
-        return "Main Courses"
-    elif any(k in item_lower for k in ["cake", "kage", "dessert", "mousse", "sweet", "oreo", "cookie", "is", "gelato", "cheesecake"]):
-        return "Desserts & Sweets"
-    elif any(k in item_lower for k in ["brunch", "breakfast", "morning", "morgen", "egg", "bowl", "yogurt", "pancake"]):
-        return "Breakfast & Brunch"
-    elif any(k in item_lower for k in ["salat", "salad", "greens", "asparges"]):
-        return "Salads & Greens"
-    elif any(k in item_lower for k in ["fries", "fritter", "pommes", "snacks", "dip", "oliven", "mandler", "nuggets", "samosa"]):
-        return "Sides & Snacks"
-    elif any(k in item_lower for k in ["klip", "powerbank", "pose", "lighter", "levering", "personale", "deposit"]):
-        return "Misc/Services"
-    else:
-        return "Other/Uncategorized"
+    """Derive category from item name with the API's keyword classifier."""
+    return MODEL_KEY_TO_DISPLAY[broad_category(categorize(item_name, FALLBACK_CATEGORY))]
+
+
+DISPLAY_TO_MODEL_KEY = {
+    "Beverages": "Beverages",
+    "Sushi & Asian": "Sushi_&_Asian",
+    "Handhelds": "Handhelds",
+    "Main Courses": "Main_Courses",
+    "Desserts & Sweets": "Desserts_&_Sweets",
+    "Breakfast & Brunch": "Breakfast_&_Brunch",
+    "Salads & Greens": "Salads_&_Greens",
+    "Sides & Snacks": "Sides_&_Snacks",
+    "Misc/Services": "Misc_Services",
+    "Other/Uncategorized": "Other_Uncategorized",
+}
+MODEL_KEY_TO_DISPLAY = {key: display for display, key in DISPLAY_TO_MODEL_KEY.items()}
 
 
 def category_to_model_key(category_display):
     """Map display category (e.g. 'Main Courses') to guide model key (e.g. 'Main_Courses')."""
     if not category_display or category_display == "—":
         return None
-    m = {
-        "Beverages": "Beverages",
-        "Sushi & Asian": "Sushi_&_Asian",
-        "Handhelds": "Handhelds",
-        "Main Courses": "Main_Courses",
-        "Desserts & Sweets": "Desserts_&_Sweets",
-        "Breakfast & Brunch": "Breakfast_&_Brunch",
-        "Salads & Greens": "Salads_&_Greens",
-        "Sides & Snacks": "Sides_&_Snacks",
-        "Misc/Services": "Misc_Services",
-        "Other/Uncategorized": "Other_Uncategorized",
-    }
-    return m.get(category_display)
+    return DISPLAY_TO_MODEL_KEY.get(category_display)
+
+
+def model_version(model_key):
+    """Modification time of a category's model and scaler files (changes on retrain)."""
+    paths = [f"{stock_forecaster.model_dir}{model_key}.joblib", f"{stock_forecaster.scaler_dir}{model_key}_scaler.joblib"]
+    return tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in paths)
+
+
+@st.cache_data(max_entries=2048, ttl=3600, show_spinner=False)
+def _cached_forecast(model_key, month, last_qty, number_of_days, version):
+    return stock_forecaster.predict(model_key, month, last_qty, number_of_days)
+
+
+def cached_forecast(model_key, month, last_qty, number_of_days):
+    """Memoized stock_forecaster.predict; retrained models get new cache entries."""
+    return _cached_forecast(model_key, int(month), round(float(last_qty), 3), int(number_of_days), model_version(model_key))
+
+
+def recent_demand(model_key, default=50.0):
+    """Latest daily quantity for a category from the feature store (default if unavailable)."""
+    if not model_key:
+        return default
+    response = fetch_data(f"/api/ml/features/categories/{model_key}")
+    if response and response.get('success') and response['data'].get('items'):
+        return float(response['data']['last_qty'])
+    return default
 
 
 # Category options for forecasting tabs (display names for dropdown)
@@ -401,7 +425,7 @@ def show_forecasting():
         st.subheader("Predict Item Demand")
         category = st.selectbox("Category", options=FORECAST_CATEGORIES, key="forecast_category")
         month = st.selectbox("Month", options=list(range(1, 13)), format_func=lambda x: str(x), key="forecast_month")
-        last_qty = st.number_input("Last quantity (recent demand)", min_value=0.0, value=50.0, step=1.0, key="forecast_last_qty")
+        last_qty = st.number_input("Last quantity (recent demand)", min_value=0.0, value=recent_demand(category_to_model_key(category)), step=1.0, key=f"forecast_last_qty_{category}")
         forecast_days = st.slider("Forecast Period (days)", min_value=1, max_value=30, value=7, key="forecast_days")
         if st.button("🔮 Generate Forecast", type="primary", key="forecast_btn"):
             model_key = category_to_model_key(category)
@@ -409,7 +433,7 @@ def show_forecasting():
                 st.warning("Select a category.")
             else:
                 try:
-                    value = stock_forecaster.predict(model_key, month, last_qty, forecast_days)
+                    value = cached_forecast(model_key, month, last_qty, forecast_days)
                     st.subheader("Forecast Result")
                     st.write("Category:", category, "| Month:", month, "| Forecasting days:", forecast_days)
                     st.metric("Predicted demand (over period)", f"{value:.1f}")
@@ -423,7 +447,7 @@ def show_forecasting():
         col1, col2 = st.columns(2)
         with col1:
             month_reorder = st.selectbox("Month", options=list(range(1, 13)), format_func=lambda x: str(x), key="reorder_month")
-            last_qty = st.number_input("Last quantity (recent demand)", min_value=0.0, value=50.0, step=1.0, key="reorder_last_qty")
+            last_qty = st.number_input("Last quantity (recent demand)", min_value=0.0, value=recent_demand(category_to_model_key(category_reorder)), step=1.0, key=f"reorder_last_qty_{category_reorder}")
             forecast_days_reorder = st.number_input("Forecast period (days)", min_value=1, value=7, key="reorder_forecast_days")
         with col2:
             current_stock = st.number_input("Current Stock Level", min_value=0.0, value=100.0, step=1.0, key="reorder_current_stock")
@@ -434,10 +458,11 @@ def show_forecasting():
                 st.warning("Select a category.")
             else:
                 try:
+                    pred = cached_forecast(model_key, month_reorder, last_qty, forecast_days_reorder)
                     reorder_qty = stock_forecaster.stock_reorder_recommendation(
-                        model_key, month_reorder, last_qty, forecast_days_reorder, current_stock, safety_multiplier
+                        model_key, month_reorder, last_qty, forecast_days_reorder, current_stock, safety_multiplier,
+                        prediction=pred
                     )
-                    pred = stock_forecaster.predict(model_key, month_reorder, last_qty, forecast_days_reorder)
                     st.metric("Category", category_reorder)
                     st.metric("Predicted demand (over period)", f"{pred:.1f}")
                     st.metric("Recommended reorder quantity", f"{reorder_qty:.0f}")
@@ -453,7 +478,7 @@ def show_forecasting():
         categories_bulk = st.multiselect("Categories", options=FORECAST_CATEGORIES, default=[FORECAST_CATEGORIES[0]], key="bulk_categories")
         month_bulk = st.selectbox("Month", options=list(range(1, 13)), format_func=lambda x: str(x), key="bulk_month")
         bulk_forecast_days = st.slider("Forecast Days", min_value=1, max_value=30, value=7, key="bulk_days")
-        last_qty_bulk = st.number_input("Last quantity (used for each category)", min_value=0.0, value=50.0, step=1.0, key="bulk_last_qty")
+        st.caption("Each category starts from its latest daily quantity in the feature store.")
         if st.button("🔄 Generate Bulk Forecast", type="primary", key="bulk_btn"):
             if not categories_bulk:
                 st.warning("Select at least one category.")
@@ -465,7 +490,7 @@ def show_forecasting():
                         summary_data.append({"Category": cat, "Predicted demand": "N/A", "Status": "❌ Unknown category"})
                         continue
                     try:
-                        pred = stock_forecaster.predict(model_key, month_bulk, last_qty_bulk, bulk_forecast_days)
+                        pred = cached_forecast(model_key, month_bulk, recent_demand(model_key), bulk_forecast_days)
                         summary_data.append({"Category": cat, "Predicted demand": f"{pred:.1f}", "Status": "✅ Success"})
                     except Exception as e:
                         summary_data.append({"Category": cat, "Predicted demand": "N/A", "Status": f"❌ {str(e)}"})
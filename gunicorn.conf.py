@@ -0,0 +1,30 @@
+"""
+Fresh Flow Markets - Gunicorn configuration
+gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master and the ML models are warmed there
+before the workers fork (FFM_WARM_MODELS=sync), so all workers share one
+copy of the model memory instead of each unpickling its own.
+"""
+
+import os
+
+bind = os.environ.get('FFM_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('FFM_WORKERS', '4'))
+
+# Load the app (and its models) in the master; workers inherit the pages
+# copy-on-write
+preload_app = True
+os.environ.setdefault('FFM_WARM_MODELS', 'sync')
+
+# Background jobs (rollup refreshes, cache warmups, nightly forecasts). The
+# scheduler is built with the app in the master but started in each worker
+# after the fork, where its work is visible to requests; job leases let only
+# one worker run a given job at a time.
+os.environ.setdefault('FFM_ENABLE_SCHEDULER', '1')
+os.environ['FFM_SCHEDULER_POST_FORK'] = '1'
+
+
+def post_fork(server, worker):
+    from src.api import start_scheduler
+    start_scheduler(worker.app.wsgi())
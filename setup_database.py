@@ -8,6 +8,12 @@ import sqlite3
 from pathlib import Path
 import sys
 
+from src.services.rollups import refresh_rollups
+from src.services.stock_ledger import ensure_ledger_schema
+from src.services.item_affinity import refresh_affinity, reset_affinity
+from src.services.item_categories import refresh_item_categories
+from src.services.feature_store import refresh_features
+
 def setup_database():
     print("=" * 80)
     print("FRESH FLOW MARKETS - DATABASE SETUP")
@@ -18,17 +24,17 @@ def setup_database():
     data_dir = Path("data/Inventory Management")
     
     # Create database connection
-    print(f"\n[1/4] Creating database: {db_path}")
+    print(f"\n[1/5] Creating database: {db_path}")
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     print(f"   SUCCESS: Database created")
     
     # Get all CSV files
     csv_files = sorted(data_dir.glob("*.csv"))
-    print(f"\n[2/4] Found {len(csv_files)} CSV files to import")
+    print(f"\n[2/5] Found {len(csv_files)} CSV files to import")
     
     # Load each CSV into database
-    print(f"\n[3/4] Loading data into tables...")
+    print(f"\n[3/5] Loading data into tables...")
     loaded_tables = []
     
     for csv_file in csv_files:
@@ -56,7 +62,7 @@ def setup_database():
             print(f"   ERROR: {table_name} - {str(e)[:60]}")
     
     # Create indexes for performance
-    print(f"\n[4/4] Creating indexes for performance...")
+    print(f"\n[4/5] Creating indexes for performance...")
     
     indexes = [
         # Primary key indexes
@@ -75,6 +81,11 @@ def setup_database():
         # Date indexes for analytics
         "CREATE INDEX IF NOT EXISTS idx_fct_orders_created ON fct_orders(created)",
         "CREATE INDEX IF NOT EXISTS idx_fct_order_items_created ON fct_order_items(created)",
+        
+        # Composite indexes for /api/orders filters (equality columns, then created)
+        "CREATE INDEX IF NOT EXISTS idx_fct_orders_place_created ON fct_orders(place_id, created)",
+        "CREATE INDEX IF NOT EXISTS idx_fct_orders_status_created ON fct_orders(status, created)",
+        "CREATE INDEX IF NOT EXISTS idx_fct_orders_place_status_created ON fct_orders(place_id, status, created)",
     ]
     
     for idx_sql in indexes:
@@ -87,6 +98,24 @@ def setup_database():
     
     conn.commit()
     
+    # Build analytics rollups (sketches, samples) from the freshly loaded facts
+    print(f"\n[5/5] Building analytics rollups...")
+    try:
+        rows = refresh_item_categories(conn)
+        print(f"   BUILT: {'dim_item_category':<30} ({rows:>10,} items classified)")
+        consumed = refresh_rollups(conn, rebuild=True)
+        for source, rows in consumed.items():
+            print(f"   BUILT: {source:<30} ({rows:>10,} rows consumed)")
+        ensure_ledger_schema(conn)
+        print(f"   READY: stock ledger (fct_stock_movements, stock_levels)")
+        reset_affinity(conn)
+        rows = refresh_affinity(conn)
+        print(f"   BUILT: {'item_affinity':<30} ({rows:>10,} rows consumed)")
+        features = refresh_features(conn, force=True)
+        print(f"   BUILT: {'item_features':<30} ({features['items']:>10,} items as of {features['as_of']})")
+    except Exception as e:
+        print(f"   SKIP: rollups - {str(e)[:60]}")
+    
     # Summary
     print("\n" + "=" * 80)
     print("DATABASE SETUP COMPLETE")
@@ -5,13 +5,44 @@ Inventory Management System API
 
 from flask import Flask
 from flask_cors import CORS
+import os
 import sqlite3
+import threading
 
-def create_app(db_path='fresh_flow_markets.db'):
-    """Create and configure the Flask application"""
+def start_scheduler(app):
+    """Start the app's background scheduler in this process (no-op when disabled)"""
+    scheduler = app.extensions.get('scheduler')
+    if scheduler is not None:
+        scheduler.start()
+
+def create_app(db_path='fresh_flow_markets.db', enable_scheduler=None, warm_models=None, defer_scheduler=None):
+    """
+    Create and configure the Flask application
+    
+    Args:
+        db_path: SQLite database path
+        enable_scheduler: Start the background job scheduler; defaults to
+            the FFM_ENABLE_SCHEDULER environment variable
+        defer_scheduler: Build the scheduler but leave starting it to the
+            caller (start_scheduler); gunicorn starts it in each worker
+            after the fork. Defaults to FFM_SCHEDULER_POST_FORK
+        warm_models: Load all ML models in the background at startup, or
+            before returning with 'sync' (gunicorn --preload: workers then
+            fork with the models already in memory and share their pages);
+            defaults to the FFM_WARM_MODELS environment variable (on)
+    """
     app = Flask(__name__)
     app.config['DATABASE'] = db_path
     app.config['JSON_SORT_KEYS'] = False
+    if enable_scheduler is None:
+        enable_scheduler = os.environ.get('FFM_ENABLE_SCHEDULER', '0').lower() in ('1', 'true', 'yes')
+    app.config['SCHEDULER_ENABLED'] = enable_scheduler
+    if defer_scheduler is None:
+        defer_scheduler = os.environ.get('FFM_SCHEDULER_POST_FORK', '0').lower() in ('1', 'true', 'yes')
+    if warm_models is None:
+        warm_models = os.environ.get('FFM_WARM_MODELS', '1').lower()
+        warm_models = 'sync' if warm_models == 'sync' else warm_models in ('1', 'true', 'yes')
+    app.config['MODEL_WARMUP_ENABLED'] = warm_models
     
     # Enable CORS for frontend integration with comprehensive settings
     CORS(app, resources={
@@ -28,9 +59,30 @@ def create_app(db_path='fresh_flow_markets.db'):
     # Register blueprints
     from .routes import api_bp
     from .ml_routes import ml_bp
+    from .admin_routes import admin_bp
     
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(ml_bp, url_prefix='/api/ml')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    
+    # Load and exercise every model artifact before /api/ml/ready reports ready
+    if app.config['MODEL_WARMUP_ENABLED'] == 'sync':
+        from .ml_routes import ml_service
+        ml_service.warm_up()
+    elif app.config['MODEL_WARMUP_ENABLED']:
+        from .ml_routes import ml_service
+        threading.Thread(target=ml_service.warm_up, name='ml-warmup', daemon=True).start()
+    else:
+        from .ml_routes import ml_service
+        ml_service.warmup_report = {'state': 'skipped'}
+        ml_service.ready = True
+    
+    # Background precompute jobs (rollups, cache warmups, nightly forecasts)
+    if app.config['SCHEDULER_ENABLED']:
+        from .jobs import create_scheduler
+        app.extensions['scheduler'] = create_scheduler(app)
+        if not defer_scheduler:
+            start_scheduler(app)
     
     @app.route('/')
     def index():
@@ -47,7 +99,9 @@ def create_app(db_path='fresh_flow_markets.db'):
                 'places': '/api/places',
                 'ml_predictions': '/api/ml',
                 'ml_health': '/api/ml/health',
-                'ml_models_status': '/api/ml/models/status'
+                'ml_ready': '/api/ml/ready',
+                'ml_models_status': '/api/ml/models/status',
+                'admin_jobs': '/api/admin/jobs'
             },
             'ml_models': {
                 'demand_forecast': '/api/ml/forecast/demand',
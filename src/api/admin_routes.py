@@ -0,0 +1,85 @@
+"""
+Fresh Flow Markets - Admin API Routes
+Background job status and control
+"""
+
+from flask import Blueprint, request, jsonify, current_app
+
+admin_bp = Blueprint('admin', __name__)
+
+
+def get_scheduler():
+    """The app's scheduler, or None when it is disabled"""
+    return current_app.extensions.get('scheduler')
+
+
+# ============================================================================
+# SCHEDULED JOBS
+# ============================================================================
+
+@admin_bp.route('/jobs', methods=['GET'])
+def get_jobs():
+    """Get scheduler state and the status of every job"""
+    try:
+        scheduler = get_scheduler()
+        if scheduler is None:
+            return jsonify({
+                'success': True,
+                'data': {'enabled': False, 'running': False, 'jobs': []},
+                'message': 'Scheduler disabled (set FFM_ENABLE_SCHEDULER=1 or create_app(enable_scheduler=True))'
+            })
+
+        data = scheduler.status()
+        data['enabled'] = True
+        return jsonify({'success': True, 'data': data})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@admin_bp.route('/jobs/<name>/run', methods=['POST'])
+def run_job(name):
+    """
+    Run a job now
+
+    Query Parameters:
+        wait: true to run on the request thread and return the result
+    """
+    try:
+        scheduler = get_scheduler()
+        if scheduler is None:
+            return jsonify({'success': False, 'error': 'Scheduler disabled'}), 400
+        if name not in scheduler.jobs:
+            return jsonify({'success': False, 'error': f"Unknown job '{name}'"}), 404
+
+        if request.args.get('wait', 'false').lower() in ('1', 'true', 'yes'):
+            return jsonify({'success': True, 'data': scheduler.run_job(name)})
+
+        scheduler.trigger(name)
+        return jsonify({'success': True, 'message': f"Job '{name}' queued"}), 202
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@admin_bp.route('/jobs/<name>', methods=['PUT'])
+def update_job(name):
+    """
+    Pause or resume a job
+
+    Request Body:
+    {
+        "enabled": false
+    }
+    """
+    try:
+        scheduler = get_scheduler()
+        if scheduler is None:
+            return jsonify({'success': False, 'error': 'Scheduler disabled'}), 400
+        if name not in scheduler.jobs:
+            return jsonify({'success': False, 'error': f"Unknown job '{name}'"}), 404
+
+        data = request.get_json() or {}
+        if 'enabled' not in data:
+            return jsonify({'success': False, 'error': 'enabled is required'}), 400
+
+        scheduler.set_enabled(name, bool(data['enabled']))
+        return jsonify({'success': True, 'data': scheduler.get_job(name)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -0,0 +1,67 @@
+"""
+Fresh Flow Markets - Scheduled Jobs
+Background precompute jobs registered with the in-process scheduler
+"""
+
+import sqlite3
+from typing import Any, Dict
+
+from ..services.feature_store import refresh_features
+from ..services.forecast_accuracy import update_forecast_accuracy
+from ..services.forecast_store import run_forecasts
+from ..services.item_affinity import refresh_affinity
+from ..services.item_categories import refresh_item_categories
+from ..services.item_hierarchy import invalidate as invalidate_item_shares
+from ..services.rollups import refresh_rollups
+from ..services.scheduler import Job, Scheduler
+from ..services.stock_ledger import apply_sales_depletion
+
+
+def refresh_all_rollups(conn: sqlite3.Connection) -> Dict[str, Any]:
+    """Catch item categories, rollups, stock depletion, item affinity, features and forecast accuracy up with the source tables"""
+    classified = refresh_item_categories(conn)
+    consumed = refresh_rollups(conn)
+    consumed['item_categories'] = classified
+    consumed['stock_sales'] = apply_sales_depletion(conn)
+    consumed['affinity'] = refresh_affinity(conn)
+    consumed['features'] = refresh_features(conn)
+    if consumed['features']['items']:
+        invalidate_item_shares(conn)
+    consumed['forecast_accuracy'] = update_forecast_accuracy(conn)
+    return consumed
+
+
+def nightly_forecasts(conn: sqlite3.Connection) -> Dict[str, Any]:
+    """Precompute forecasts and reorder suggestions for every active item and category"""
+    from .ml_routes import ml_service
+    return run_forecasts(conn, ml_service)
+
+
+def model_reload_check(conn: sqlite3.Connection) -> Dict[str, Any]:
+    """Reload ML models when their files changed on disk"""
+    from .ml_routes import ml_service
+    return ml_service.reload_if_changed()
+
+
+def create_scheduler(app) -> Scheduler:
+    """Build the scheduler with the standard jobs for this app's database"""
+    from .routes import warm_dashboard_cache
+
+    scheduler = Scheduler(app.config['DATABASE'])
+    scheduler.register(Job(
+        'refresh_rollups', refresh_all_rollups,
+        interval_seconds=300, jitter_seconds=30, run_on_start=True
+    ))
+    scheduler.register(Job(
+        'warm_dashboard_cache', lambda conn: warm_dashboard_cache(app),
+        interval_seconds=600, jitter_seconds=60, run_on_start=True
+    ))
+    scheduler.register(Job(
+        'nightly_forecasts', nightly_forecasts,
+        daily_at_hour=2, jitter_seconds=900, lease_seconds=4 * 3600
+    ))
+    scheduler.register(Job(
+        'model_reload_check', model_reload_check,
+        interval_seconds=600, jitter_seconds=60, per_process=True
+    ))
+    return scheduler
@@ -3,10 +3,23 @@ Fresh Flow Markets - ML Prediction API Routes
 REST API endpoints for all machine learning models
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from ..services.ml_prediction_service import MLPredictionService
-from .database import query_db
+from ..services.feature_store import get_category_features, get_item_features, get_items_features
+from ..services.forecast_accuracy import get_forecast_accuracy, log_forecasts, served_forecast_rows
+from ..services.forecast_store import get_category_forecasts, get_reorder_suggestions, load_item_forecast
+from ..services.item_categories import load_item_categories
+from ..services.item_hierarchy import forecast_items
+from ..services.reorder_jobs import (
+    cancel_reorder_job, get_reorder_job, iter_reorder_results, list_reorder_jobs, start_reorder_job
+)
+from ..services.stockout_risk import DEFAULT_SERVICE_LEVEL, DEFAULT_SIMULATIONS, assess_stockout_risk
+from ..services.stockout_risk import category_rmse
+from .database import get_db, query_db
 from datetime import datetime
+import json
+import os
+import sqlite3
 import traceback
 
 ml_bp = Blueprint('ml', __name__)
@@ -14,6 +27,18 @@ ml_bp = Blueprint('ml', __name__)
 # Initialize ML service
 ml_service = MLPredictionService(models_dir='ML_Models')
 
+# Item ids per dim_items lookup in bulk forecasts
+BULK_LOOKUP_CHUNK = 900
+
+def log_served_forecasts(forecasts, data):
+    """Log served forecasts for accuracy tracking (holiday and campaign scenarios are skipped)"""
+    if data.get('is_holiday') or data.get('campaign_active'):
+        return
+    try:
+        log_forecasts(get_db(), served_forecast_rows(forecasts, ml_service.category_versions))
+    except sqlite3.Error as e:
+        print(f"Warning: Could not log forecasts: {e}")
+
 # ============================================================================
 # HEALTH CHECK & STATUS
 # ============================================================================
@@ -31,6 +56,12 @@ def ml_health_check():
             'error': str(e)
         }), 500
 
+@ml_bp.route('/ready', methods=['GET'])
+def ml_readiness_check():
+    """Readiness: 200 once every model artifact has been loaded and exercised, 503 before"""
+    report = ml_service.warmup_report
+    return jsonify({'ready': ml_service.ready, **report}), 200 if ml_service.ready else 503
+
 @ml_bp.route('/models/status', methods=['GET'])
 def get_models_status():
     """Get detailed status of all ML models"""
@@ -108,6 +139,10 @@ def predict_item_demand():
         # Use item price if not provided
         price = data.get('price', item.get('price'))
         
+        # Recent demand from the feature store, and last night's forecast
+        features = get_item_features(get_db(), item['id'])
+        precomputed = load_item_forecast(get_db(), item['id'], last_qty=features['last_qty'])
+        
         # Predict demand (pass item name for category mapping)
         forecast = ml_service.predict_demand(
             item_id=data['item_id'],
@@ -116,7 +151,10 @@ def predict_item_demand():
             is_weekend=data.get('is_weekend', False),
             campaign_active=data.get('campaign_active', False),
             price=price,
-            item_name=item.get('title')  # Add item name for model matching
+            item_name=item.get('title'),  # Add item name for model matching
+            last_qty=features['last_qty'],
+            precomputed=precomputed,
+            category=load_item_categories(get_db(), [item['id']], store=False)[item['id']]
         )
         
         # Check if prediction failed
@@ -130,12 +168,15 @@ def predict_item_demand():
                 }
             }), 400
         
+        log_served_forecasts([forecast], data)
+        
         # Add item details to response
         forecast['item_details'] = {
             'id': item['id'],
             'name': item['title'],
             'current_price': item.get('price')
         }
+        forecast['features'] = features
         
         return jsonify({'success': True, 'data': forecast})
     
@@ -181,13 +222,18 @@ def get_reorder_recommendations():
             one=True
         )
         
+        last_qty = get_item_features(get_db(), item['id'])['last_qty'] if item else None
+        
         # Get recommendations (pass item_name for category-based forecasting)
         recommendations = ml_service.get_reorder_recommendations(
             item_id=data['item_id'],
             current_stock=current_stock,
             lead_time_days=data.get('lead_time_days', 3),
             safety_stock_multiplier=data.get('safety_stock_multiplier', 1.2),
-            item_name=item.get('title') if item else None
+            item_name=item.get('title') if item else None,
+            last_qty=last_qty,
+            precomputed=load_item_forecast(get_db(), item['id'], last_qty=last_qty) if item else None,
+            category=load_item_categories(get_db(), [item['id']], store=False)[item['id']] if item else None
         )
         
         # Check if recommendation failed
@@ -217,7 +263,9 @@ def bulk_forecast_demand():
     Request Body:
     {
         "item_ids": [123, 456, 789],
-        "forecast_days": 7
+        "forecast_days": 7,
+        "is_holiday": false,
+        "campaign_active": false
     }
     """
     try:
@@ -226,30 +274,32 @@ def bulk_forecast_demand():
         if 'item_ids' not in data or not isinstance(data['item_ids'], list):
             return jsonify({'success': False, 'error': 'item_ids array is required'}), 400
         
-        forecasts = []
-        for item_id in data['item_ids']:
-            try:
-                # Get item details for category mapping
-                item = query_db(
-                    "SELECT id, title FROM dim_items WHERE id = ?",
-                    [item_id],
-                    one=True
-                )
-                
-                item_name = item.get('title') if item else None
-                
-                forecast = ml_service.predict_demand(
-                    item_id=item_id,
-                    forecast_days=data.get('forecast_days', 7),
-                    item_name=item_name
-                )
-                forecasts.append(forecast)
-            except Exception as e:
-                forecasts.append({
-                    'status': 'error',
-                    'item_id': item_id,
-                    'error': str(e)
-                })
+        # One IN query per chunk (SQLite caps bound parameters)
+        item_ids = data['item_ids']
+        distinct_ids = list(dict.fromkeys(item_ids))
+        titles = {}
+        for i in range(0, len(distinct_ids), BULK_LOOKUP_CHUNK):
+            chunk = distinct_ids[i:i + BULK_LOOKUP_CHUNK]
+            rows = query_db(
+                f"SELECT id, title FROM dim_items WHERE id IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            titles.update((row['id'], row['title']) for row in rows)
+        
+        features = get_items_features(get_db(), list(titles))
+        categories = load_item_categories(get_db(), list(titles), store=False)
+        
+        forecasts = ml_service.predict_demand_many(
+            [
+                (item_id, titles.get(item_id), features[item_id]['last_qty'], categories[item_id])
+                if item_id in titles else (item_id, None)
+                for item_id in item_ids
+            ],
+            forecast_days=data.get('forecast_days', 7),
+            is_holiday=data.get('is_holiday', False),
+            campaign_active=data.get('campaign_active', False)
+        )
+        log_served_forecasts(forecasts, data)
         
         return jsonify({
             'success': True,
@@ -260,6 +310,309 @@ def bulk_forecast_demand():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@ml_bp.route('/forecast/reorder-suggestions', methods=['GET'])
+def get_precomputed_reorder_suggestions():
+    """Get last night's reorder suggestions (items to reorder, largest first)"""
+    try:
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        return jsonify({'success': True, 'data': get_reorder_suggestions(get_db(), limit=limit)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ml_bp.route('/forecast/categories', methods=['GET'])
+def get_precomputed_category_forecasts():
+    """Get last night's daily forecast per category model"""
+    try:
+        return jsonify({'success': True, 'data': get_category_forecasts(get_db())})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ml_bp.route('/forecast/stockout-risk', methods=['POST'])
+def get_stockout_risk():
+    """
+    Monte Carlo stockout risk and service-level reorder quantities
+    
+    Request Body (all optional; without items, every active item in the
+    stock ledger is assessed and the riskiest come first):
+    {
+        "items": [{"item_id": 123, "current_stock": 40}],
+        "lead_time_days": 3,
+        "review_days": 7,
+        "service_level": 0.95,
+        "simulations": 2000,
+        "seed": 42,
+        "limit": 100
+    }
+    """
+    try:
+        data = request.json or {}
+        lead_time_days = int(data.get('lead_time_days', 3))
+        review_days = int(data.get('review_days', 7))
+        service_level = float(data.get('service_level', DEFAULT_SERVICE_LEVEL))
+        simulations = int(data.get('simulations', DEFAULT_SIMULATIONS))
+        if not 1 <= lead_time_days <= 90 or not 0 <= review_days <= 90:
+            return jsonify({'success': False, 'error': 'lead_time_days must be 1-90 and review_days 0-90'}), 400
+        if not 0 < service_level < 1:
+            return jsonify({'success': False, 'error': 'service_level must be between 0 and 1'}), 400
+        if not 100 <= simulations <= 20000:
+            return jsonify({'success': False, 'error': 'simulations must be between 100 and 20000'}), 400
+        seed = data.get('seed')
+        if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or not 0 <= seed < 2 ** 32):
+            return jsonify({'success': False, 'error': 'seed must be an integer between 0 and 4294967295'}), 400
+        
+        stock = None
+        if 'items' in data:
+            if not isinstance(data['items'], list) or any(
+                'item_id' not in item or 'current_stock' not in item for item in data['items']
+            ):
+                return jsonify({'success': False, 'error': 'items must be a list of {item_id, current_stock}'}), 400
+            stock = {item['item_id']: item['current_stock'] for item in data['items']}
+        
+        risk = assess_stockout_risk(
+            get_db(), ml_service, stock, lead_time_days=lead_time_days, review_days=review_days,
+            service_level=service_level, simulations=simulations, seed=seed
+        )
+        risk['total_items'] = len(risk['items'])
+        if stock is None:
+            risk['items'].sort(key=lambda item: (-item['stockout_probability'], -item['expected_shortfall']))
+            risk['items'] = risk['items'][:min(int(data.get('limit', 100)), 10000)]
+        return jsonify({'success': True, 'data': risk})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ml_bp.route('/forecast/items', methods=['GET'])
+def get_item_level_forecasts():
+    """
+    Item-level forecasts: each category forecast split by the items' recent
+    share of category volume
+    
+    Query: item_ids (comma-separated) or category, days (default 7),
+    limit (default 100, largest shares first when item_ids is not given)
+    """
+    try:
+        days = request.args.get('days', 7, type=int)
+        if not 1 <= days <= 365:
+            return jsonify({'success': False, 'error': 'days must be between 1 and 365'}), 400
+        item_ids = request.args.get('item_ids')
+        if item_ids:
+            try:
+                item_ids = [int(i) for i in item_ids.split(',') if i.strip()]
+            except ValueError:
+                return jsonify({'success': False, 'error': 'item_ids must be comma-separated integers'}), 400
+        
+        result = forecast_items(
+            get_db(), ml_service, forecast_days=days, item_ids=item_ids or None,
+            category=request.args.get('category')
+        )
+        order = range(len(result['item_ids']))
+        if not item_ids:
+            limit = min(request.args.get('limit', 100, type=int), 10000)
+            order = result['shares'].argsort()[::-1][:limit]
+        daily = result['daily'].round(2)
+        return jsonify({
+            'success': True,
+            'data': {
+                'as_of': result['as_of'],
+                'start_date': result['start_date'],
+                'forecast_days': days,
+                'categories': result['categories'],
+                'total_items': len(result['item_ids']),
+                'items': [{
+                    'item_id': int(result['item_ids'][i]),
+                    'category': result['item_categories'][i],
+                    'share': round(float(result['shares'][i]), 6),
+                    'daily': daily[i].tolist(),
+                    'total_predicted_demand': round(float(result['daily'][i].sum()), 2)
+                } for i in order]
+            }
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ml_bp.route('/forecast/accuracy', methods=['GET'])
+def get_forecast_accuracy_stats():
+    """
+    Get online forecast accuracy (MAE, RMSE, MAPE, WAPE, bias) from logged forecasts and actuals
+    
+    Query Parameters:
+        level: category (default), item or category_items
+        category: Only this category
+        item_id: Only this item
+        horizon: Only this horizon (days ahead, 1 = first forecast day)
+        by_horizon: true for one entry per horizon
+        limit: Maximum entries (default 100)
+    """
+    try:
+        level = request.args.get('level', 'category')
+        accuracy = get_forecast_accuracy(
+            get_db(),
+            level=level,
+            category=request.args.get('category'),
+            item_id=request.args.get('item_id', type=int),
+            horizon=request.args.get('horizon', type=int),
+            by_horizon=request.args.get('by_horizon', 'false').lower() in ('1', 'true', 'yes'),
+            limit=min(request.args.get('limit', 100, type=int), 10000)
+        )
+        if level == 'category' and ml_service.stock_forecaster:
+            # The training-time error from MSE.json, for comparison with the live RMSE
+            for entry in accuracy['series']:
+                baseline = category_rmse(ml_service.stock_forecaster.errors, entry['category'])
+                entry['baseline_rmse'] = round(baseline['rmse'], 4) if baseline['source'] == 'category' else None
+        return jsonify({'success': True, 'data': accuracy})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ml_bp.route('/forecast/cache', methods=['GET'])
+def get_forecast_cache_stats():
+    """Get forecast cache size, hit/miss counters and the category model versions"""
+    return jsonify({
+        'success': True,
+        'data': {
+            **ml_service.forecast_cache.stats(),
+            'model_versions': ml_service.category_versions
+        }
+    })
+
+@ml_bp.route('/forecast/cache', methods=['DELETE'])
+def clear_forecast_cache():
+    """Drop all memoized forecasts"""
+    return jsonify({'success': True, 'cleared': ml_service.forecast_cache.clear()})
+
+@ml_bp.route('/features/items/<int:item_id>', methods=['GET'])
+def get_item_demand_features(item_id):
+    """Get recent-demand features (last_qty, lags, rolling means) for an item"""
+    try:
+        return jsonify({'success': True, 'data': get_item_features(get_db(), item_id)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ml_bp.route('/features/categories/<category>', methods=['GET'])
+def get_category_demand_features(category):
+    """Get recent-demand features summed over a category's items"""
+    try:
+        return jsonify({'success': True, 'data': get_category_features(get_db(), category)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ============================================================================
+# REORDER JOBS
+# ============================================================================
+
+@ml_bp.route('/jobs/reorder-all', methods=['POST'])
+def start_reorder_all_job():
+    """
+    Start reorder recommendations for every active item as a background job
+    
+    Request Body (all optional):
+    {
+        "lead_time_days": 3,
+        "safety_stock_multiplier": 1.2,
+        "workers": 8
+    }
+    """
+    try:
+        data = request.json or {}
+        lead_time_days = int(data.get('lead_time_days', 3))
+        safety_multiplier = float(data.get('safety_stock_multiplier', 1.2))
+        workers = data.get('workers')
+        if not 1 <= lead_time_days <= 90:
+            return jsonify({'success': False, 'error': 'lead_time_days must be between 1 and 90'}), 400
+        if safety_multiplier <= 0:
+            return jsonify({'success': False, 'error': 'safety_stock_multiplier must be positive'}), 400
+        if workers is not None and not 1 <= int(workers) <= 64:
+            return jsonify({'success': False, 'error': 'workers must be between 1 and 64'}), 400
+        
+        job_id = start_reorder_job(
+            current_app.config['DATABASE'], os.path.abspath(ml_service.models_dir),
+            lead_time_days=lead_time_days, safety_multiplier=safety_multiplier,
+            workers=int(workers) if workers is not None else None
+        )
+        return jsonify({
+            'success': True,
+            'data': get_reorder_job(get_db(), job_id),
+            'status_url': f'/api/ml/jobs/{job_id}',
+            'results_url': f'/api/ml/jobs/{job_id}/results'
+        }), 202
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ml_bp.route('/jobs', methods=['GET'])
+def get_reorder_jobs():
+    """Get the kept reorder jobs, newest first"""
+    try:
+        return jsonify({'success': True, 'data': list_reorder_jobs(get_db())})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ml_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def get_reorder_job_status(job_id):
+    """
+    Get a reorder job's status and progress
+    
+    Query Parameters:
+        top: Largest reorder suggestions written so far to include (default 10)
+    """
+    try:
+        db = get_db()
+        job = get_reorder_job(db, job_id)
+        if job is None:
+            return jsonify({'success': False, 'error': f'Job {job_id} not found'}), 404
+        top = min(request.args.get('top', 10, type=int), 1000)
+        job['top_reorders'] = list(iter_reorder_results(db, job_id, reorder_only=True, limit=top))
+        return jsonify({'success': True, 'data': job})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ml_bp.route('/jobs/<int:job_id>/results', methods=['GET'])
+def get_reorder_job_results(job_id):
+    """
+    Get a reorder job's results (available while it runs), largest reorder first
+    
+    Query Parameters:
+        format: json (default, paged) or ndjson (every matching row, streamed)
+        reorder_only: true to skip items that need no reorder
+        urgency: high, medium or low
+        limit: Rows per page for json (default 100, max 10000)
+        offset: Rows skipped for json
+    """
+    try:
+        db = get_db()
+        if get_reorder_job(db, job_id) is None:
+            return jsonify({'success': False, 'error': f'Job {job_id} not found'}), 404
+        filters = {
+            'reorder_only': request.args.get('reorder_only', 'false').lower() in ('1', 'true', 'yes'),
+            'urgency': request.args.get('urgency')
+        }
+        if request.args.get('format') == 'ndjson':
+            rows = iter_reorder_results(db, job_id, **filters)
+            return Response(
+                stream_with_context(json.dumps(row) + '\n' for row in rows),
+                mimetype='application/x-ndjson'
+            )
+        limit = min(request.args.get('limit', 100, type=int), 10000)
+        offset = request.args.get('offset', 0, type=int)
+        return jsonify({
+            'success': True,
+            'data': list(iter_reorder_results(db, job_id, limit=limit, offset=offset, **filters)),
+            'limit': limit,
+            'offset': offset
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ml_bp.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_reorder_job_run(job_id):
+    """Cancel a queued or running reorder job (results written so far are kept)"""
+    try:
+        job = cancel_reorder_job(get_db(), job_id)
+        if job is None:
+            return jsonify({'success': False, 'error': f'Job {job_id} not found'}), 404
+        return jsonify({'success': True, 'data': job})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ============================================================================
 # 2. CAMPAIGN ROI & REDEMPTION PREDICTION ENDPOINTS
 # ============================================================================
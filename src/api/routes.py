@@ -3,13 +3,316 @@ Fresh Flow Markets - API Routes
 Main REST API endpoints for inventory management
 """
 
-from flask import Blueprint, request, jsonify
-from datetime import datetime, timedelta
-from .database import query_db, query_df, execute_db
+from flask import Blueprint, request, jsonify, g
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import json
+import sqlite3
+import threading
+import time
+from .database import get_db, close_db, query_db, query_df, execute_db
+from .order_queries import build_orders_query, get_order_indexes
+from ..services.item_categories import CATEGORY_KEYWORDS
+from ..services.rollups import (
+    ALL_CATEGORIES, GLOBAL_PLACE, get_heatmap, estimate_order_totals,
+    estimate_unique_customers, estimate_unique_customers_by_place
+)
+from ..services.sketches import HyperLogLog
+from ..services.cohort_analytics import get_cohorts
+from ..services.item_affinity import get_item_affinity
+from ..services.trending import PLACE_WINDOWS as TRENDING_PLACE_WINDOWS, WINDOWS as TRENDING_WINDOWS, get_trending
+from ..services.stock_ledger import (
+    MOVEMENT_TYPES, get_low_stock, get_movements, get_stock_level,
+    item_exists, record_movement, set_on_hand, set_stock_settings
+)
 import pandas as pd
 
 api_bp = Blueprint('api', __name__)
 
+# ============================================================================
+# FIELD PROJECTION (?fields=)
+# ============================================================================
+
+# Whitelisted columns per resource. Keys are the names exposed by the API,
+# values the SQL expression that produces them. Only requested columns are
+# placed in the generated SELECT, so narrow requests never read or serialize
+# the rest of the row.
+ITEM_FIELDS = {
+    'id': 'i.id',
+    'title': 'i.title',
+    'accounting_reference': 'i.accounting_reference',
+    'barcode': 'i.number',
+    'price': 'i.price',
+    'vat': 'i.vat',
+    'status': 'i.status',
+    'type': 'i.type',
+    'section_id': 'i.section_id',
+    'description': 'i.description',
+    'display_for_customers': 'i.display_for_customers',
+    'delivery': 'i.delivery',
+    'eat_in': 'i.eat_in',
+    'takeaway': 'i.takeaway',
+    'created': 'i.created',
+    'updated': 'i.updated',
+}
+
+# Item sales fields, read from the incrementally maintained item_stats table
+ITEM_SALES_FIELDS = {
+    'times_ordered': 'COALESCE(s.times_ordered, 0)',
+    'total_quantity_sold': 's.total_qty',
+    'last_sold_at': 's.last_sold_at',
+    'quantity_7d': 's.qty_7d',
+    'quantity_30d': 's.qty_30d',
+    'quantity_90d': 's.qty_90d',
+}
+
+ORDER_FIELDS = {
+    'id': 'o.id',
+    'created': 'o.created',
+    'status': 'o.status',
+    'type': 'o.type',
+    'channel': 'o.channel',
+    'total_amount': 'o.total_amount',
+    'items_amount': 'o.items_amount',
+    'discount_amount': 'o.discount_amount',
+    'delivery_charge': 'o.delivery_charge',
+    'vat_amount': 'o.vat_amount',
+    'payment_method': 'o.payment_method',
+    'user_id': 'o.user_id',
+    'place_id': 'o.place_id',
+}
+
+# Order fields that require a join, keyed by the table they come from
+ORDER_PLACE_FIELDS = {'place_name': 'p.title'}
+ORDER_USER_FIELDS = {'user_email': 'u.email', 'user_name': 'u.full_name'}
+
+PLACE_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'active': 'active',
+    'country': 'country',
+    'currency': 'currency',
+    'street_address': 'street_address',
+    'phone': 'phone',
+    'email': 'email',
+    'website': 'website',
+    'delivery': 'delivery',
+    'takeaway': 'takeaway',
+    'eat_in': 'eat_in',
+    'created': 'created',
+    'updated': 'updated',
+}
+
+def parse_fields(*whitelists, extra=()):
+    """
+    Parse the ?fields= query parameter against one or more whitelists
+
+    Returns None when the parameter is absent so callers keep their default
+    column set. Raises ValueError for unknown or empty field lists.
+    """
+    raw = request.args.get('fields')
+    if raw is None:
+        return None
+    
+    allowed = set(extra)
+    for whitelist in whitelists:
+        allowed.update(whitelist)
+    
+    fields = []
+    for name in raw.split(','):
+        name = name.strip()
+        if not name or name in fields:
+            continue
+        if name not in allowed:
+            raise ValueError(f"Unknown field '{name}'. Allowed fields: {', '.join(sorted(allowed))}")
+        fields.append(name)
+    
+    if not fields:
+        raise ValueError('fields must name at least one column')
+    return fields
+
+def select_list(fields, *whitelists):
+    """Build the SELECT column list for the requested fields"""
+    columns = []
+    for name in fields:
+        for whitelist in whitelists:
+            if name in whitelist:
+                columns.append(f"{whitelist[name]} AS {name}")
+                break
+    return ", ".join(columns)
+
+def wants_approx():
+    """True when the request opts into approximate analytics (?approx=true)"""
+    return request.args.get('approx', 'false').lower() in ('1', 'true', 'yes')
+
+# Dashboard responses keyed by query string and data version; the scheduler
+# refreshes the default `days` options in the background. Entries live in the
+# `dashboard_cache` table, shared by every API worker (the warm job runs in
+# whichever worker holds its lease), with a per-process LRU of decoded
+# entries in front.
+DASHBOARD_DAYS_OPTIONS = (30, 90, 180, 365, 730, 1095, 1825)
+DASHBOARD_CACHE_TTL = 900
+DASHBOARD_CACHE_SIZE = 64
+DASHBOARD_CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS dashboard_cache (
+        cache_key TEXT PRIMARY KEY,
+        version TEXT NOT NULL,
+        expires REAL NOT NULL,
+        data TEXT NOT NULL
+    )
+"""
+_dashboard_cache = OrderedDict()
+_dashboard_lock = threading.Lock()
+
+def data_version():
+    """Last rowids of the order fact tables; changes whenever new orders arrive"""
+    row = query_db("""
+        SELECT
+            (SELECT COALESCE(MAX(rowid), 0) FROM fct_orders) as orders,
+            (SELECT COALESCE(MAX(rowid), 0) FROM fct_order_items) as order_items
+    """, one=True)
+    return f"{row['orders']}:{row['order_items']}"
+
+def dashboard_cache_get(cache_key, version):
+    """Cached dashboard data for this key and data version, or None"""
+    now = time.time()
+    with _dashboard_lock:
+        entry = _dashboard_cache.get(cache_key)
+        if entry and entry['version'] == version and entry['expires'] > now:
+            _dashboard_cache.move_to_end(cache_key)
+            return entry['data']
+    try:
+        row = get_db().execute(
+            "SELECT expires, data FROM dashboard_cache WHERE cache_key = ? AND version = ? AND expires > ?",
+            (cache_key, version, now)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None  # table not created yet
+    if row is None:
+        return None
+    data = json.loads(row['data'])
+    _remember_dashboard(cache_key, version, row['expires'], data)
+    return data
+
+def dashboard_cache_put(cache_key, version, data):
+    """Store dashboard data for every worker, dropping expired and least recently written entries"""
+    expires = time.time() + DASHBOARD_CACHE_TTL
+    _remember_dashboard(cache_key, version, expires, data)
+    conn = get_db()
+    conn.execute(DASHBOARD_CACHE_SCHEMA)
+    conn.execute(
+        "INSERT OR REPLACE INTO dashboard_cache (cache_key, version, expires, data) VALUES (?, ?, ?, ?)",
+        (cache_key, version, expires, json.dumps(data))
+    )
+    conn.execute(
+        """
+        DELETE FROM dashboard_cache WHERE expires <= ? OR cache_key NOT IN (
+            SELECT cache_key FROM dashboard_cache ORDER BY expires DESC LIMIT ?
+        )
+        """,
+        (time.time(), DASHBOARD_CACHE_SIZE)
+    )
+    conn.commit()
+
+def _remember_dashboard(cache_key, version, expires, data):
+    with _dashboard_lock:
+        _dashboard_cache[cache_key] = {'version': version, 'expires': expires, 'data': data}
+        _dashboard_cache.move_to_end(cache_key)
+        while len(_dashboard_cache) > DASHBOARD_CACHE_SIZE:
+            _dashboard_cache.popitem(last=False)
+
+def dashboard_cache_key():
+    """Cache key of the current request's query string"""
+    return json.dumps(sorted(request.args.items()))
+
+def warm_dashboard_cache(app, days_options=DASHBOARD_DAYS_OPTIONS):
+    """Recompute the cached dashboard for each `days` option (runs outside a request)"""
+    warmed = {}
+    for days in days_options:
+        with app.test_request_context('/api/analytics/dashboard', query_string={'days': days}):
+            try:
+                g.skip_dashboard_cache = True
+                started = time.perf_counter()
+                get_dashboard_stats()
+                warmed[days] = round((time.perf_counter() - started) * 1000, 1)
+            finally:
+                close_db()
+    return {'warmed_ms': warmed}
+
+# ============================================================================
+# PERIOD COMPARISON (?compare=)
+# ============================================================================
+
+COMPARE_MODES = ('previous_period', 'previous_year')
+
+def comparison_window(days, start_timestamp):
+    """
+    Parse ?compare= into the comparison window for the `days`-long period
+    starting at start_timestamp
+
+    Returns None when no comparison is requested, else a dict of named query
+    parameters (prev_start, prev_end); the window is half-open,
+    prev_start <= created < prev_end. Raises ValueError for unknown modes and
+    for a previous_year window that would overlap the current one.
+    """
+    mode = request.args.get('compare')
+    if not mode:
+        return None
+    if mode not in COMPARE_MODES:
+        raise ValueError(f"Unknown compare mode '{mode}'. Allowed: {', '.join(COMPARE_MODES)}")
+    if mode == 'previous_year' and days > 365:
+        raise ValueError("compare=previous_year needs days <= 365; use previous_period for longer windows")
+    
+    # Both windows hang off the current start, so at days=365 the previous
+    # year ends exactly where the current window begins
+    offset = days if mode == 'previous_period' else 365
+    end = start_timestamp + (days - offset) * 86400
+    return {'mode': mode, 'prev_start': end - days * 86400, 'prev_end': end}
+
+def period_filter(created_col, compare):
+    """WHERE condition covering the current window and, when comparing, the previous one"""
+    current = f"{created_col} >= :start"
+    if not compare:
+        return current
+    # Both terms are range scans on the created index (multi-index OR)
+    return f"({current} OR ({created_col} >= :prev_start AND {created_col} < :prev_end))"
+
+def period_aggregates(metrics, created_col, compare):
+    """
+    SELECT expressions for each metric in the current window, plus a
+    prev_<metric> column per metric when comparing, so both periods come
+    from the same scan
+
+    Args:
+        metrics: List of (alias, template); the template's {period}
+            placeholder receives the window condition
+    """
+    periods = [('', f"{created_col} >= :start")]
+    if compare:
+        periods.append(('prev_', f"({created_col} >= :prev_start AND {created_col} < :prev_end)"))
+    return ",\n".join(
+        f"{template.format(period=condition)} as {prefix}{alias}"
+        for prefix, condition in periods
+        for alias, template in metrics
+    )
+
+def with_deltas(row, metrics):
+    """Move prev_<metric> values into row['previous'] and add absolute and percent changes"""
+    previous, change, change_pct = {}, {}, {}
+    for metric in metrics:
+        current_value = row.get(metric) or 0
+        previous_value = row.pop(f'prev_{metric}', None) or 0
+        previous[metric] = previous_value
+        change[metric] = round(current_value - previous_value, 4)
+        change_pct[metric] = (
+            round((current_value - previous_value) / previous_value * 100, 2)
+            if previous_value else None
+        )
+    row['previous'] = previous
+    row['change'] = change
+    row['change_pct'] = change_pct
+    return row
+
 # ============================================================================
 # INVENTORY ENDPOINTS
 # ============================================================================
@@ -24,6 +327,11 @@ def get_inventory_items():
         search = request.args.get('search', '')
         place_id = request.args.get('place_id', type=int)
         
+        try:
+            fields = parse_fields(ITEM_FIELDS)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         # Build query
         where_clauses = []
         params = []
@@ -44,13 +352,17 @@ def get_inventory_items():
         
         # Get items with pagination
         offset = (page - 1) * per_page
-        query = f"""
-            SELECT 
+        if fields:
+            columns = select_list(fields, ITEM_FIELDS)
+        else:
+            columns = """
                 id, title, accounting_reference, number AS barcode,
                 price, vat, status,
                 display_for_customers, delivery,
-                eat_in, takeaway, created, updated
-            FROM dim_items
+                eat_in, takeaway, created, updated"""
+        query = f"""
+            SELECT {columns}
+            FROM dim_items i
             WHERE {where_sql}
             ORDER BY title
             LIMIT {per_page} OFFSET {offset}
@@ -73,18 +385,37 @@ def get_inventory_items():
 
 @api_bp.route('/inventory/items/<int:item_id>', methods=['GET'])
 def get_item(item_id):
-    """Get single item details"""
+    """Get single item details (supports ?fields= projection)"""
     try:
-        query = """
-            SELECT 
-                i.*,
-                COUNT(DISTINCT oi.order_id) as times_ordered,
-                SUM(oi.quantity) as total_quantity_sold
-            FROM dim_items i
-            LEFT JOIN fct_order_items oi ON i.id = oi.item_id
-            WHERE i.id = ?
-            GROUP BY i.id
-        """
+        try:
+            fields = parse_fields(ITEM_FIELDS, ITEM_SALES_FIELDS)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        if fields is None:
+            query = f"""
+                SELECT 
+                    i.*,
+                    {select_list(ITEM_SALES_FIELDS, ITEM_SALES_FIELDS)}
+                FROM dim_items i
+                LEFT JOIN item_stats s ON s.item_id = i.id
+                WHERE i.id = ?
+            """
+        elif any(f in ITEM_SALES_FIELDS for f in fields):
+            query = f"""
+                SELECT {select_list(fields, ITEM_FIELDS, ITEM_SALES_FIELDS)}
+                FROM dim_items i
+                LEFT JOIN item_stats s ON s.item_id = i.id
+                WHERE i.id = ?
+            """
+        else:
+            # Pure dim_items projection - no stats join
+            query = f"""
+                SELECT {select_list(fields, ITEM_FIELDS)}
+                FROM dim_items i
+                WHERE i.id = ?
+            """
+        
         item = query_db(query, [item_id], one=True)
         
         if not item:
@@ -96,27 +427,12 @@ def get_item(item_id):
 
 @api_bp.route('/inventory/low-stock', methods=['GET'])
 def get_low_stock_items():
-    """Get items with low stock levels based on order volume"""
+    """Get items whose on-hand stock is below their minimum_stock"""
     try:
-        # Get items with low recent order activity (potential low stock indicators)
-        query = """
-            SELECT 
-                i.id, 
-                i.title, 
-                i.number as barcode,
-                i.price,
-                i.status,
-                COUNT(DISTINCT oi.order_id) as recent_orders,
-                SUM(oi.quantity) as total_quantity_sold
-            FROM dim_items i
-            LEFT JOIN fct_order_items oi ON i.id = oi.item_id
-            WHERE i.status = 'Active'
-            GROUP BY i.id, i.title, i.number, i.price, i.status
-            HAVING recent_orders < 10 OR recent_orders IS NULL
-            ORDER BY recent_orders ASC, total_quantity_sold ASC
-            LIMIT 100
-        """
-        items = query_db(query)
+        limit = request.args.get('limit', 100, type=int)
+        
+        # Served from the partial index on stock_levels(on_hand < minimum_stock)
+        items = get_low_stock(get_db(), limit)
         
         return jsonify({
             'success': True,
@@ -126,15 +442,73 @@ def get_low_stock_items():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@api_bp.route('/inventory/items/<int:item_id>/movements', methods=['GET'])
+def get_item_movements(item_id):
+    """Get the stock level and recent ledger movements for an item"""
+    try:
+        limit = request.args.get('limit', 100, type=int)
+        conn = get_db()
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'stock_level': get_stock_level(conn, item_id),
+                'movements': get_movements(conn, item_id, limit)
+            }
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/inventory/items/<int:item_id>/movements', methods=['POST'])
+def create_item_movement(item_id):
+    """
+    Record a stock movement (receipt, sale, adjustment or waste)
+    
+    Request Body:
+    {
+        "movement_type": "receipt",
+        "quantity": 40,
+        "reference": "PO-1042",
+        "note": "Morning delivery"
+    }
+    """
+    try:
+        data = request.json or {}
+        
+        if data.get('movement_type') not in MOVEMENT_TYPES:
+            return jsonify({
+                'success': False,
+                'error': f"movement_type must be one of: {', '.join(MOVEMENT_TYPES)}"
+            }), 400
+        if 'quantity' not in data:
+            return jsonify({'success': False, 'error': 'quantity is required'}), 400
+        
+        try:
+            level = record_movement(
+                get_db(), item_id,
+                movement_type=data['movement_type'],
+                quantity=data['quantity'],
+                reference=data.get('reference'),
+                note=data.get('note')
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if level is None:
+            return jsonify({'success': False, 'error': 'Item not found'}), 404
+        
+        return jsonify({'success': True, 'data': level}), 201
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @api_bp.route('/inventory/items/<int:item_id>', methods=['PUT'])
 def update_item(item_id):
     """Update item details"""
     try:
         data = request.json
         
-        # Build update query dynamically
-        allowed_fields = ['title', 'price', 'current_stock', 'minimum_stock', 
-                         'description', 'barcode', 'stock_unit']
+        # Catalog fields live on dim_items; stock fields go through the ledger
+        allowed_fields = ['title', 'price', 'description', 'barcode']
+        stock_fields = ['current_stock', 'minimum_stock', 'stock_unit']
         
         updates = []
         params = []
@@ -143,21 +517,33 @@ def update_item(item_id):
                 updates.append(f"{field} = ?")
                 params.append(data[field])
         
-        if not updates:
+        if not updates and not any(f in data for f in stock_fields):
             return jsonify({'success': False, 'error': 'No valid fields to update'}), 400
         
-        # Add timestamp
-        updates.append("updated = ?")
-        params.append(int(datetime.now().timestamp()))
+        conn = get_db()
+        if not item_exists(conn, item_id):
+            return jsonify({'success': False, 'error': 'Item not found'}), 404
         
-        # Add item_id for WHERE clause
-        params.append(item_id)
+        if updates:
+            # Add timestamp
+            updates.append("updated = ?")
+            params.append(int(datetime.now().timestamp()))
+            
+            # Add item_id for WHERE clause
+            params.append(item_id)
+            
+            query = f"UPDATE dim_items SET {', '.join(updates)} WHERE id = ?"
+            execute_db(query, params)
         
-        query = f"UPDATE dim_items SET {', '.join(updates)} WHERE id = ?"
-        execute_db(query, params)
+        if 'minimum_stock' in data or 'stock_unit' in data:
+            set_stock_settings(conn, item_id, data.get('minimum_stock'), data.get('stock_unit'))
+        if 'current_stock' in data:
+            # A stock count: recorded as an adjustment movement in the ledger
+            set_on_hand(conn, item_id, data['current_stock'], note=data.get('note'))
         
         # Return updated item
         updated_item = query_db("SELECT * FROM dim_items WHERE id = ?", [item_id], one=True)
+        updated_item['stock_level'] = get_stock_level(conn, item_id)
         
         return jsonify({
             'success': True,
@@ -182,44 +568,43 @@ def get_orders():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        query = """
-            SELECT 
+        try:
+            fields = parse_fields(ORDER_FIELDS, ORDER_PLACE_FIELDS)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        if fields is None:
+            select_sql = """
                 o.id, o.created, o.status, o.type, o.channel,
                 o.total_amount, o.items_amount, o.discount_amount,
                 o.delivery_charge, o.vat_amount, o.payment_method,
                 o.user_id, o.place_id,
                 p.title as place_name
-            FROM fct_orders o
-            LEFT JOIN dim_places p ON o.place_id = p.id
-            WHERE 1=1
-        """
-        params = []
-        
-        if status:
-            query += " AND o.status = ?"
-            params.append(status)
-        
-        if place_id:
-            query += " AND o.place_id = ?"
-            params.append(place_id)
+            """
+        else:
+            select_sql = select_list(fields, ORDER_FIELDS, ORDER_PLACE_FIELDS)
         
-        if start_date:
-            query += " AND o.created >= ?"
-            params.append(int(datetime.fromisoformat(start_date).timestamp()))
+        place_join = (
+            "LEFT JOIN dim_places p ON o.place_id = p.id"
+            if fields is None or 'place_name' in fields else ""
+        )
         
-        if end_date:
-            query += " AND o.created <= ?"
-            params.append(int(datetime.fromisoformat(end_date).timestamp()))
+        count_query, query, params = build_orders_query(
+            select_sql,
+            place_join,
+            status=status,
+            place_id=place_id,
+            start_ts=datetime.fromisoformat(start_date).timestamp() if start_date else None,
+            end_ts=datetime.fromisoformat(end_date).timestamp() if end_date else None,
+            available_indexes=get_order_indexes(get_db())
+        )
         
-        # Count total
-        count_query = f"SELECT COUNT(*) as total FROM ({query})"
+        # Count total (answered from the chosen index alone)
         total = query_db(count_query, params, one=True)['total']
         
-        # Add pagination
+        # Page is bound, not formatted, so each filter combination keeps one plan
         offset = (page - 1) * per_page
-        query += f" ORDER BY o.created DESC LIMIT {per_page} OFFSET {offset}"
-        
-        orders = query_db(query, params)
+        orders = query_db(query, params + [per_page, offset])
         
         return jsonify({
             'success': True,
@@ -236,25 +621,50 @@ def get_orders():
 
 @api_bp.route('/orders/<int:order_id>', methods=['GET'])
 def get_order(order_id):
-    """Get order details with items"""
+    """Get order details with items (supports ?fields= projection)"""
     try:
+        try:
+            fields = parse_fields(
+                ORDER_FIELDS, ORDER_PLACE_FIELDS, ORDER_USER_FIELDS, extra=('items',)
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         # Get order
-        order_query = """
-            SELECT 
-                o.*,
-                p.title as place_name,
-                u.email as user_email,
-                u.full_name as user_name
-            FROM fct_orders o
-            LEFT JOIN dim_places p ON o.place_id = p.id
-            LEFT JOIN dim_users u ON o.user_id = u.id
-            WHERE o.id = ?
-        """
+        if fields is None:
+            order_query = """
+                SELECT 
+                    o.*,
+                    p.title as place_name,
+                    u.email as user_email,
+                    u.full_name as user_name
+                FROM fct_orders o
+                LEFT JOIN dim_places p ON o.place_id = p.id
+                LEFT JOIN dim_users u ON o.user_id = u.id
+                WHERE o.id = ?
+            """
+        else:
+            # Only join the dimensions whose columns were requested
+            joins = []
+            if any(f in ORDER_PLACE_FIELDS for f in fields):
+                joins.append("LEFT JOIN dim_places p ON o.place_id = p.id")
+            if any(f in ORDER_USER_FIELDS for f in fields):
+                joins.append("LEFT JOIN dim_users u ON o.user_id = u.id")
+            columns = select_list(fields, ORDER_FIELDS, ORDER_PLACE_FIELDS, ORDER_USER_FIELDS)
+            order_query = f"""
+                SELECT {columns or 'o.id AS id'}
+                FROM fct_orders o
+                {' '.join(joins)}
+                WHERE o.id = ?
+            """
         order = query_db(order_query, [order_id], one=True)
         
         if not order:
             return jsonify({'success': False, 'error': 'Order not found'}), 404
         
+        if fields is not None and 'items' not in fields:
+            return jsonify({'success': True, 'data': order})
+        
         # Get order items
         items_query = """
             SELECT 
@@ -277,74 +687,191 @@ def get_order(order_id):
 # ANALYTICS ENDPOINTS
 # ============================================================================
 
+def utc_day(timestamp):
+    """ISO UTC date of a UNIX timestamp (the day key of the daily rollups)"""
+    return datetime.fromtimestamp(int(timestamp), tz=timezone.utc).date().isoformat()
+
+def approx_dashboard_sections(params, compare):
+    """
+    Dashboard by_status, top_items and trend from the daily rollups
+
+    agg_order_daily and agg_item_daily are keyed by UTC day, so each window
+    starts at the beginning of its first day and the comparison window ends
+    before the day holding prev_end.
+    """
+    day_params = {key: utc_day(params[key]) for key in ('start', 'prev_start', 'prev_end') if key in params}
+    
+    by_status = query_db(f"""
+        SELECT NULLIF(status, '') as status,
+            {period_aggregates([('count', "COALESCE(SUM(CASE WHEN {period} THEN orders END), 0)")], 'day', compare)}
+        FROM agg_order_daily
+        WHERE {period_filter('day', compare)}
+        GROUP BY status
+    """, day_params)
+    
+    top_items = query_db(f"""
+        SELECT 
+            i.title,
+            {period_aggregates([
+                ('order_count', "COALESCE(SUM(CASE WHEN {period} THEN d.orders END), 0)"),
+                ('total_quantity', "SUM(CASE WHEN {period} THEN d.quantity END)"),
+                ('revenue', "SUM(CASE WHEN {period} THEN d.revenue END)")
+            ], 'd.day', compare)}
+        FROM agg_item_daily d
+        JOIN dim_items i ON d.item_id = i.id
+        WHERE {period_filter('d.day', compare)}
+        GROUP BY i.title
+        HAVING order_count > 0
+        ORDER BY order_count DESC
+        LIMIT 10
+    """, day_params)
+    
+    trend = query_db("""
+        SELECT day as date, SUM(orders) as orders, SUM(revenue) as revenue
+        FROM agg_order_daily
+        WHERE day >= :start
+        GROUP BY day
+        ORDER BY day
+    """, day_params)
+    return by_status, top_items, trend
+
 @api_bp.route('/analytics/dashboard', methods=['GET'])
 def get_dashboard_stats():
     """Get dashboard statistics"""
     try:
+        cache_key = dashboard_cache_key()
+        version = data_version()
+        cached = None if g.get('skip_dashboard_cache') else dashboard_cache_get(cache_key, version)
+        if cached is not None:
+            return jsonify({'success': True, 'data': cached})
+        
         # Date range (last 30 days by default)
         days = request.args.get('days', 30, type=int)
         start_timestamp = int((datetime.now() - timedelta(days=days)).timestamp())
+        approximation = None
         
-        # Total orders
-        orders_query = """
-            SELECT 
-                COUNT(*) as total_orders,
-                SUM(total_amount) as total_revenue,
-                AVG(total_amount) as avg_order_value,
-                COUNT(DISTINCT user_id) as unique_customers
-            FROM fct_orders
-            WHERE created >= ?
-        """
-        stats = query_db(orders_query, [start_timestamp], one=True)
-        
-        # Orders by status
-        status_query = """
-            SELECT status, COUNT(*) as count
-            FROM fct_orders
-            WHERE created >= ?
-            GROUP BY status
-        """
-        by_status = query_db(status_query, [start_timestamp])
+        try:
+            compare = comparison_window(days, start_timestamp)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        params = {'start': start_timestamp, **(compare or {})}
         
-        # Top selling items
-        top_items_query = """
-            SELECT 
-                i.title,
-                COUNT(DISTINCT oi.order_id) as order_count,
-                SUM(oi.quantity) as total_quantity,
-                SUM(oi.price * oi.quantity) as revenue
-            FROM fct_order_items oi
-            JOIN dim_items i ON oi.item_id = i.id
-            WHERE oi.created >= ?
-            GROUP BY i.title
-            ORDER BY order_count DESC
-            LIMIT 10
-        """
-        top_items = query_db(top_items_query, [start_timestamp])
+        summary_metrics = ['total_orders', 'total_revenue', 'avg_order_value', 'unique_customers']
         
-        # Revenue trend (daily)
-        trend_query = """
-            SELECT 
-                DATE(created, 'unixepoch') as date,
-                COUNT(*) as orders,
-                SUM(total_amount) as revenue
-            FROM fct_orders
-            WHERE created >= ?
-            GROUP BY date
-            ORDER BY date
-        """
-        trend = query_db(trend_query, [start_timestamp])
+        if wants_approx():
+            # Sampled totals + HyperLogLog distinct customers
+            conn = get_db()
+            windows = [('', start_timestamp, None)]
+            if compare:
+                windows.append(('prev_', compare['prev_start'], compare['prev_end']))
+            
+            stats, approximation = {}, {'confidence_level': 0.95}
+            for prefix, window_start, window_end in windows:
+                totals = estimate_order_totals(conn, window_start, window_end)
+                customers = estimate_unique_customers(conn, window_start, window_end)
+                stats.update({
+                    f'{prefix}total_orders': totals['total_orders']['estimate'],
+                    f'{prefix}total_revenue': totals['total_revenue']['estimate'],
+                    f'{prefix}avg_order_value': totals['avg_order_value']['estimate'],
+                    f'{prefix}unique_customers': customers['estimate']
+                })
+                approximation.update({
+                    f'{prefix}total_orders_ci': totals['total_orders']['ci95'],
+                    f'{prefix}total_revenue_ci': totals['total_revenue']['ci95'],
+                    f'{prefix}avg_order_value_ci': totals['avg_order_value']['ci95'],
+                    f'{prefix}unique_customers_ci': customers['ci95'],
+                    f'{prefix}sample_size': totals['sample_size']
+                })
+                approximation['unique_customers_relative_error'] = customers['relative_error']
+                approximation['sampling_rate'] = totals['sampling_rate']
+        else:
+            # Total orders (current and comparison window in one scan)
+            orders_query = f"""
+                SELECT 
+                    {period_aggregates([
+                        ('total_orders', "COUNT(CASE WHEN {period} THEN 1 END)"),
+                        ('total_revenue', "SUM(CASE WHEN {period} THEN total_amount END)"),
+                        ('avg_order_value', "AVG(CASE WHEN {period} THEN total_amount END)"),
+                        ('unique_customers', "COUNT(DISTINCT CASE WHEN {period} THEN user_id END)")
+                    ], 'created', compare)}
+                FROM fct_orders
+                WHERE {period_filter('created', compare)}
+            """
+            stats = query_db(orders_query, params, one=True)
         
-        return jsonify({
-            'success': True,
-            'data': {
-                'summary': stats,
-                'by_status': by_status,
-                'top_items': top_items,
-                'trend': trend,
-                'period_days': days
-            }
-        })
+        if approximation:
+            # Whole-day windows from the daily rollups instead of order scans
+            by_status, top_items, trend = approx_dashboard_sections(params, compare)
+        else:
+            # Orders by status
+            status_query = f"""
+                SELECT status,
+                    {period_aggregates([('count', "COUNT(CASE WHEN {period} THEN 1 END)")], 'created', compare)}
+                FROM fct_orders
+                WHERE {period_filter('created', compare)}
+                GROUP BY status
+            """
+            by_status = query_db(status_query, params)
+        
+            # Top selling items (ranked by the current window)
+            top_items_query = f"""
+                SELECT 
+                    i.title,
+                    {period_aggregates([
+                        ('order_count', "COUNT(DISTINCT CASE WHEN {period} THEN oi.order_id END)"),
+                        ('total_quantity', "SUM(CASE WHEN {period} THEN oi.quantity END)"),
+                        ('revenue', "SUM(CASE WHEN {period} THEN oi.price * oi.quantity END)")
+                    ], 'oi.created', compare)}
+                FROM fct_order_items oi
+                JOIN dim_items i ON oi.item_id = i.id
+                WHERE {period_filter('oi.created', compare)}
+                GROUP BY i.title
+                HAVING order_count > 0
+                ORDER BY order_count DESC
+                LIMIT 10
+            """
+            top_items = query_db(top_items_query, params)
+        
+            # Revenue trend (daily)
+            trend_query = """
+                SELECT 
+                    DATE(created, 'unixepoch') as date,
+                    COUNT(*) as orders,
+                    SUM(total_amount) as revenue
+                FROM fct_orders
+                WHERE created >= ?
+                GROUP BY date
+                ORDER BY date
+            """
+            trend = query_db(trend_query, [start_timestamp])
+        
+        if compare:
+            with_deltas(stats, summary_metrics)
+            for row in by_status:
+                with_deltas(row, ['count'])
+            for row in top_items:
+                with_deltas(row, ['order_count', 'total_quantity', 'revenue'])
+            if approximation:
+                approximation['previous'] = {
+                    key[len('prev_'):]: approximation.pop(key)
+                    for key in list(approximation) if key.startswith('prev_')
+                }
+        
+        data = {
+            'summary': stats,
+            'by_status': by_status,
+            'top_items': top_items,
+            'trend': trend,
+            'period_days': days
+        }
+        if compare:
+            data['comparison'] = compare
+        if approximation:
+            data['approximation'] = approximation
+        
+        dashboard_cache_put(cache_key, version, data)
+        
+        return jsonify({'success': True, 'data': data})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -354,30 +881,153 @@ def get_places_analytics():
     try:
         days = request.args.get('days', 30, type=int)
         start_timestamp = int((datetime.now() - timedelta(days=days)).timestamp())
+        approx = wants_approx()
         
-        query = """
+        try:
+            compare = comparison_window(days, start_timestamp)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        params = {'start': start_timestamp, **(compare or {})}
+        
+        metrics = [
+            ('total_orders', "COUNT(DISTINCT CASE WHEN {period} THEN o.id END)"),
+            # In approximate mode distinct customers come from the place sketches
+            ('unique_customers', "COUNT(DISTINCT CASE WHEN {period} THEN o.user_id END)"),
+            ('total_revenue', "SUM(CASE WHEN {period} THEN o.total_amount END)"),
+            ('avg_order_value', "AVG(CASE WHEN {period} THEN o.total_amount END)"),
+            ('items_revenue', "SUM(CASE WHEN {period} THEN o.items_amount END)"),
+            ('delivery_revenue', "SUM(CASE WHEN {period} THEN o.delivery_charge END)")
+        ]
+        if approx:
+            metrics = [m for m in metrics if m[0] != 'unique_customers']
+        
+        query = f"""
             SELECT 
                 p.id,
                 p.title as place_name,
-                COUNT(DISTINCT o.id) as total_orders,
-                COUNT(DISTINCT o.user_id) as unique_customers,
-                SUM(o.total_amount) as total_revenue,
-                AVG(o.total_amount) as avg_order_value,
-                SUM(o.items_amount) as items_revenue,
-                SUM(o.delivery_charge) as delivery_revenue
+                {period_aggregates(metrics, 'o.created', compare)}
             FROM dim_places p
-            LEFT JOIN fct_orders o ON p.id = o.place_id AND o.created >= ?
+            LEFT JOIN fct_orders o ON p.id = o.place_id AND {period_filter('o.created', compare)}
             GROUP BY p.id, p.title
-            HAVING total_orders > 0
+            HAVING {'total_orders > 0 OR prev_total_orders > 0' if compare else 'total_orders > 0'}
             ORDER BY total_revenue DESC
         """
-        places = query_db(query, [start_timestamp])
+        places = query_db(query, params)
         
-        return jsonify({
+        response = {
             'success': True,
             'data': places,
             'period_days': days
+        }
+        
+        if approx:
+            conn = get_db()
+            place_ids = [p['id'] for p in places]
+            estimates = estimate_unique_customers_by_place(conn, place_ids, start_timestamp)
+            previous = (
+                estimate_unique_customers_by_place(conn, place_ids, compare['prev_start'], compare['prev_end'])
+                if compare else {}
+            )
+            for place in places:
+                place['unique_customers'] = estimates.get(place['id'], 0)
+                if compare:
+                    place['prev_unique_customers'] = previous.get(place['id'], 0)
+            response['approximation'] = {
+                'unique_customers_relative_error': round(HyperLogLog().relative_error, 4),
+                'method': 'hyperloglog'
+            }
+        
+        if compare:
+            for place in places:
+                with_deltas(place, [name for name, _ in metrics] + (['unique_customers'] if approx else []))
+            response['comparison'] = compare
+        
+        return jsonify(response)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/analytics/cohorts', methods=['GET'])
+def get_cohort_analytics():
+    """Get monthly acquisition cohorts and retention curves"""
+    try:
+        months = request.args.get('months', 12, type=int)
+        max_age = request.args.get('max_age', 12, type=int)
+        place_id = request.args.get('place_id', type=int)
+        status = request.args.get('status')
+        
+        if months < 1 or max_age < 0:
+            return jsonify({'success': False, 'error': 'months must be >= 1 and max_age >= 0'}), 400
+        
+        data = get_cohorts(get_db(), months=months, max_age=max_age, place_id=place_id, status=status)
+        
+        return jsonify({'success': True, 'data': data})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/analytics/heatmap', methods=['GET'])
+def get_demand_heatmap():
+    """Get day-of-week x hour-of-day demand for a place and/or category"""
+    try:
+        place_id = request.args.get('place_id', GLOBAL_PLACE, type=int)
+        category = request.args.get('category', ALL_CATEGORIES)
+        
+        if category and category not in CATEGORY_KEYWORDS:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown category '{category}'. Allowed: {', '.join(CATEGORY_KEYWORDS)}"
+            }), 400
+        
+        data = get_heatmap(get_db(), place_id, category)
+        data.update({
+            'place_id': place_id or None,
+            'category': category or None,
+            'days': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
         })
+        
+        return jsonify({'success': True, 'data': data})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/analytics/item-affinity/<int:item_id>', methods=['GET'])
+def get_item_affinity_analytics(item_id):
+    """Get items frequently bought together with an item"""
+    try:
+        limit = request.args.get('limit', 10, type=int)
+        sort = request.args.get('sort', 'co_orders')
+        min_co_orders = request.args.get('min_co_orders', 1, type=int)
+        
+        if sort not in ('co_orders', 'confidence', 'lift'):
+            return jsonify({'success': False, 'error': 'sort must be one of: co_orders, confidence, lift'}), 400
+        
+        conn = get_db()
+        data = get_item_affinity(conn, item_id, limit=limit, sort=sort, min_co_orders=min_co_orders)
+        
+        return jsonify({'success': True, 'data': data})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/analytics/trending', methods=['GET'])
+def get_trending_items():
+    """Get the most ordered items over a sliding window (hour, today, 7d)"""
+    try:
+        window = request.args.get('window', 'today')
+        place_id = request.args.get('place_id', type=int)
+        limit = request.args.get('limit', 10, type=int)
+        
+        if window not in TRENDING_WINDOWS:
+            return jsonify({
+                'success': False,
+                'error': f"window must be one of: {', '.join(TRENDING_WINDOWS)}"
+            }), 400
+        if place_id and window not in TRENDING_PLACE_WINDOWS:
+            return jsonify({
+                'success': False,
+                'error': f"window must be one of: {', '.join(TRENDING_PLACE_WINDOWS)} with place_id"
+            }), 400
+        
+        data = get_trending(get_db(), window=window, place_id=place_id, limit=min(max(limit, 1), 50))
+        
+        return jsonify({'success': True, 'data': data})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -430,8 +1080,15 @@ def forecast_demand():
             })
         
         # Get item details
-        item = query_db("SELECT id, title, current_stock, minimum_stock FROM dim_items WHERE id = ?", 
-                       [item_id], one=True)
+        item = query_db(
+            """
+            SELECT i.id, i.title, s.on_hand AS current_stock, s.minimum_stock
+            FROM dim_items i
+            LEFT JOIN stock_levels s ON s.item_id = i.id
+            WHERE i.id = ?
+            """,
+            [item_id], one=True
+        )
         
         return jsonify({
             'success': True,
@@ -440,7 +1097,7 @@ def forecast_demand():
                 'historical_avg_daily': round(avg_daily_demand, 2),
                 'forecast': forecast,
                 'recommendation': {
-                    'reorder_needed': item.get('current_stock', 0) < (avg_daily_demand * days_ahead),
+                    'reorder_needed': bool((item.get('current_stock') or 0) < (avg_daily_demand * days_ahead)),
                     'suggested_reorder_qty': round(avg_daily_demand * days_ahead * 1.2, 0)
                 }
             }
@@ -456,11 +1113,20 @@ def forecast_demand():
 def get_places():
     """Get all places/restaurants"""
     try:
-        query = """
-            SELECT 
+        try:
+            fields = parse_fields(PLACE_FIELDS)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        if fields:
+            columns = select_list(fields, PLACE_FIELDS)
+        else:
+            columns = """
                 id, title, active, country, currency,
                 street_address, phone, email, website,
-                delivery, takeaway, eat_in
+                delivery, takeaway, eat_in"""
+        query = f"""
+            SELECT {columns}
             FROM dim_places
             WHERE active = 1
             ORDER BY title
@@ -477,23 +1143,48 @@ def get_places():
 
 @api_bp.route('/places/<int:place_id>', methods=['GET'])
 def get_place(place_id):
-    """Get place details"""
+    """Get place details (supports ?fields= projection)"""
     try:
-        place = query_db("SELECT * FROM dim_places WHERE id = ?", [place_id], one=True)
+        try:
+            fields = parse_fields(PLACE_FIELDS, extra=('statistics',))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        if fields is None:
+            place = query_db("SELECT * FROM dim_places WHERE id = ?", [place_id], one=True)
+        else:
+            columns = select_list(fields, PLACE_FIELDS) or 'id AS id'
+            place = query_db(f"SELECT {columns} FROM dim_places WHERE id = ?", [place_id], one=True)
         
         if not place:
             return jsonify({'success': False, 'error': 'Place not found'}), 404
         
+        if fields is not None and 'statistics' not in fields:
+            return jsonify({'success': True, 'data': place})
+        
         # Get place statistics
-        stats_query = """
-            SELECT 
-                COUNT(*) as total_orders,
-                SUM(total_amount) as total_revenue,
-                COUNT(DISTINCT user_id) as unique_customers
-            FROM fct_orders
-            WHERE place_id = ?
-        """
-        stats = query_db(stats_query, [place_id], one=True)
+        if wants_approx():
+            stats = query_db(
+                """
+                SELECT COUNT(*) as total_orders, SUM(total_amount) as total_revenue
+                FROM fct_orders
+                WHERE place_id = ?
+                """,
+                [place_id], one=True
+            )
+            customers = estimate_unique_customers(get_db(), place_id=place_id)
+            stats['unique_customers'] = customers['estimate']
+            stats['unique_customers_ci'] = customers['ci95']
+        else:
+            stats_query = """
+                SELECT 
+                    COUNT(*) as total_orders,
+                    SUM(total_amount) as total_revenue,
+                    COUNT(DISTINCT user_id) as unique_customers
+                FROM fct_orders
+                WHERE place_id = ?
+            """
+            stats = query_db(stats_query, [place_id], one=True)
         
         place['statistics'] = stats
         
@@ -0,0 +1,221 @@
+"""
+Fresh Flow Markets - Cohort Analytics
+Monthly acquisition cohorts and retention curves from fct_orders.
+
+Customers are assigned to the month of their first order; a customer is
+retained at age k if they ordered again k months later. Everything is done
+on sorted NumPy arrays (one reduceat for first-order months, one bincount
+for the cohort x age histogram), and the order columns are cached per
+database and extended incrementally by rowid, so repeated calls only read
+orders appended since the last one. Statuses are cached as small integer
+codes, and the place and status filters are NumPy masks over the one
+cached column set.
+"""
+
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Loaded order columns and the status -> code table, keyed by database file
+_order_cache: Dict[str, Dict[str, Any]] = {}
+
+# Computed cohort matrices, keyed by (database, data version, filters)
+_result_cache: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()
+RESULT_CACHE_SIZE = 32
+
+_lock = threading.Lock()
+
+
+def _database_key(conn: sqlite3.Connection) -> str:
+    row = conn.execute("PRAGMA database_list").fetchone()
+    return row[2] or f"memory:{id(conn)}"
+
+
+def _data_version(conn: sqlite3.Connection) -> int:
+    """Last fct_orders rowid; like the rollup watermarks this assumes orders are append-only"""
+    return conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM fct_orders").fetchone()[0]
+
+
+def _read_orders(
+    conn: sqlite3.Connection,
+    after_rowid: int,
+    up_to_rowid: int,
+    statuses: Dict[str, int]
+) -> Dict[str, np.ndarray]:
+    """Order columns for a rowid range; new statuses are added to `statuses`"""
+    df = pd.read_sql_query(
+        """
+        SELECT user_id, created, place_id, total_amount, status
+        FROM fct_orders
+        WHERE rowid > ? AND rowid <= ? AND user_id IS NOT NULL AND created IS NOT NULL
+        """,
+        conn, params=(after_rowid, up_to_rowid)
+    )
+    local, uniques = pd.factorize(df['status'])
+    # -1 (NULL status) indexes the appended -1 and never matches a filter
+    codes = np.append([statuses.setdefault(value, len(statuses)) for value in uniques], -1).astype(np.int32)
+    month = (
+        df['created'].to_numpy(dtype=np.int64).astype('datetime64[s]')
+        .astype('datetime64[M]').astype(np.int64)
+    )
+    return {
+        'user_id': df['user_id'].to_numpy(dtype=np.int64),
+        'month': month,
+        'place_id': df['place_id'].fillna(-1).to_numpy(dtype=np.int64),
+        'amount': df['total_amount'].fillna(0).to_numpy(dtype=np.float64),
+        'status': codes[local],
+    }
+
+
+def _load_orders(conn: sqlite3.Connection, db_key: str, version: int) -> Dict[str, Any]:
+    """
+    Order columns up to the current data version, reading only new rows
+
+    One column set per database whatever the filters; returns the cache
+    entry (version, columns and the status -> code table).
+    """
+    cached = _order_cache.get(db_key)
+    loaded = cached['version'] if cached and cached['version'] <= version else 0
+    if loaded == version:
+        return cached
+
+    statuses = dict(cached['statuses']) if loaded else {}
+    fresh = _read_orders(conn, loaded, version, statuses)
+    if loaded:
+        columns = {name: np.concatenate([cached['columns'][name], fresh[name]]) for name in fresh}
+    else:
+        columns = fresh
+
+    entry = {'version': version, 'columns': columns, 'statuses': statuses}
+    _order_cache[db_key] = entry
+    return entry
+
+
+def _cohort_matrix(user_id: np.ndarray, month: np.ndarray, amount: np.ndarray) -> Dict[str, Any]:
+    """
+    Build the cohort x age histograms
+
+    Returns:
+        Dict with first_month (int months since epoch), customers[c, k]
+        (distinct active customers), orders[c, k] and revenue[c, k]
+    """
+    if user_id.size == 0:
+        empty = np.zeros((0, 0))
+        return {'first_month': 0, 'customers': empty, 'orders': empty, 'revenue': empty}
+
+    # Sort by (user, month); each user's first row carries their first-order month
+    order = np.lexsort((month, user_id))
+    users = user_id[order]
+    months = month[order]
+    amounts = amount[order]
+
+    user_start = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    first = np.minimum.reduceat(months, user_start)
+    cohort = np.repeat(first, np.diff(np.r_[user_start, users.size]))
+
+    first_month = int(first.min())
+    n_cohorts = int(months.max()) - first_month + 1
+    cohort_idx = cohort - first_month
+    age = months - cohort
+    cell = cohort_idx * n_cohorts + age
+    size = n_cohorts * n_cohorts
+
+    # A customer counts once per (cohort, age): keep the first row of each (user, month)
+    distinct = np.r_[True, (users[1:] != users[:-1]) | (months[1:] != months[:-1])]
+
+    customers = np.bincount(cell[distinct], minlength=size).reshape(n_cohorts, n_cohorts)
+    orders = np.bincount(cell, minlength=size).reshape(n_cohorts, n_cohorts)
+    revenue = np.bincount(cell, weights=amounts, minlength=size).reshape(n_cohorts, n_cohorts)
+    return {'first_month': first_month, 'customers': customers, 'orders': orders, 'revenue': revenue}
+
+
+def _month_label(month_index: int) -> str:
+    return str(np.datetime64(int(month_index), 'M'))
+
+
+def get_cohorts(
+    conn: sqlite3.Connection,
+    months: int = 12,
+    max_age: int = 12,
+    place_id: Optional[int] = None,
+    status: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Monthly acquisition cohorts with retention curves
+
+    Args:
+        conn: SQLite connection
+        months: Number of most recent cohorts to return
+        max_age: Number of months after acquisition to report
+        place_id: Only count orders at this place
+        status: Only count orders with this status
+
+    Returns:
+        Dict with per-cohort sizes and retention, the size-weighted average
+        retention curve and the data version the result was computed at
+    """
+    with _lock:
+        db_key = _database_key(conn)
+        version = _data_version(conn)
+        cache_key = (db_key, version, place_id, status)
+        matrix = _result_cache.get(cache_key)
+
+        if matrix is None:
+            orders = _load_orders(conn, db_key, version)
+            columns = orders['columns']
+            mask = None
+            if place_id:
+                mask = columns['place_id'] == place_id
+            if status:
+                matches = columns['status'] == orders['statuses'].get(status, -2)
+                mask = matches if mask is None else mask & matches
+            if mask is not None:
+                matrix = _cohort_matrix(columns['user_id'][mask], columns['month'][mask], columns['amount'][mask])
+            else:
+                matrix = _cohort_matrix(columns['user_id'], columns['month'], columns['amount'])
+
+            _result_cache[cache_key] = matrix
+            while len(_result_cache) > RESULT_CACHE_SIZE:
+                _result_cache.popitem(last=False)
+        else:
+            _result_cache.move_to_end(cache_key)
+
+    customers = matrix['customers']
+    n_cohorts = customers.shape[0]
+    ages = min(max_age + 1, n_cohorts) if n_cohorts else 0
+    first_shown = max(n_cohorts - months, 0)
+
+    cohorts = []
+    for c in range(first_shown, n_cohorts):
+        size = int(customers[c, 0])
+        # Ages beyond the last month with data are not observed yet
+        observed = min(ages, n_cohorts - c)
+        active = customers[c, :observed]
+        cohorts.append({
+            'cohort': _month_label(matrix['first_month'] + c),
+            'customers': size,
+            'active': active.astype(int).tolist(),
+            'retention': np.round(active / size, 4).tolist() if size else [],
+            'orders': matrix['orders'][c, :observed].astype(int).tolist(),
+            'revenue': np.round(matrix['revenue'][c, :observed], 2).tolist()
+        })
+
+    # Average retention per age, weighted by the cohorts that have reached that age
+    average = []
+    if ages:
+        shown = customers[first_shown:, :ages].astype(np.float64)
+        observed = (np.arange(first_shown, n_cohorts)[:, None] + np.arange(ages)[None, :]) < n_cohorts
+        sizes = shown[:, :1] * observed
+        with np.errstate(invalid='ignore', divide='ignore'):
+            curve = (shown * observed).sum(axis=0) / sizes.sum(axis=0)
+        average = [round(float(v), 4) if np.isfinite(v) else None for v in curve]
+
+    return {
+        'cohorts': cohorts,
+        'average_retention': average,
+        'max_age': ages - 1 if ages else 0,
+        'data_version': version
+    }
@@ -0,0 +1,355 @@
+"""
+Fresh Flow Markets - Feature Store
+Recent-demand features for the forecasters, per item and per category.
+
+Features are derived from agg_item_daily as of the last complete UTC day
+(yesterday, or the last day with sales when the data stops earlier):
+
+- last_qty: quantity sold on the as-of day (the forecasters' last_qty input)
+- lag_7 / lag_14: quantity 7 and 14 days before the forecast day
+- mean_7 / mean_28: average daily quantity over the last 7 / 28 days
+- last_sale_day: last day the item (or any item in the category) sold
+
+Rows live in `item_features` and `category_features`. A refresh rebuilds
+both when the as-of day moves, and otherwise only recomputes the items
+touched by order lines folded into the rollups since the last refresh.
+Lags and means are sums over items, so category rows are re-aggregated
+from item rows. Refreshes run from the scheduler's refresh_rollups job;
+reads serve the tables as stored through an in-process TTL cache and never
+refresh them.
+"""
+
+import sqlite3
+import threading
+import time
+import numpy as np
+import pandas as pd
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from .item_categories import load_item_categories
+from .rollups import ensure_rollup_schema, get_watermark, refresh_item_rollups, set_watermark
+
+# Longest window a feature looks back over (days, including the as-of day)
+FEATURE_HISTORY_DAYS = 28
+
+# Seconds a cached feature row is served before it is read again
+FEATURE_CACHE_TTL = 300
+
+FEATURE_COLUMNS = ['last_qty', 'lag_7', 'lag_14', 'mean_7', 'mean_28']
+
+FEATURE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS item_features (
+        item_id INTEGER PRIMARY KEY,
+        category TEXT NOT NULL,
+        as_of TEXT NOT NULL,
+        last_qty REAL NOT NULL DEFAULT 0,
+        lag_7 REAL NOT NULL DEFAULT 0,
+        lag_14 REAL NOT NULL DEFAULT 0,
+        mean_7 REAL NOT NULL DEFAULT 0,
+        mean_28 REAL NOT NULL DEFAULT 0,
+        last_sale_day TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_item_features_category ON item_features(category)",
+    """
+    CREATE TABLE IF NOT EXISTS category_features (
+        category TEXT PRIMARY KEY,
+        as_of TEXT NOT NULL,
+        items INTEGER NOT NULL DEFAULT 0,
+        last_qty REAL NOT NULL DEFAULT 0,
+        lag_7 REAL NOT NULL DEFAULT 0,
+        lag_14 REAL NOT NULL DEFAULT 0,
+        mean_7 REAL NOT NULL DEFAULT 0,
+        mean_28 REAL NOT NULL DEFAULT 0,
+        last_sale_day TEXT
+    )
+    """,
+]
+
+# (db, kind, key) -> (expires_at, features)
+_cache: Dict[tuple, tuple] = {}
+# Databases whose feature tables are known to exist
+_schema_ready: set = set()
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+
+def ensure_feature_schema(conn: sqlite3.Connection):
+    """Create feature tables if they do not exist"""
+    ensure_rollup_schema(conn)
+    for statement in FEATURE_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+def database_key(conn: sqlite3.Connection) -> str:
+    """Cache key for a connection's database (its file path)"""
+    return conn.execute("PRAGMA database_list").fetchone()[2] or f"memory:{id(conn)}"
+
+
+def features_as_of(conn: sqlite3.Connection) -> Optional[date]:
+    """Last complete UTC day, capped at the last day with sales"""
+    last_day = conn.execute("SELECT MAX(day) FROM agg_item_daily").fetchone()[0]
+    if last_day is None:
+        return None
+    yesterday = datetime.now(timezone.utc).date() - timedelta(days=1)
+    return min(yesterday, date.fromisoformat(last_day))
+
+
+def _item_features(conn: sqlite3.Connection, as_of: date, item_ids: Optional[List[int]] = None) -> pd.DataFrame:
+    """Feature rows for items with sales in the history window (all such items if item_ids is None)"""
+    start = as_of - timedelta(days=FEATURE_HISTORY_DAYS - 1)
+    sql = "SELECT item_id, day, quantity FROM agg_item_daily WHERE day BETWEEN ? AND ?"
+    params: List[Any] = [start.isoformat(), as_of.isoformat()]
+    if item_ids is not None:
+        frames = []
+        for i in range(0, len(item_ids), 500):
+            batch = item_ids[i:i + 500]
+            frames.append(pd.read_sql_query(
+                f"{sql} AND item_id IN ({','.join('?' * len(batch))})", conn, params=params + batch
+            ))
+        daily = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['item_id', 'day', 'quantity'])
+    else:
+        daily = pd.read_sql_query(sql, conn, params=params)
+    if daily.empty:
+        return pd.DataFrame(columns=['item_id', 'category', 'as_of'] + FEATURE_COLUMNS + ['last_sale_day'])
+
+    # items x days-ago matrix (column 0 is the as-of day)
+    items, row = np.unique(daily['item_id'].to_numpy(dtype=np.int64), return_inverse=True)
+    age = (np.datetime64(as_of) - daily['day'].to_numpy().astype('datetime64[D]')).astype(np.int64)
+    history = np.zeros((len(items), FEATURE_HISTORY_DAYS))
+    np.add.at(history, (row, age), daily['quantity'].to_numpy(dtype=np.float64))
+
+    features = pd.DataFrame({
+        'item_id': items,
+        'last_qty': history[:, 0],
+        'lag_7': history[:, 6],
+        'lag_14': history[:, 13],
+        'mean_7': history[:, :7].mean(axis=1),
+        'mean_28': history.mean(axis=1),
+    })
+    categories = load_item_categories(conn, items.tolist())
+    features['category'] = features['item_id'].map(categories)
+    features['as_of'] = as_of.isoformat()
+
+    last_sold = {}
+    for i in range(0, len(items), 500):
+        batch = items[i:i + 500].tolist()
+        last_sold.update(conn.execute(
+            f"SELECT item_id, date(last_sold_at, 'unixepoch') FROM item_stats "
+            f"WHERE item_id IN ({','.join('?' * len(batch))})",
+            batch
+        ).fetchall())
+    features['last_sale_day'] = [last_sold.get(i) for i in items.tolist()]
+    return features
+
+
+def _write_item_features(conn: sqlite3.Connection, features: pd.DataFrame):
+    conn.executemany(
+        f"""
+        INSERT OR REPLACE INTO item_features (item_id, category, as_of, {', '.join(FEATURE_COLUMNS)}, last_sale_day)
+        VALUES (?, ?, ?, {', '.join('?' * len(FEATURE_COLUMNS))}, ?)
+        """,
+        features[['item_id', 'category', 'as_of'] + FEATURE_COLUMNS + ['last_sale_day']]
+        .astype(object).itertuples(index=False, name=None)
+    )
+
+
+def _aggregate_categories(conn: sqlite3.Connection, categories: Optional[List[str]] = None):
+    """Rebuild category rows as sums over their item rows"""
+    where = ""
+    params: List[Any] = []
+    if categories is not None:
+        where = f"WHERE category IN ({','.join('?' * len(categories))})"
+        params = list(categories)
+        conn.execute(f"DELETE FROM category_features {where}", params)
+    else:
+        conn.execute("DELETE FROM category_features")
+    sums = ', '.join(f"SUM({c})" for c in FEATURE_COLUMNS)
+    conn.execute(
+        f"""
+        INSERT INTO category_features (category, as_of, items, {', '.join(FEATURE_COLUMNS)}, last_sale_day)
+        SELECT category, MAX(as_of), COUNT(*), {sums}, MAX(last_sale_day)
+        FROM item_features {where}
+        GROUP BY category
+        """,
+        params
+    )
+
+
+def refresh_features(conn: sqlite3.Connection, force: bool = False) -> Dict[str, Any]:
+    """
+    Bring item and category features up to date with fct_order_items
+
+    Folds new order lines into agg_item_daily first. Rebuilds everything
+    when the as-of day changed (or force), otherwise recomputes only the
+    items sold since the last refresh.
+
+    Returns:
+        Dict with the as-of day, items recomputed and whether it rebuilt
+    """
+    with _refresh_lock:
+        ensure_feature_schema(conn)
+        refresh_item_rollups(conn)
+        as_of = features_as_of(conn)
+        if as_of is None:
+            return {'as_of': None, 'items': 0, 'rebuilt': False}
+
+        consumed_to = get_watermark(conn, 'order_items')
+        seen_to = get_watermark(conn, 'features')
+        stored = conn.execute("SELECT MAX(as_of) FROM item_features").fetchone()[0]
+        rebuild = force or stored != as_of.isoformat()
+
+        if rebuild:
+            features = _item_features(conn, as_of)
+            with conn:
+                conn.execute("DELETE FROM item_features")
+                _write_item_features(conn, features)
+                _aggregate_categories(conn)
+                set_watermark(conn, 'features', consumed_to)
+            changed = len(features)
+        elif consumed_to > seen_to:
+            touched = [r[0] for r in conn.execute(
+                "SELECT DISTINCT item_id FROM fct_order_items WHERE rowid > ? AND rowid <= ? AND item_id IS NOT NULL",
+                (seen_to, consumed_to)
+            ).fetchall()]
+            features = _item_features(conn, as_of, touched)
+            categories = set(features['category'])
+            for i in range(0, len(touched), 500):
+                batch = touched[i:i + 500]
+                categories.update(r[0] for r in conn.execute(
+                    f"SELECT category FROM item_features WHERE item_id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall())
+            with conn:
+                for i in range(0, len(touched), 500):
+                    batch = touched[i:i + 500]
+                    conn.execute(f"DELETE FROM item_features WHERE item_id IN ({','.join('?' * len(batch))})", batch)
+                _write_item_features(conn, features)
+                _aggregate_categories(conn, sorted(categories))
+                set_watermark(conn, 'features', consumed_to)
+            changed = len(touched)
+        else:
+            changed = 0
+
+    if changed:
+        invalidate(conn)
+    return {'as_of': as_of.isoformat(), 'items': changed, 'rebuilt': rebuild}
+
+
+# ============================================================================
+# READS (TTL cache)
+# ============================================================================
+
+def invalidate(conn: sqlite3.Connection):
+    """Drop this database's cached feature rows"""
+    db_key = database_key(conn)
+    with _lock:
+        for key in [k for k in _cache if k[0] == db_key]:
+            del _cache[key]
+
+
+def _ensure_tables(conn: sqlite3.Connection, db_key: str):
+    """Create the (empty) feature tables on first read of a database"""
+    with _lock:
+        if db_key in _schema_ready:
+            return
+    ensure_feature_schema(conn)
+    with _lock:
+        _schema_ready.add(db_key)
+
+
+def _empty(as_of: Optional[str], **extra) -> Dict[str, Any]:
+    """Features of a series without a row: zeros, or None while the tables were never built (no as_of)"""
+    value = 0.0 if as_of is not None else None
+    return {**extra, 'as_of': as_of, **{c: value for c in FEATURE_COLUMNS}, 'last_sale_day': None}
+
+
+def get_items_features(conn: sqlite3.Connection, item_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Features for many items (cached; one IN query per chunk of misses)
+
+    Items without sales in the last 28 days get zero features; every item
+    gets None features while item_features was never built, so forecasts
+    fall back to their default starting quantity.
+    """
+    db_key = database_key(conn)
+    now = time.monotonic()
+    result, missing = {}, []
+    with _lock:
+        for item_id in dict.fromkeys(int(i) for i in item_ids):
+            entry = _cache.get((db_key, 'item', item_id))
+            if entry and entry[0] > now:
+                result[item_id] = entry[1]
+            else:
+                missing.append(item_id)
+    if not missing:
+        return result
+
+    _ensure_tables(conn, db_key)
+    as_of = conn.execute("SELECT MAX(as_of) FROM item_features").fetchone()[0]
+    rows = {}
+    for i in range(0, len(missing), 500):
+        batch = missing[i:i + 500]
+        cur = conn.execute(
+            f"""
+            SELECT item_id, category, as_of, {', '.join(FEATURE_COLUMNS)}, last_sale_day
+            FROM item_features WHERE item_id IN ({','.join('?' * len(batch))})
+            """,
+            batch
+        )
+        columns = [c[0] for c in cur.description]
+        rows.update((row[0], dict(zip(columns, row))) for row in cur.fetchall())
+
+    expires = time.monotonic() + FEATURE_CACHE_TTL
+    with _lock:
+        for item_id in missing:
+            features = rows.get(item_id) or _empty(as_of, item_id=item_id, category=None)
+            _cache[(db_key, 'item', item_id)] = (expires, features)
+            result[item_id] = features
+    return result
+
+
+def get_item_features(conn: sqlite3.Connection, item_id: int) -> Dict[str, Any]:
+    """Features for one item (see get_items_features)"""
+    return get_items_features(conn, [item_id])[int(item_id)]
+
+
+def get_last_quantities(conn: sqlite3.Connection) -> Optional[Dict[int, float]]:
+    """
+    last_qty for every item with recent sales, read from item_features as stored
+
+    Uncached, for bulk jobs; items that are missing sold nothing in the
+    history window. None when item_features was never built.
+    """
+    ensure_feature_schema(conn)
+    quantities = {int(item_id): float(qty) for item_id, qty in conn.execute("SELECT item_id, last_qty FROM item_features")}
+    return quantities or None
+
+
+def get_category_features(conn: sqlite3.Connection, category: str) -> Dict[str, Any]:
+    """Features for one category (sums over its items)"""
+    db_key = database_key(conn)
+    with _lock:
+        entry = _cache.get((db_key, 'category', category))
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+
+    _ensure_tables(conn, db_key)
+    cur = conn.execute(
+        f"""
+        SELECT category, as_of, items, {', '.join(FEATURE_COLUMNS)}, last_sale_day
+        FROM category_features WHERE category = ?
+        """,
+        (category,)
+    )
+    row = cur.fetchone()
+    if row:
+        features = dict(zip([c[0] for c in cur.description], row))
+    else:
+        as_of = conn.execute("SELECT MAX(as_of) FROM category_features").fetchone()[0]
+        features = _empty(as_of, category=category, items=0)
+    with _lock:
+        _cache[(db_key, 'category', category)] = (time.monotonic() + FEATURE_CACHE_TTL, features)
+    return features
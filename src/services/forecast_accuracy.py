@@ -0,0 +1,337 @@
+"""
+Fresh Flow Markets - Forecast Accuracy
+Online accuracy of served and precomputed demand forecasts.
+
+Every logged forecast is one `forecast_log` row: the series (an item, or a
+category total with item_id 0), its start date and its daily quantities as
+a float32 blob. Only the first forecast per series and start date is kept;
+scenario forecasts (holiday or campaign adjustments) are not logged.
+
+update_forecast_accuracy scores each new complete UTC day of
+agg_item_daily once (the watermark is the last scored day). A day is only
+scored once it ended more than ACCURACY_SETTLE_SECONDS ago, so order lines
+that reach the rollups a refresh or two late still count towards it;
+start dates of served forecasts are UTC days as well. For a day D it reads the
+logged forecasts covering D, one per series per horizon (horizon 1 is the
+start date), and adds each error to that series' `forecast_accuracy` cell:
+running sums for MAE, RMSE, MAPE, WAPE and bias, plus exponentially
+weighted recent MAE and bias (half-life ACCURACY_RECENT_HALF_LIFE_DAYS).
+Each cell gets at most one update per day, and the work per day is
+proportional to the series with forecasts covering it, independent of how
+many days have been scored before. Item actuals are zero on days an item
+did not sell. Category actuals are the sum of the category's items.
+Forecasts whose every day has been scored are dropped from the log.
+"""
+
+import sqlite3
+import time
+import numpy as np
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from .feature_store import features_as_of
+from .item_categories import ensure_item_category_schema
+from .rollups import ensure_rollup_schema, get_watermark, set_watermark
+
+# Days of each forecast that are logged and scored
+ACCURACY_MAX_HORIZON = 30
+
+# Recent MAE and bias halve the weight of a day's error after this many days
+ACCURACY_RECENT_HALF_LIFE_DAYS = 14
+_RECENT_ALPHA = 1 - 0.5 ** (1 / ACCURACY_RECENT_HALF_LIFE_DAYS)
+
+# A day is scored this long after it ends (UTC), leaving the scheduled rollup
+# refresh (every 300s) several runs to pick up its late order lines
+ACCURACY_SETTLE_SECONDS = 3600
+
+# item_id of a category total series
+CATEGORY_SERIES = 0
+
+# rollup_watermarks entry holding the last scored day (as a date ordinal)
+ACCURACY_WATERMARK = 'forecast_accuracy'
+
+ACCURACY_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS forecast_log (
+        item_id INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        start_date TEXT NOT NULL,
+        horizon_days INTEGER NOT NULL,
+        model_version TEXT,
+        source TEXT NOT NULL,
+        logged INTEGER NOT NULL,
+        daily BLOB NOT NULL,
+        PRIMARY KEY (item_id, category, start_date)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_forecast_log_start ON forecast_log(start_date)",
+    """
+    CREATE TABLE IF NOT EXISTS forecast_accuracy (
+        item_id INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        horizon INTEGER NOT NULL,
+        n INTEGER NOT NULL,
+        sum_abs_error REAL NOT NULL,
+        sum_sq_error REAL NOT NULL,
+        sum_error REAL NOT NULL,
+        sum_actual REAL NOT NULL,
+        sum_ape REAL NOT NULL,
+        n_ape INTEGER NOT NULL,
+        recent_abs_error REAL NOT NULL,
+        recent_error REAL NOT NULL,
+        last_day TEXT NOT NULL,
+        PRIMARY KEY (item_id, category, horizon)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_forecast_accuracy_category ON forecast_accuracy(category, horizon)",
+]
+
+
+def ensure_accuracy_schema(conn: sqlite3.Connection, commit: bool = True):
+    """Create forecast accuracy tables and indexes if they do not exist"""
+    for statement in ACCURACY_SCHEMA:
+        conn.execute(statement)
+    if commit:
+        conn.commit()
+
+
+# ============================================================================
+# LOGGING
+# ============================================================================
+
+def log_forecasts(conn: sqlite3.Connection, rows: Iterable[tuple], commit: bool = True) -> int:
+    """
+    Log forecasts for accuracy tracking (first forecast per series and start date wins)
+
+    Args:
+        conn: Database connection
+        rows: (item_id, category, start_date, daily, model_version, source)
+            tuples; item_id None for a category total
+        commit: Commit after writing (False inside the caller's transaction)
+
+    Returns:
+        Number of forecasts passed on (series already logged for their
+        start date are skipped)
+    """
+    ensure_accuracy_schema(conn, commit=False)
+    now = int(time.time())
+    records = []
+    for item_id, category, start_date, daily, model_version, source in rows:
+        daily = np.asarray(daily, dtype=np.float32)[:ACCURACY_MAX_HORIZON]
+        if not len(daily):
+            continue
+        records.append((
+            CATEGORY_SERIES if item_id is None else int(item_id), category, start_date,
+            len(daily), model_version, source, now, daily.tobytes()
+        ))
+    conn.executemany(
+        """
+        INSERT OR IGNORE INTO forecast_log (
+            item_id, category, start_date, horizon_days, model_version, source, logged, daily
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        records
+    )
+    if commit:
+        conn.commit()
+    return len(records)
+
+
+def served_forecast_rows(forecasts: Iterable[Dict[str, Any]], model_versions: Dict[str, str]) -> List[tuple]:
+    """log_forecasts rows for the successful predict_demand-style results"""
+    return [
+        (
+            forecast.get('item_id'), forecast['category_used'], forecast['predictions'][0]['date'],
+            [p['predicted_quantity'] for p in forecast['predictions']],
+            model_versions.get(forecast['category_used']), forecast.get('source', 'live')
+        )
+        for forecast in forecasts
+        if forecast.get('status') == 'success' and forecast.get('predictions')
+    ]
+
+
+# ============================================================================
+# SCORING
+# ============================================================================
+
+def _score_day(conn: sqlite3.Connection, day: date) -> List[tuple]:
+    """forecast_accuracy rows for the logged forecasts covering `day`"""
+    logged = conn.execute(
+        "SELECT item_id, category, start_date, daily FROM forecast_log WHERE start_date BETWEEN ? AND ?",
+        ((day - timedelta(days=ACCURACY_MAX_HORIZON - 1)).isoformat(), day.isoformat())
+    ).fetchall()
+    if not logged:
+        return []
+    item_actuals = dict(conn.execute(
+        "SELECT item_id, quantity FROM agg_item_daily WHERE day = ?", (day.isoformat(),)
+    ).fetchall())
+    category_actuals = dict(conn.execute(
+        """
+        SELECT c.category, SUM(a.quantity)
+        FROM agg_item_daily a
+        JOIN dim_item_category c ON c.item_id = a.item_id
+        WHERE a.day = ?
+        GROUP BY c.category
+        """,
+        (day.isoformat(),)
+    ).fetchall())
+
+    updates = []
+    for item_id, category, start_date, daily in logged:
+        horizon = (day - date.fromisoformat(start_date)).days + 1
+        predicted = np.frombuffer(daily, dtype=np.float32)
+        if horizon > len(predicted):
+            continue
+        actual = float((category_actuals.get(category) if item_id == CATEGORY_SERIES
+                        else item_actuals.get(item_id)) or 0.0)
+        error = float(predicted[horizon - 1]) - actual
+        ape = abs(error) / actual if actual > 0 else 0.0
+        updates.append((
+            item_id, category, horizon, abs(error), error * error, error, actual,
+            ape, int(actual > 0), abs(error), error, day.isoformat()
+        ))
+    return updates
+
+
+def update_forecast_accuracy(conn: sqlite3.Connection) -> Dict[str, Any]:
+    """
+    Score every settled day since the last run against the logged forecasts
+
+    Returns:
+        Dict with the days scored, the cell updates and the last scored day
+    """
+    ensure_rollup_schema(conn)
+    ensure_item_category_schema(conn)
+    ensure_accuracy_schema(conn)
+    as_of = features_as_of(conn)
+    first_logged = conn.execute("SELECT MIN(start_date) FROM forecast_log").fetchone()[0]
+    scored = get_watermark(conn, ACCURACY_WATERMARK)
+    if as_of is None or first_logged is None:
+        return {'days': 0, 'updates': 0, 'through': date.fromordinal(scored).isoformat() if scored else None}
+
+    settled = (datetime.now(timezone.utc) - timedelta(seconds=ACCURACY_SETTLE_SECONDS)).date() - timedelta(days=1)
+    last = min(as_of, settled)
+    first = max(date.fromordinal(scored + 1) if scored else date.min, date.fromisoformat(first_logged))
+    days = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+    if not days:
+        return {'days': 0, 'updates': 0, 'through': date.fromordinal(scored).isoformat() if scored else None}
+    updates = 0
+    with conn:
+        for day in days:
+            rows = _score_day(conn, day)
+            conn.executemany(
+                f"""
+                INSERT INTO forecast_accuracy (
+                    item_id, category, horizon, n, sum_abs_error, sum_sq_error, sum_error, sum_actual,
+                    sum_ape, n_ape, recent_abs_error, recent_error, last_day
+                ) VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(item_id, category, horizon) DO UPDATE SET
+                    n = n + 1,
+                    sum_abs_error = sum_abs_error + excluded.sum_abs_error,
+                    sum_sq_error = sum_sq_error + excluded.sum_sq_error,
+                    sum_error = sum_error + excluded.sum_error,
+                    sum_actual = sum_actual + excluded.sum_actual,
+                    sum_ape = sum_ape + excluded.sum_ape,
+                    n_ape = n_ape + excluded.n_ape,
+                    recent_abs_error = recent_abs_error + {_RECENT_ALPHA!r} * (excluded.recent_abs_error - recent_abs_error),
+                    recent_error = recent_error + {_RECENT_ALPHA!r} * (excluded.recent_error - recent_error),
+                    last_day = excluded.last_day
+                """,
+                rows
+            )
+            updates += len(rows)
+        set_watermark(conn, ACCURACY_WATERMARK, days[-1].toordinal())
+        conn.execute(
+            "DELETE FROM forecast_log WHERE date(start_date, '+' || (horizon_days - 1) || ' days') <= ?",
+            (days[-1].isoformat(),)
+        )
+    return {'days': len(days), 'updates': updates, 'through': days[-1].isoformat()}
+
+
+# ============================================================================
+# READS
+# ============================================================================
+
+# level -> (series filter, grouping columns)
+ACCURACY_LEVELS = {
+    'category': (f"item_id = {CATEGORY_SERIES}", ['category']),
+    'item': (f"item_id != {CATEGORY_SERIES}", ['item_id', 'category']),
+    'category_items': (f"item_id != {CATEGORY_SERIES}", ['category']),
+}
+
+
+def get_forecast_accuracy(conn: sqlite3.Connection, level: str = 'category', category: Optional[str] = None,
+                          item_id: Optional[int] = None, horizon: Optional[int] = None,
+                          by_horizon: bool = False, limit: int = 100) -> Dict[str, Any]:
+    """
+    Accuracy metrics per series
+
+    Args:
+        conn: Database connection
+        level: 'category' (category total forecasts), 'item' (per item) or
+            'category_items' (item forecasts pooled per category)
+        category: Only this category
+        item_id: Only this item (level 'item')
+        horizon: Only this horizon (days ahead, 1 = first forecast day)
+        by_horizon: One entry per horizon instead of pooling all horizons
+        limit: Maximum entries; items come worst MAE first
+
+    Returns:
+        Dict with the last scored day and the metric entries. Recent MAE and
+        bias of pooled entries are the mean over their cells.
+    """
+    if level not in ACCURACY_LEVELS:
+        raise ValueError(f"level must be one of {', '.join(ACCURACY_LEVELS)}")
+    series_filter, keys = ACCURACY_LEVELS[level]
+    clauses, params = [series_filter], []
+    if category is not None:
+        clauses.append("category = ?")
+        params.append(category)
+    if item_id is not None:
+        clauses.append("item_id = ?")
+        params.append(int(item_id))
+    if horizon is not None:
+        clauses.append("horizon = ?")
+        params.append(int(horizon))
+    group = keys + (['horizon'] if by_horizon else [])
+    order = "SUM(sum_abs_error) / SUM(n) DESC" if level == 'item' else ', '.join(group)
+
+    try:
+        scored = get_watermark(conn, ACCURACY_WATERMARK)
+        rows = conn.execute(
+            f"""
+            SELECT {', '.join(group)}, SUM(n), SUM(sum_abs_error), SUM(sum_sq_error), SUM(sum_error),
+                   SUM(sum_actual), SUM(sum_ape), SUM(n_ape), AVG(recent_abs_error), AVG(recent_error),
+                   MAX(last_day)
+            FROM forecast_accuracy
+            WHERE {' AND '.join(clauses)}
+            GROUP BY {', '.join(group)}
+            ORDER BY {order}
+            LIMIT ?
+            """,
+            params + [limit]
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return {'through': None, 'level': level, 'series': []}  # nothing scored yet
+
+    series = []
+    for row in rows:
+        entry = dict(zip(group, row[:len(group)]))
+        n, abs_error, sq_error, error, actual, ape, n_ape, recent_abs, recent_error, last_day = row[len(group):]
+        entry.update({
+            'observations': n,
+            'mae': round(abs_error / n, 4),
+            'rmse': round(float(np.sqrt(sq_error / n)), 4),
+            'mape': round(100 * ape / n_ape, 2) if n_ape else None,
+            'wape': round(100 * abs_error / actual, 2) if actual > 0 else None,
+            'bias': round(error / n, 4),
+            'recent_mae': round(recent_abs, 4),
+            'recent_bias': round(recent_error, 4),
+            'last_day': last_day
+        })
+        series.append(entry)
+    return {
+        'through': date.fromordinal(scored).isoformat() if scored else None,
+        'level': level,
+        'series': series
+    }
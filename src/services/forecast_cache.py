@@ -0,0 +1,122 @@
+"""
+Fresh Flow Markets - Forecast Cache
+Memoized daily forecast series for the demand forecaster.
+
+An entry is one recursive forecast series (the daily quantities for one
+category and starting quantity), keyed on the normalized inputs that
+determine it plus the version of the category's model files. Entries are
+evicted least-recently-used once the cache is full and expire after a TTL.
+Retraining or reloading a category model changes its version, so stale
+entries are never hit; invalidate_category drops them eagerly.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# Series kept before least-recently-used entries are evicted
+FORECAST_CACHE_SIZE = 4096
+
+# Seconds an entry is served before it is recomputed
+FORECAST_CACHE_TTL = 3600
+
+# Decimal places starting quantities are rounded to in cache keys
+QTY_PRECISION = 3
+
+
+def forecast_key(
+    category: str,
+    model_version: str,
+    start_date: date,
+    last_qty: float,
+    forecast_days: int,
+    is_holiday: bool = False,
+    multiplier: float = 1.0
+) -> tuple:
+    """Normalized cache key for one forecast series"""
+    return (
+        category,
+        model_version,
+        start_date.isoformat(),
+        round(float(last_qty), QTY_PRECISION),
+        int(forecast_days),
+        int(bool(is_holiday)),
+        round(float(multiplier), 6),
+    )
+
+
+class ForecastCache:
+    """Thread-safe LRU + TTL cache of forecast series with hit/miss counters"""
+
+    def __init__(self, max_entries: int = FORECAST_CACHE_SIZE, ttl: float = FORECAST_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[tuple, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def get(self, key: tuple) -> Optional[np.ndarray]:
+        """Cached series for key, or None (counts a hit or a miss)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, series = entry
+            if expires <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return series
+
+    def put(self, key: tuple, series: np.ndarray):
+        """Store a series (read-only copy), evicting the oldest entries when full"""
+        series = np.array(series, dtype=np.float64)
+        series.setflags(write=False)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, series)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_category(self, category: str) -> int:
+        """Drop every entry for a category; returns the number dropped"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == category]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> int:
+        """Drop every entry; returns the number dropped"""
+        with self._lock:
+            dropped = len(self._entries)
+            self._entries.clear()
+            self.invalidations += dropped
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        """Size, limits and counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
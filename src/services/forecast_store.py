@@ -0,0 +1,332 @@
+"""
+Fresh Flow Markets - Forecast Store
+Nightly precomputed demand forecasts and reorder suggestions.
+
+A run forecasts FORECAST_HORIZON_DAYS days ahead, starting tomorrow, for
+every active item (status 'Active' in dim_items and sold in the last 90
+days) and every category model, without holiday or campaign adjustments. Each `fct_forecasts` row holds
+one daily series as JSON, for an item or for a whole category (item_id
+NULL), with the model version of its category and the run id. Items with a
+stock level also get a reorder suggestion for the default lead time.
+`forecast_runs` lists the runs. Only the last FORECAST_RUNS_KEPT runs are
+kept. Every forecast of a run is also logged for accuracy tracking
+(forecast_accuracy).
+
+A stored item forecast is fresh when it starts tomorrow, its category model
+is unchanged and it was made from the item's current last_qty. Callers fall
+back to live inference otherwise.
+"""
+
+import json
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from .feature_store import get_category_features, get_items_features
+from .forecast_accuracy import log_forecasts
+from .item_categories import refresh_item_categories
+
+# Days forecast per series; requests up to this horizon can be served
+FORECAST_HORIZON_DAYS = 30
+
+# Runs (and their rows) kept in fct_forecasts
+FORECAST_RUNS_KEPT = 7
+
+# Items per predict_demand_many call
+FORECAST_BATCH_ITEMS = 2000
+
+# Reorder suggestions assume the API defaults
+DEFAULT_LEAD_TIME_DAYS = 3
+DEFAULT_SAFETY_MULTIPLIER = 1.2
+
+FORECAST_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS forecast_runs (
+        run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started INTEGER NOT NULL,
+        finished INTEGER,
+        status TEXT NOT NULL,
+        start_date TEXT,
+        horizon_days INTEGER NOT NULL,
+        model_version TEXT,
+        items INTEGER NOT NULL DEFAULT 0,
+        categories INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        error TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS fct_forecasts (
+        run_id INTEGER NOT NULL,
+        item_id INTEGER,
+        category TEXT NOT NULL,
+        model_version TEXT,
+        start_date TEXT NOT NULL,
+        last_qty REAL,
+        daily TEXT NOT NULL,
+        current_stock REAL,
+        reorder_quantity REAL,
+        safety_stock_level REAL,
+        days_until_stockout TEXT,
+        urgency TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_fct_forecasts_item_run ON fct_forecasts(item_id, run_id)",
+    """
+    CREATE INDEX IF NOT EXISTS idx_fct_forecasts_category_run
+    ON fct_forecasts(category, run_id)
+    WHERE item_id IS NULL
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_fct_forecasts_run_reorder ON fct_forecasts(run_id, reorder_quantity)",
+]
+
+
+def ensure_forecast_schema(conn: sqlite3.Connection):
+    """Create forecast tables and indexes if they do not exist"""
+    for statement in FORECAST_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+def get_stock_levels(conn: sqlite3.Connection, item_ids: List[int]) -> Dict[int, float]:
+    """On-hand quantity per item from the stock ledger (empty without one)"""
+    has_ledger = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stock_levels'"
+    ).fetchone()
+    if not has_ledger:
+        return {}
+    levels = {}
+    for i in range(0, len(item_ids), 500):
+        batch = item_ids[i:i + 500]
+        levels.update(conn.execute(
+            f"SELECT item_id, on_hand FROM stock_levels WHERE item_id IN ({','.join('?' * len(batch))})",
+            batch
+        ).fetchall())
+    return levels
+
+
+def _forecast_row(run_id: int, item_id: Optional[int], forecast: Dict[str, Any], last_qty: Optional[float],
+                  on_hand: Optional[float], ml_service) -> tuple:
+    category = forecast['category_used']
+    predictions = forecast['predictions']
+    reorder = {}
+    if on_hand is not None:
+        days = DEFAULT_LEAD_TIME_DAYS + 7
+        window = predictions[:days]
+        reorder = ml_service.reorder_from_forecast(item_id, on_hand, {
+            'forecast_days': days,
+            'predictions': window,
+            'summary': {'total_predicted_demand': round(sum(p['predicted_quantity'] for p in window), 2)}
+        }, DEFAULT_SAFETY_MULTIPLIER)['recommendations']
+    return (
+        run_id, item_id, category, ml_service.category_versions.get(category), predictions[0]['date'],
+        last_qty, json.dumps([p['predicted_quantity'] for p in predictions]), on_hand,
+        reorder.get('reorder_quantity'), reorder.get('safety_stock_level'),
+        reorder.get('days_until_stockout'), reorder.get('urgency')
+    )
+
+
+def run_forecasts(conn: sqlite3.Connection, ml_service, horizon_days: int = FORECAST_HORIZON_DAYS) -> Dict[str, Any]:
+    """
+    Precompute forecasts for every active item and category model
+
+    Args:
+        conn: Database connection
+        ml_service: MLPredictionService used for inference
+        horizon_days: Days forecast per series
+
+    Returns:
+        Dict with the run id, start date and item/category/failure counts
+    """
+    ensure_forecast_schema(conn)
+    run_id = conn.execute(
+        "INSERT INTO forecast_runs (started, status, horizon_days, model_version) VALUES (?, 'running', ?, ?)",
+        (int(time.time()), horizon_days, ml_service.model_version)
+    ).lastrowid
+    conn.commit()
+
+    try:
+        refresh_item_categories(conn)
+        items = conn.execute(
+            """
+            SELECT s.item_id, i.title, c.category
+            FROM item_stats s
+            JOIN dim_items i ON i.id = s.item_id
+            JOIN dim_item_category c ON c.item_id = s.item_id
+            WHERE i.status = 'Active' AND s.qty_90d > 0
+            ORDER BY s.item_id
+            """
+        ).fetchall()
+        item_ids = [item_id for item_id, _, _ in items]
+        features = get_items_features(conn, item_ids)
+        stock = get_stock_levels(conn, item_ids)
+
+        rows, failed = [], 0
+        for start in range(0, len(items), FORECAST_BATCH_ITEMS):
+            batch = items[start:start + FORECAST_BATCH_ITEMS]
+            forecasts = ml_service.predict_demand_many(
+                [(item_id, title, features[item_id]['last_qty'], category) for item_id, title, category in batch],
+                forecast_days=horizon_days
+            )
+            for (item_id, _, _), forecast in zip(batch, forecasts):
+                if forecast.get('status') == 'error':
+                    failed += 1
+                    continue
+                rows.append(_forecast_row(
+                    run_id, item_id, forecast, features[item_id]['last_qty'], stock.get(item_id), ml_service
+                ))
+        item_rows = len(rows)
+
+        categories = ml_service.stock_forecaster.categories if ml_service.stock_forecaster else []
+        category_qty = []
+        for category in categories:
+            category_features = get_category_features(conn, category)
+            category_qty.append((category, category_features['last_qty'] if category_features['items'] else None))
+        for (category, qty), forecast in zip(
+            category_qty, ml_service.predict_category_demand_many(category_qty, forecast_days=horizon_days)
+        ):
+            if forecast.get('status') == 'error':
+                failed += 1
+                continue
+            rows.append(_forecast_row(run_id, None, forecast, qty, None, ml_service))
+
+        start_date = rows[0][4] if rows else None
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO fct_forecasts (
+                    run_id, item_id, category, model_version, start_date, last_qty, daily,
+                    current_stock, reorder_quantity, safety_stock_level, days_until_stockout, urgency
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows
+            )
+            log_forecasts(conn, (
+                (item_id, category, start, json.loads(daily), version, 'precomputed')
+                for _, item_id, category, version, start, _, daily, *_ in rows
+            ), commit=False)
+            conn.execute(
+                """
+                UPDATE forecast_runs
+                SET status = 'success', finished = ?, start_date = ?, items = ?, categories = ?, failed = ?
+                WHERE run_id = ?
+                """,
+                (int(time.time()), start_date, item_rows, len(rows) - item_rows, failed, run_id)
+            )
+            old_runs = "SELECT run_id FROM forecast_runs ORDER BY run_id DESC LIMIT -1 OFFSET ?"
+            conn.execute(f"DELETE FROM fct_forecasts WHERE run_id IN ({old_runs})", (FORECAST_RUNS_KEPT,))
+            conn.execute(f"DELETE FROM forecast_runs WHERE run_id IN ({old_runs})", (FORECAST_RUNS_KEPT,))
+    except Exception as e:
+        conn.rollback()
+        conn.execute(
+            "UPDATE forecast_runs SET status = 'error', finished = ?, error = ? WHERE run_id = ?",
+            (int(time.time()), str(e), run_id)
+        )
+        conn.commit()
+        raise
+
+    return {
+        'run_id': run_id,
+        'start_date': start_date,
+        'items': item_rows,
+        'categories': len(rows) - item_rows,
+        'failed': failed
+    }
+
+
+# ============================================================================
+# READS
+# ============================================================================
+
+def _latest_run(conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+    try:
+        cur = conn.execute("SELECT * FROM forecast_runs WHERE status = 'success' ORDER BY run_id DESC LIMIT 1")
+    except sqlite3.OperationalError:
+        return None  # no run yet
+    row = cur.fetchone()
+    return dict(zip([c[0] for c in cur.description], row)) if row else None
+
+
+def load_item_forecast(conn: sqlite3.Connection, item_id: int, last_qty: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    An item's forecast from the latest successful run that covers it
+
+    Returns None when there is none, or when last_qty is given and differs
+    from the quantity the forecast started from. The caller checks the
+    start date and model version (MLPredictionService.predict_demand).
+    """
+    try:
+        row = conn.execute(
+            """
+            SELECT f.run_id, f.category, f.model_version, f.start_date, f.last_qty, f.daily
+            FROM fct_forecasts f
+            JOIN forecast_runs r ON r.run_id = f.run_id
+            WHERE f.item_id = ? AND r.status = 'success'
+            ORDER BY f.run_id DESC
+            LIMIT 1
+            """,
+            (item_id,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None  # no run yet
+    if row is None:
+        return None
+    run_id, category, model_version, start_date, stored_qty, daily = row
+    if last_qty is not None and (stored_qty is None or round(stored_qty, 3) != round(float(last_qty), 3)):
+        return None
+    return {
+        'run_id': run_id,
+        'category': category,
+        'model_version': model_version,
+        'start_date': start_date,
+        'daily': json.loads(daily)
+    }
+
+
+def get_reorder_suggestions(conn: sqlite3.Connection, limit: int = 100) -> Dict[str, Any]:
+    """Items with a positive reorder suggestion in the latest run, largest first"""
+    run = _latest_run(conn)
+    if run is None:
+        return {'run': None, 'suggestions': []}
+    cur = conn.execute(
+        """
+        SELECT f.item_id, i.title, f.category, f.current_stock, f.reorder_quantity,
+               f.safety_stock_level, f.days_until_stockout, f.urgency
+        FROM fct_forecasts f
+        LEFT JOIN dim_items i ON i.id = f.item_id
+        WHERE f.run_id = ? AND f.reorder_quantity > 0
+        ORDER BY f.reorder_quantity DESC
+        LIMIT ?
+        """,
+        (run['run_id'], limit)
+    )
+    columns = [c[0] for c in cur.description]
+    return {'run': run, 'suggestions': [dict(zip(columns, row)) for row in cur.fetchall()]}
+
+
+def get_category_forecasts(conn: sqlite3.Connection) -> Dict[str, Any]:
+    """Daily series per category model from the latest run"""
+    run = _latest_run(conn)
+    if run is None:
+        return {'run': None, 'categories': {}}
+    rows = conn.execute(
+        """
+        SELECT category, model_version, start_date, last_qty, daily
+        FROM fct_forecasts
+        WHERE run_id = ? AND item_id IS NULL
+        ORDER BY category
+        """,
+        (run['run_id'],)
+    ).fetchall()
+    return {
+        'run': run,
+        'categories': {
+            category: {
+                'model_version': model_version,
+                'start_date': start_date,
+                'last_qty': last_qty,
+                'daily': json.loads(daily)
+            }
+            for category, model_version, start_date, last_qty, daily in rows
+        }
+    }
@@ -0,0 +1,313 @@
+"""
+Fresh Flow Markets - Item Affinity
+"Frequently bought together" statistics from fct_order_items.
+
+Order lines are folded into a sparse order x item incidence matrix X one
+chunk at a time; X^T X gives the number of orders containing each item pair.
+Pair counts (`agg_item_pairs`) and per-item order counts
+(`agg_affinity_items`) are kept incrementally behind the 'affinity'
+watermark. `item_affinity` holds the top-K partners per item by
+co-occurrence and is re-ranked only for items that gained new pairs.
+Confidence and lift are derived at read time from the current counts.
+Refreshes run from the scheduler's refresh_rollups job; reads never
+refresh.
+"""
+
+import sqlite3
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from typing import Any, Dict, List, Set
+
+from .rollups import ensure_rollup_schema, get_watermark, immediate_transaction, set_watermark
+
+# Partners kept per item
+AFFINITY_TOP_K = 20
+
+AFFINITY_SCHEMA = [
+    # Orders containing both items (item_a < item_b)
+    """
+    CREATE TABLE IF NOT EXISTS agg_item_pairs (
+        item_a INTEGER NOT NULL,
+        item_b INTEGER NOT NULL,
+        orders INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (item_a, item_b)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_agg_item_pairs_b ON agg_item_pairs(item_b, item_a, orders)",
+    # Orders containing each item
+    """
+    CREATE TABLE IF NOT EXISTS agg_affinity_items (
+        item_id INTEGER PRIMARY KEY,
+        orders INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    # Number of orders with at least one item (the basket count for lift)
+    """
+    CREATE TABLE IF NOT EXISTS agg_affinity_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        baskets INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    # Top-K partners per item by co-occurrence
+    """
+    CREATE TABLE IF NOT EXISTS item_affinity (
+        item_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        other_item_id INTEGER NOT NULL,
+        co_orders INTEGER NOT NULL,
+        PRIMARY KEY (item_id, rank)
+    ) WITHOUT ROWID
+    """,
+]
+
+AFFINITY_TABLES = ['agg_item_pairs', 'agg_affinity_items', 'agg_affinity_totals', 'item_affinity']
+
+
+def ensure_affinity_schema(conn: sqlite3.Connection):
+    """Create affinity tables and indexes if they do not exist"""
+    ensure_rollup_schema(conn)
+    for statement in AFFINITY_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+def reset_affinity(conn: sqlite3.Connection):
+    """Clear the affinity tables so the next refresh rebuilds them"""
+    ensure_affinity_schema(conn)
+    for table in AFFINITY_TABLES:
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute("DELETE FROM rollup_watermarks WHERE name = 'affinity'")
+    conn.commit()
+
+
+def _earlier_lines(conn: sqlite3.Connection, order_ids: np.ndarray, watermark: int) -> pd.DataFrame:
+    """Distinct (order_id, item_id) already consumed for orders that straddle the watermark"""
+    if watermark == 0 or len(order_ids) == 0:
+        return pd.DataFrame(columns=['order_id', 'item_id'], dtype=np.int64)
+    frames = []
+    ids = [int(x) for x in order_ids]
+    for i in range(0, len(ids), 500):
+        batch = ids[i:i + 500]
+        frames.append(pd.read_sql_query(
+            f"""
+            SELECT DISTINCT order_id, item_id FROM fct_order_items
+            WHERE order_id IN ({','.join('?' * len(batch))}) AND rowid <= ? AND item_id IS NOT NULL
+            """,
+            conn, params=batch + [watermark]
+        ))
+    return pd.concat(frames, ignore_index=True).astype(np.int64)
+
+
+def _pair_counts(lines: pd.DataFrame, items: np.ndarray) -> sparse.coo_matrix:
+    """
+    Upper-triangular item pair counts for a set of (order_id, item_id) rows
+
+    Args:
+        lines: Distinct (order_id, item_id) rows
+        items: Sorted item ids defining the matrix columns
+    """
+    if lines.empty:
+        return sparse.coo_matrix((len(items), len(items)), dtype=np.int64)
+    _, order_idx = np.unique(lines['order_id'].to_numpy(), return_inverse=True)
+    item_idx = np.searchsorted(items, lines['item_id'].to_numpy())
+    incidence = sparse.csr_matrix(
+        (np.ones(len(lines), dtype=np.int64), (order_idx, item_idx)),
+        shape=(order_idx.max() + 1, len(items))
+    )
+    return sparse.triu(incidence.T @ incidence, k=1).tocoo()
+
+
+def refresh_affinity(conn: sqlite3.Connection, chunk_size: int = 500_000, top_k: int = AFFINITY_TOP_K) -> int:
+    """
+    Fold new order lines into the pair counts and re-rank touched items
+
+    Each chunk's incidence matrix only spans the orders in that chunk, so
+    memory is bounded by chunk_size regardless of table size. Orders whose
+    lines straddle two refreshes only add the pairs they did not have yet.
+    Each chunk reads the watermark and commits its counts in one BEGIN
+    IMMEDIATE transaction.
+
+    Returns:
+        Number of order lines consumed
+    """
+    ensure_affinity_schema(conn)
+    touched: Set[int] = set()
+    consumed = 0
+
+    while True:
+        with immediate_transaction(conn):
+            watermark = get_watermark(conn, 'affinity')
+            df = pd.read_sql_query(
+                """
+                SELECT rowid AS source_rowid, order_id, item_id
+                FROM fct_order_items
+                WHERE rowid > ?
+                ORDER BY rowid
+                LIMIT ?
+                """,
+                conn, params=(watermark, chunk_size)
+            )
+            if df.empty:
+                break
+
+            lines = df.dropna(subset=['order_id', 'item_id'])[['order_id', 'item_id']].astype(np.int64)
+            earlier = _earlier_lines(conn, lines['order_id'].unique(), watermark)
+            fresh = lines.drop_duplicates().merge(earlier, how='left', indicator=True)
+            fresh = fresh[fresh['_merge'] == 'left_only'][['order_id', 'item_id']]
+
+            if not fresh.empty:
+                # Baskets: pairs of the complete orders minus pairs counted before
+                full = pd.concat([earlier, fresh], ignore_index=True)
+                items = np.unique(full['item_id'].to_numpy())
+                delta = (_pair_counts(full, items) - _pair_counts(earlier, items)).tocoo()
+                delta.eliminate_zeros()
+
+                conn.executemany(
+                    """
+                    INSERT INTO agg_item_pairs (item_a, item_b, orders) VALUES (?, ?, ?)
+                    ON CONFLICT(item_a, item_b) DO UPDATE SET orders = orders + excluded.orders
+                    """,
+                    zip(items[delta.row].tolist(), items[delta.col].tolist(), delta.data.tolist())
+                )
+                conn.executemany(
+                    """
+                    INSERT INTO agg_affinity_items (item_id, orders) VALUES (?, ?)
+                    ON CONFLICT(item_id) DO UPDATE SET orders = orders + excluded.orders
+                    """,
+                    fresh.groupby('item_id').size().items()
+                )
+                new_baskets = len(np.setdiff1d(fresh['order_id'].unique(), earlier['order_id'].unique()))
+                conn.execute(
+                    """
+                    INSERT INTO agg_affinity_totals (id, baskets) VALUES (1, ?)
+                    ON CONFLICT(id) DO UPDATE SET baskets = baskets + excluded.baskets
+                    """,
+                    (new_baskets,)
+                )
+                touched.update(items[delta.row].tolist())
+                touched.update(items[delta.col].tolist())
+
+            set_watermark(conn, 'affinity', int(df['source_rowid'].iloc[-1]))
+        consumed += len(df)
+
+    if touched:
+        rerank_items(conn, sorted(touched), top_k)
+    return consumed
+
+
+def rerank_items(conn: sqlite3.Connection, item_ids: List[int], top_k: int = AFFINITY_TOP_K):
+    """Recompute the top-K partners for the given items from agg_item_pairs"""
+    for i in range(0, len(item_ids), 500):
+        batch = item_ids[i:i + 500]
+        placeholders = ','.join('?' * len(batch))
+        pairs = pd.read_sql_query(
+            f"""
+            SELECT item_a AS item_id, item_b AS other_item_id, orders AS co_orders
+            FROM agg_item_pairs WHERE item_a IN ({placeholders})
+            UNION ALL
+            SELECT item_b, item_a, orders
+            FROM agg_item_pairs WHERE item_b IN ({placeholders})
+            """,
+            conn, params=batch + batch
+        )
+        top = (
+            pairs.sort_values(['item_id', 'co_orders', 'other_item_id'], ascending=[True, False, True])
+            .groupby('item_id').head(top_k)
+        )
+        top['rank'] = top.groupby('item_id').cumcount() + 1
+
+        with conn:
+            conn.execute(f"DELETE FROM item_affinity WHERE item_id IN ({placeholders})", batch)
+            conn.executemany(
+                "INSERT INTO item_affinity (item_id, rank, other_item_id, co_orders) VALUES (?, ?, ?, ?)",
+                top[['item_id', 'rank', 'other_item_id', 'co_orders']].itertuples(index=False, name=None)
+            )
+
+
+def get_item_affinity(
+    conn: sqlite3.Connection,
+    item_id: int,
+    limit: int = 10,
+    sort: str = 'co_orders',
+    min_co_orders: int = 1
+) -> Dict[str, Any]:
+    """
+    Items most frequently bought together with an item
+
+    Args:
+        conn: SQLite connection
+        item_id: Anchor item
+        limit: Partners to return (at most the stored top-K, except for lift)
+        sort: 'co_orders', 'confidence' or 'lift'
+        min_co_orders: Minimum number of shared orders
+
+    Returns:
+        Dict with the anchor item's order count and its partners with
+        support, confidence (P(partner | item)) and lift
+    """
+    baskets_row = conn.execute("SELECT baskets FROM agg_affinity_totals WHERE id = 1").fetchone()
+    baskets = baskets_row[0] if baskets_row else 0
+    anchor_row = conn.execute("SELECT orders FROM agg_affinity_items WHERE item_id = ?", (int(item_id),)).fetchone()
+    anchor_orders = anchor_row[0] if anchor_row else 0
+
+    if sort == 'lift':
+        # Lift divides by the partner's order count, so the co-occurrence
+        # top-K does not hold the top partners by lift; rank every pair of
+        # the item instead (two index range scans)
+        cur = conn.execute(
+            """
+            SELECT r.other_item_id AS item_id, i.title, r.co_orders, r.item_orders
+            FROM (
+                SELECT p.other_item_id, p.co_orders, o.orders AS item_orders
+                FROM (
+                    SELECT item_b AS other_item_id, orders AS co_orders
+                    FROM agg_item_pairs WHERE item_a = :item AND orders >= :min_co
+                    UNION ALL
+                    SELECT item_a, orders
+                    FROM agg_item_pairs WHERE item_b = :item AND orders >= :min_co
+                ) p
+                LEFT JOIN agg_affinity_items o ON o.item_id = p.other_item_id
+                ORDER BY CAST(p.co_orders AS REAL) / o.orders DESC, p.co_orders DESC, p.other_item_id
+                LIMIT :limit
+            ) r
+            LEFT JOIN dim_items i ON i.id = r.other_item_id
+            ORDER BY CAST(r.co_orders AS REAL) / r.item_orders DESC, r.co_orders DESC, r.other_item_id
+            """,
+            {'item': int(item_id), 'min_co': int(min_co_orders), 'limit': int(limit)}
+        )
+    else:
+        # For a fixed anchor, confidence orders partners exactly as co_orders
+        # does, so both are served from the stored top-K
+        cur = conn.execute(
+            """
+            SELECT a.other_item_id AS item_id, i.title, a.co_orders, o.orders AS item_orders
+            FROM item_affinity a
+            LEFT JOIN agg_affinity_items o ON o.item_id = a.other_item_id
+            LEFT JOIN dim_items i ON i.id = a.other_item_id
+            WHERE a.item_id = ? AND a.co_orders >= ?
+            ORDER BY a.rank
+            """,
+            (int(item_id), int(min_co_orders))
+        )
+    columns = [c[0] for c in cur.description]
+    partners = [dict(zip(columns, row)) for row in cur.fetchall()]
+
+    for partner in partners:
+        co_orders = partner['co_orders']
+        partner['support'] = round(co_orders / baskets, 6) if baskets else None
+        partner['confidence'] = round(co_orders / anchor_orders, 4) if anchor_orders else None
+        partner['lift'] = (
+            round(co_orders * baskets / (anchor_orders * partner['item_orders']), 4)
+            if anchor_orders and partner['item_orders'] else None
+        )
+
+    if sort != 'co_orders':
+        partners.sort(key=lambda p: p[sort] or 0, reverse=True)
+
+    return {
+        'item_id': int(item_id),
+        'item_orders': anchor_orders,
+        'baskets': baskets,
+        'partners': partners[:limit]
+    }
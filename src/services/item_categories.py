@@ -0,0 +1,274 @@
+"""
+Fresh Flow Markets - Item Categories
+Keyword-based mapping from item titles to product categories, shared by the
+ML service, the analytics rollups and the dashboard
+
+All keywords are compiled into one Aho-Corasick automaton. A single pass
+over a title finds every keyword occurrence, and keeps the category that
+comes first in CATEGORY_KEYWORDS, the same result as checking each
+category's keywords in turn. Results are memoized by title and by item id.
+
+`dim_item_category` holds the category of every catalog item. It is filled
+at ingest by refresh_item_categories; forecast paths join against it.
+"""
+
+import hashlib
+import sqlite3
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Checked in order; the first category with a matching keyword wins
+CATEGORY_KEYWORDS = {
+    # Specific Danish products
+    'Sodavand': ['cola', 'sodavand', 'naturfrisk', 'lemonade', 'fanta', 'sprite', 'pepsi', 'soda', 'cocio'],
+    'Vand': ['water', 'vand', 'kildevand', 'still water', 'sparkling', 'danskvand'],
+    'Øl': ['øl', 'beer', 'fadøl', 'pilsner', 'ipa', 'lager', 'ale', 'tuborg', 'carlsberg'],
+    'Cappuccino': ['cappuccino', 'latte', 'americano', 'kaffe', 'espresso', 'coffee', 'flat white', 'macchiato'],
+    'Lille_box': ['lille box', 'small box', 'lille'],
+    'Mellem_box': ['mellem box', 'medium box', 'mellem'],
+    'Ristet_Hotdog': ['hotdog', 'ristet', 'fransk', 'pølse', 'hot dog'],
+    'Øl_Vand_Spiritus': ['spiritus', 'vodka', 'gin', 'rum', 'whisky', 'liquor', 'alkohol'],
+    # Broad categories
+    'Beverages': ['juice', 'smoothie', 'shake', 'milkshake', 'drink', 'beverage', 'te', 'tea', 'lassi'],
+    'Handhelds': ['sandwich', 'wrap', 'burger', 'panini', 'toast', 'roll', 'pita', 'durum', 'rulle'],
+    'Breakfast_&_Brunch': ['breakfast', 'brunch', 'morgenmad', 'oatmeal', 'yogurt', 'granola', 'croissant', 'pancake'],
+    'Desserts_&_Sweets': ['dessert', 'cake', 'pastry', 'cookie', 'brownie', 'sweet', 'ice cream', 'kage',
+                          'mousse', 'oreo', 'gelato'],
+    'Main_Courses': ['main', 'course', 'meal', 'dinner', 'lunch', 'pasta', 'chicken', 'fish', 'beef',
+                     'pizza', 'steak', 'kylling', 'kebab', 'curry', 'bolognese', 'lasagna'],
+    'Salads_&_Greens': ['salad', 'salat', 'greens', 'vegetables', 'veggie', 'asparges'],
+    'Sides_&_Snacks': ['side', 'snack', 'fries', 'chips', 'pommes', 'nachos', 'fritter', 'oliven', 'mandler',
+                       'nuggets', 'samosa'],
+    'Sushi_&_Asian': ['sushi', 'asian', 'noodles', 'rice', 'ramen', 'poke', 'wok', 'maki', 'nigiri', 'gyoza',
+                      'tempura', 'sashimi', 'edamame'],
+    'Misc_Services': ['service', 'delivery', 'fee', 'charge', 'levering', 'deposit', 'powerbank', 'lighter',
+                      'personale', 'klip', 'pose'],
+    'Other_Uncategorized': []  # Fallback
+}
+
+FALLBACK_CATEGORY = 'Other_Uncategorized'
+
+# Broad category (one per dashboard stock forecaster model) of each specific product category
+BROAD_CATEGORIES = {
+    'Sodavand': 'Beverages',
+    'Vand': 'Beverages',
+    'Øl': 'Beverages',
+    'Cappuccino': 'Beverages',
+    'Øl_Vand_Spiritus': 'Beverages',
+    'Ristet_Hotdog': 'Handhelds',
+    'Lille_box': FALLBACK_CATEGORY,
+    'Mellem_box': FALLBACK_CATEGORY,
+}
+
+# Titles memoized by categorize; item ids by categorize_item
+TITLE_CACHE_SIZE = 65536
+ITEM_CACHE_SIZE = 200_000
+
+ITEM_CATEGORY_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS dim_item_category (
+        item_id INTEGER PRIMARY KEY,
+        title TEXT,
+        category TEXT NOT NULL,
+        broad_category TEXT NOT NULL,
+        keywords_version TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_dim_item_category_category ON dim_item_category(category)",
+    "CREATE INDEX IF NOT EXISTS idx_dim_item_category_broad ON dim_item_category(broad_category)",
+]
+
+
+def _compile(keywords: Dict[str, List[str]]) -> Tuple[List[Dict[str, int]], List[Optional[int]], List[str]]:
+    """
+    Aho-Corasick automaton over every keyword, as a DFA: transitions[state]
+    maps a character to the next state, and priority[state] is the index of
+    the first category with a keyword ending in that state (None if none)
+    """
+    categories = [category for category, words in keywords.items() if words]
+    goto: List[Dict[str, int]] = [{}]
+    priority: List[Optional[int]] = [None]
+    for index, category in enumerate(categories):
+        for word in keywords[category]:
+            state = 0
+            for char in word:
+                if char not in goto[state]:
+                    goto.append({})
+                    priority.append(None)
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            if priority[state] is None or index < priority[state]:
+                priority[state] = index
+
+    # Breadth-first, so a state's failure link is finished before the state
+    fail = [0] * len(goto)
+    transitions: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        transitions[state] = {**transitions[fail[state]], **goto[state]}
+        inherited = priority[fail[state]]
+        if inherited is not None and (priority[state] is None or inherited < priority[state]):
+            priority[state] = inherited
+        for char, child in goto[state].items():
+            fail[child] = transitions[fail[state]].get(char, 0) if state else 0
+            queue.append(child)
+    return transitions, priority, categories
+
+
+_TRANSITIONS, _PRIORITY, _MATCH_CATEGORIES = _compile(CATEGORY_KEYWORDS)
+
+# Changes whenever the keyword table does; stored rows from older tables are reclassified
+KEYWORDS_VERSION = hashlib.sha1(
+    repr((list(CATEGORY_KEYWORDS.items()), sorted(BROAD_CATEGORIES.items()))).encode('utf-8')
+).hexdigest()[:12]
+
+
+@lru_cache(maxsize=TITLE_CACHE_SIZE)
+def _match(item_lower: str) -> Optional[str]:
+    transitions, priority = _TRANSITIONS, _PRIORITY
+    state, best = 0, None
+    for char in item_lower:
+        state = transitions[state].get(char, 0)
+        found = priority[state]
+        if found is not None and (best is None or found < best):
+            best = found
+            if best == 0:
+                break
+    return _MATCH_CATEGORIES[best] if best is not None else None
+
+
+def categorize(item_name: Optional[str], default: Optional[str] = None) -> Optional[str]:
+    """
+    Map an item name to a category using keyword matching
+
+    Args:
+        item_name: The item's name/title
+        default: Returned when no keyword matches
+
+    Returns:
+        Category name, or `default` if none matches
+    """
+    if not item_name:
+        return default
+    category = _match(item_name.lower())
+    return category if category is not None else default
+
+
+def broad_category(category: Optional[str]) -> str:
+    """Broad category (dashboard model key) for a category from categorize"""
+    if not category:
+        return FALLBACK_CATEGORY
+    return BROAD_CATEGORIES.get(category, category)
+
+
+_item_cache: Dict[int, Tuple[Optional[str], Optional[str]]] = {}
+
+
+def categorize_item(item_id: Optional[int], item_name: Optional[str], default: Optional[str] = None) -> Optional[str]:
+    """categorize, memoized by item id (recomputed if the item's title changed)"""
+    if item_id is None:
+        return categorize(item_name, default)
+    cached = _item_cache.get(item_id)
+    if cached is None or cached[0] != item_name:
+        if len(_item_cache) >= ITEM_CACHE_SIZE:
+            _item_cache.clear()
+        cached = _item_cache[item_id] = (item_name, categorize(item_name))
+    return cached[1] if cached[1] is not None else default
+
+
+# ============================================================================
+# CATALOG TABLE
+# ============================================================================
+
+def ensure_item_category_schema(conn: sqlite3.Connection, commit: bool = True):
+    """Create dim_item_category and its indexes if they do not exist"""
+    for statement in ITEM_CATEGORY_SCHEMA:
+        conn.execute(statement)
+    if commit:
+        conn.commit()
+
+
+def _store(conn: sqlite3.Connection, rows: Iterable[Tuple[int, Optional[str]]]) -> Dict[int, str]:
+    categories = {}
+    records = []
+    for item_id, title in rows:
+        category = categorize_item(int(item_id), title, FALLBACK_CATEGORY)
+        categories[int(item_id)] = category
+        records.append((int(item_id), title, category, broad_category(category), KEYWORDS_VERSION))
+    conn.executemany(
+        """
+        INSERT INTO dim_item_category (item_id, title, category, broad_category, keywords_version)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(item_id) DO UPDATE SET
+            title = excluded.title,
+            category = excluded.category,
+            broad_category = excluded.broad_category,
+            keywords_version = excluded.keywords_version
+        """,
+        records
+    )
+    return categories
+
+
+def refresh_item_categories(conn: sqlite3.Connection) -> int:
+    """
+    Classify every dim_items row that is new, retitled or classified with an
+    older keyword table into dim_item_category
+
+    Returns:
+        Number of items (re)classified
+    """
+    ensure_item_category_schema(conn)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'dim_items'").fetchone():
+        return 0
+    rows = conn.execute(
+        """
+        SELECT i.id, i.title
+        FROM dim_items i
+        LEFT JOIN dim_item_category c ON c.item_id = i.id
+        WHERE i.id IS NOT NULL
+          AND (c.item_id IS NULL OR c.title IS NOT i.title OR c.keywords_version != ?)
+        """,
+        (KEYWORDS_VERSION,)
+    ).fetchall()
+    if not rows:
+        return 0
+    with conn:
+        _store(conn, rows)
+    return len(rows)
+
+
+def load_item_categories(conn: sqlite3.Connection, item_ids: List[int],
+                         default: str = FALLBACK_CATEGORY, store: bool = True) -> Dict[int, str]:
+    """
+    Category per item id from dim_item_category
+
+    Ids missing there (or classified with an older keyword table) are
+    classified from their dim_items title and, with store, written back
+    without committing (so it can run inside the caller's transaction).
+    Ids not in dim_items get `default`.
+    """
+    ensure_item_category_schema(conn, commit=False)
+    categories = {}
+    for i in range(0, len(item_ids), 500):
+        batch = [int(item_id) for item_id in item_ids[i:i + 500]]
+        placeholders = ','.join('?' * len(batch))
+        categories.update(conn.execute(
+            f"SELECT item_id, category FROM dim_item_category WHERE item_id IN ({placeholders}) AND keywords_version = ?",
+            batch + [KEYWORDS_VERSION]
+        ).fetchall())
+        missing = [item_id for item_id in batch if item_id not in categories]
+        if missing:
+            rows = conn.execute(
+                f"SELECT id, title FROM dim_items WHERE id IN ({','.join('?' * len(missing))})",
+                missing
+            ).fetchall()
+            if store:
+                categories.update(_store(conn, rows))
+            else:
+                categories.update(
+                    (int(item_id), categorize_item(int(item_id), title, FALLBACK_CATEGORY)) for item_id, title in rows
+                )
+    return {int(item_id): categories.get(int(item_id), default) for item_id in item_ids}
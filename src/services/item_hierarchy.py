@@ -0,0 +1,212 @@
+"""
+Fresh Flow Markets - Item Hierarchy
+Item-level forecasts disaggregated from category forecasts.
+
+The forecasters are trained per category. An item's forecast here is its
+category's forecast times the item's share of category volume, so the item
+forecasts of a category add up to the category forecast (top-down
+reconciliation).
+
+Shares come from agg_item_daily as a dense items x days matrix over the
+last SHARE_WINDOW_DAYS days up to the feature store's as-of day. Days are
+weighted with a SHARE_HALF_LIFE_DAYS half-life, so shares follow recent
+demand. Items without sales in the window have no share and forecast zero.
+When a category's items sold nothing in the window, it splits evenly.
+Shares are cached in process for SHARE_CACHE_TTL seconds.
+"""
+
+import sqlite3
+import threading
+import time
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from .feature_store import database_key, features_as_of, get_category_features
+from .item_categories import load_item_categories
+
+# Days of history a share is computed over (including the as-of day)
+SHARE_WINDOW_DAYS = 28
+
+# A day's weight halves every this many days back from the as-of day
+SHARE_HALF_LIFE_DAYS = 7.0
+
+# Seconds computed shares are reused
+SHARE_CACHE_TTL = 300
+
+# db -> (expires_at, ItemShares)
+_cache: Dict[str, tuple] = {}
+_lock = threading.Lock()
+
+
+class ItemShares:
+    """
+    Each item's share of its category's recent volume
+
+    Attributes:
+        as_of: Last day of the window (ISO date), None without sales data
+        item_ids: Sorted item ids (int64)
+        categories: Category names; category_index points into this list
+        category_index: Category of each item
+        shares: Share of each item (sums to 1 per category)
+    """
+    def __init__(self, as_of: Optional[str], item_ids: np.ndarray, categories: List[str],
+                 category_index: np.ndarray, shares: np.ndarray):
+        self.as_of = as_of
+        self.item_ids = item_ids
+        self.categories = categories
+        self.category_index = category_index
+        self.shares = shares
+
+    def positions(self, item_ids) -> np.ndarray:
+        """Row of each item id, -1 for items without a share"""
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        rows = np.searchsorted(self.item_ids, item_ids)
+        rows = np.minimum(rows, max(len(self.item_ids) - 1, 0))
+        found = (self.item_ids[rows] == item_ids) if len(self.item_ids) else np.zeros(len(item_ids), dtype=bool)
+        return np.where(found, rows, -1)
+
+
+def compute_item_shares(conn: sqlite3.Connection, as_of: Optional[date] = None,
+                        window_days: int = SHARE_WINDOW_DAYS,
+                        half_life_days: float = SHARE_HALF_LIFE_DAYS) -> ItemShares:
+    """
+    Item shares from agg_item_daily (see module docstring)
+
+    Args:
+        conn: Database connection
+        as_of: Last day of the window; the feature store's as-of day by default
+        window_days: Days in the window
+        half_life_days: Half-life of the day weights
+    """
+    as_of = as_of or features_as_of(conn)
+    empty = ItemShares(None, np.zeros(0, dtype=np.int64), [], np.zeros(0, dtype=np.int64), np.zeros(0))
+    if as_of is None:
+        return empty
+    start = as_of - timedelta(days=window_days - 1)
+    daily = pd.read_sql_query(
+        "SELECT item_id, day, quantity FROM agg_item_daily WHERE day BETWEEN ? AND ?",
+        conn, params=(start.isoformat(), as_of.isoformat())
+    )
+    if daily.empty:
+        return empty
+
+    # items x days-ago matrix (column 0 is the as-of day)
+    items, row = np.unique(daily['item_id'].to_numpy(dtype=np.int64), return_inverse=True)
+    age = (np.datetime64(as_of) - daily['day'].to_numpy().astype('datetime64[D]')).astype(np.int64)
+    volume = np.zeros((len(items), window_days))
+    np.add.at(volume, (row, age), daily['quantity'].to_numpy(dtype=np.float64))
+    weighted = volume @ (0.5 ** (np.arange(window_days) / half_life_days))
+
+    item_categories = load_item_categories(conn, items.tolist(), store=False)
+    categories, category_index = np.unique(
+        np.array([item_categories[i] for i in items.tolist()], dtype=object).astype(str), return_inverse=True
+    )
+    totals = np.bincount(category_index, weights=weighted, minlength=len(categories))
+    counts = np.bincount(category_index, minlength=len(categories))
+    item_totals = totals[category_index]
+    shares = np.divide(weighted, item_totals, out=1.0 / counts[category_index], where=item_totals > 0)
+    return ItemShares(as_of.isoformat(), items, categories.tolist(), category_index.astype(np.int64), shares)
+
+
+def get_item_shares(conn: sqlite3.Connection) -> ItemShares:
+    """compute_item_shares with the defaults, cached per database"""
+    db_key = database_key(conn)
+    with _lock:
+        entry = _cache.get(db_key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    shares = compute_item_shares(conn)
+    with _lock:
+        _cache[db_key] = (time.monotonic() + SHARE_CACHE_TTL, shares)
+    return shares
+
+
+def invalidate(conn: sqlite3.Connection):
+    """Drop this database's cached shares"""
+    with _lock:
+        _cache.pop(database_key(conn), None)
+
+
+def disaggregate(category_daily: np.ndarray, category_index: np.ndarray, shares: np.ndarray) -> np.ndarray:
+    """
+    Item forecasts from category forecasts
+
+    Args:
+        category_daily: (n_categories, days) category forecasts
+        category_index: Category row of each item
+        shares: Share of each item
+
+    Returns:
+        (n_items, days) array, category_daily[category_index] * shares
+    """
+    daily = np.take(np.asarray(category_daily, dtype=np.float64), category_index, axis=0)
+    daily *= shares[:, None]
+    return daily
+
+
+def forecast_items(conn: sqlite3.Connection, ml_service, forecast_days: int = 7,
+                   item_ids: Optional[List[int]] = None, category: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Item-level forecasts for the given items, or for every item with a share
+    (optionally only one category's items)
+
+    Each category is forecast once from its feature store last_qty, then
+    all items are disaggregated in one step.
+
+    Returns:
+        Dict with as_of, start_date, forecast_days, per-category totals
+        and status, and numpy arrays item_ids, categories (category per item,
+        None without a share), shares and daily (items x days)
+    """
+    shares = get_item_shares(conn)
+    if item_ids is not None:
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        rows = shares.positions(item_ids)
+    else:
+        rows = np.arange(len(shares.item_ids))
+        if category is not None:
+            code = shares.categories.index(category) if category in shares.categories else -1
+            rows = rows[shares.category_index == code]
+        item_ids = shares.item_ids[rows]
+    known = rows >= 0
+
+    used = sorted(set(np.asarray(shares.category_index)[rows[known]].tolist()))
+    series = []
+    for code in used:
+        features = get_category_features(conn, shares.categories[code])
+        series.append((shares.categories[code], features['last_qty'] if features['items'] else None))
+    forecasts = ml_service.predict_category_demand_many(series, forecast_days=forecast_days) if series else []
+
+    category_daily = np.zeros((len(shares.categories), forecast_days))
+    categories, start_date = {}, None
+    for code, forecast in zip(used, forecasts):
+        name = shares.categories[code]
+        if forecast.get('status') == 'error':
+            categories[name] = {'status': 'error', 'error': forecast.get('error')}
+            continue
+        category_daily[code] = [p['predicted_quantity'] for p in forecast['predictions']]
+        start_date = start_date or forecast['predictions'][0]['date']
+        categories[name] = {
+            'status': 'success',
+            'total_predicted_demand': forecast['summary']['total_predicted_demand']
+        }
+
+    daily = np.zeros((len(item_ids), forecast_days))
+    daily[known] = disaggregate(category_daily, shares.category_index[rows[known]], shares.shares[rows[known]])
+    item_categories = np.full(len(item_ids), None, dtype=object)
+    item_shares = np.zeros(len(item_ids))
+    if shares.categories:
+        item_categories[known] = np.asarray(shares.categories, dtype=object)[shares.category_index[rows[known]]]
+        item_shares[known] = shares.shares[rows[known]]
+    return {
+        'as_of': shares.as_of,
+        'start_date': start_date,
+        'forecast_days': forecast_days,
+        'categories': categories,
+        'item_ids': item_ids,
+        'item_categories': item_categories,
+        'shares': item_shares,
+        'daily': daily
+    }
@@ -5,10 +5,15 @@ Unified service for all ML model predictions
 
 import os
 import sys
+import time
+import inspect
 import joblib
+import hashlib
+import threading
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
 from typing import Dict, List, Any, Optional
 import json
 
@@ -16,6 +21,9 @@ import json
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'ML_Models', 'stock_forecaster', 'Guide_to_use'))
 from model import StockForecaster
 
+from .forecast_cache import ForecastCache, forecast_key
+from .item_categories import CATEGORY_KEYWORDS, categorize_item
+
 class MLPredictionService:
     """
     Unified ML prediction service supporting all Fresh Flow Markets models:
@@ -58,6 +66,24 @@ class MLPredictionService:
         self.item_forecast_models = {}
         
         # Initialize category-based Stock Forecaster
+        self._init_stock_forecaster()
+        
+        # Category mapping for items - matches model categories
+        self.category_keywords = CATEGORY_KEYWORDS
+        
+        # Fingerprint of the model files this instance was loaded from
+        self.model_version = self.model_signature()
+        
+        # Memoized forecast series, keyed on inputs and category model version
+        self.forecast_cache = ForecastCache()
+        self.category_versions = self._category_versions()
+        
+        # Warm-up state; ready once every artifact has been loaded once
+        self.ready = False
+        self.warmup_report = {'state': 'pending'}
+        self._warmup_lock = threading.Lock()
+    
+    def _init_stock_forecaster(self):
         try:
             self.stock_forecaster = StockForecaster(
                 models_dir=os.path.join(self.models_dir, 'stock_forecaster')
@@ -65,30 +91,204 @@ class MLPredictionService:
         except Exception as e:
             print(f"Warning: Could not initialize StockForecaster: {e}")
             self.stock_forecaster = None
+    
+    # Baseline when no recent demand is known for an item
+    DEFAULT_LAST_QTY = 50.0
+    
+    # Distinct forecast series per predict_many call before bulk forecasts
+    # are split across a thread pool
+    BULK_PARALLEL_SERIES = 2000
+    
+    # Files that count as model artifacts when fingerprinting models_dir
+    MODEL_FILE_EXTENSIONS = ('.pkl', '.joblib', '.json', '.h5', '.keras')
+    
+    def model_signature(self) -> str:
+        """
+        Fingerprint of the model artifacts on disk (path, size, mtime)
         
-        # Category mapping for items - matches model categories
-        self.category_keywords = {
-            # Specific Danish products
-            'Sodavand': ['cola', 'sodavand', 'naturfrisk', 'lemonade', 'fanta', 'sprite', 'pepsi', 'soda', 'cocio'],
-            'Vand': ['water', 'vand', 'kildevand', 'still water', 'sparkling', 'danskvand'],
-            'Øl': ['øl', 'beer', 'fadøl', 'pilsner', 'ipa', 'lager', 'ale', 'tuborg', 'carlsberg'],
-            'Cappuccino': ['cappuccino', 'latte', 'americano', 'kaffe', 'espresso', 'coffee', 'flat white', 'macchiato'],
-            'Lille_box': ['lille box', 'small box', 'lille'],
-            'Mellem_box': ['mellem box', 'medium box', 'mellem'],
-            'Ristet_Hotdog': ['hotdog', 'ristet', 'fransk', 'pølse', 'hot dog'],
-            'Øl_Vand_Spiritus': ['spiritus', 'vodka', 'gin', 'rum', 'whisky', 'liquor', 'alkohol'],
-            # Broad categories
-            'Beverages': ['juice', 'smoothie', 'shake', 'milkshake', 'drink', 'beverage', 'te', 'tea'],
-            'Handhelds': ['sandwich', 'wrap', 'burger', 'panini', 'toast', 'roll'],
-            'Breakfast_&_Brunch': ['breakfast', 'brunch', 'morgenmad', 'oatmeal', 'yogurt', 'granola', 'croissant'],
-            'Desserts_&_Sweets': ['dessert', 'cake', 'pastry', 'cookie', 'brownie', 'sweet', 'ice cream', 'kage'],
-            'Main_Courses': ['main', 'course', 'meal', 'dinner', 'lunch', 'pasta', 'chicken', 'fish', 'beef'],
-            'Salads_&_Greens': ['salad', 'salat', 'greens', 'vegetables', 'veggie'],
-            'Sides_&_Snacks': ['side', 'snack', 'fries', 'chips', 'pommes', 'nachos'],
-            'Sushi_&_Asian': ['sushi', 'asian', 'noodles', 'rice', 'ramen', 'poke', 'wok'],
-            'Misc_Services': ['service', 'delivery', 'fee', 'charge'],
-            'Other_Uncategorized': []  # Fallback
+        Changes whenever a model file is added, removed or rewritten.
+        """
+        entries = []
+        for root, _, files in os.walk(self.models_dir):
+            for name in files:
+                if name.endswith(self.MODEL_FILE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append(f"{os.path.relpath(path, self.models_dir)}:{stat.st_size}:{stat.st_mtime_ns}")
+        return hashlib.sha1("\n".join(sorted(entries)).encode()).hexdigest()[:16]
+    
+    def _category_versions(self) -> Dict[str, str]:
+        """Fingerprint of each category's model and scaler files"""
+        if not self.stock_forecaster:
+            return {}
+        versions = {}
+        for category in self.stock_forecaster.categories:
+            parts = []
+            for path in (
+                os.path.join(self.stock_forecaster.model_dir, f"{category}.joblib"),
+                os.path.join(self.stock_forecaster.scaler_dir, f"{category}_scaler.joblib")
+            ):
+                try:
+                    stat = os.stat(path)
+                    parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+                except OSError:
+                    parts.append('-')
+            versions[category] = hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+        return versions
+    
+    def reload_models(self) -> Dict[str, Any]:
+        """Drop cached artifacts and reinitialize the forecaster from disk"""
+        previous = self.model_version
+        previous_categories = self.category_versions
+        self.loaded_models = {}
+        self.item_forecast_models = {}
+        self._init_stock_forecaster()
+        self.model_version = self.model_signature()
+        self.category_versions = self._category_versions()
+        
+        # Forecasts of retrained (or removed) category models are stale
+        invalidated = 0
+        for category, version in previous_categories.items():
+            if self.category_versions.get(category) != version:
+                invalidated += self.forecast_cache.invalidate_category(category)
+        
+        # Load the new artifacts now rather than on the next requests
+        warmup = self.warm_up()
+        return {
+            'previous_version': previous,
+            'model_version': self.model_version,
+            'invalidated_forecasts': invalidated,
+            'warmup_seconds': warmup.get('seconds')
+        }
+    
+    def reload_if_changed(self) -> Dict[str, Any]:
+        """Reload models only when the files on disk changed since the last load"""
+        current = self.model_signature()
+        if current == self.model_version:
+            return {'reloaded': False, 'model_version': current}
+        return {'reloaded': True, **self.reload_models()}
+    
+    # ========================================================================
+    # WARM-UP
+    # ========================================================================
+    
+    def _artifact_files(self, model_type: str) -> List[str]:
+        """Model files behind one model_configs entry"""
+        config = self.model_configs[model_type]
+        return [
+            os.path.join(self.models_dir, config['base_path'], filename)
+            for key, filename in config.items()
+            if key not in ('base_path', 'model_type', 'models_subdir', 'scalers_subdir')
+        ]
+    
+    def _warmup_tasks(self) -> Dict[str, tuple]:
+        """Artifact name -> (load, dummy predict, model files)"""
+        cashier_features = [
+            name for name in inspect.signature(self.detect_cashier_anomalies).parameters
+            if name not in ('cashier_id', 'shift_date')
+        ]
+        tasks = {
+            'campaign_roi': (
+                lambda: self._load_model_artifacts('campaign_roi'),
+                lambda: self.predict_campaign_performance(7, 0, 10.0, 0.0),
+                self._artifact_files('campaign_roi')
+            ),
+            'customer_churn': (
+                lambda: self._load_model_artifacts('customer_churn'),
+                lambda: self.predict_customer_churn(0, 0.0, 0.0, 0.0, 0.0),
+                self._artifact_files('customer_churn')
+            ),
+            'cashier_risk': (
+                lambda: self._load_model_artifacts('cashier_risk'),
+                lambda: self.detect_cashier_anomalies(0, date.today().isoformat(), **dict.fromkeys(cashier_features, 0)),
+                self._artifact_files('cashier_risk')
+            ),
         }
+        forecaster = self.stock_forecaster
+        for category in (forecaster.categories if forecaster else []):
+            tasks[f'demand_forecast/{category}'] = (
+                lambda category=category: forecaster._load(category),
+                lambda category=category: forecaster.predict_many([category], self.DEFAULT_LAST_QTY, 1),
+                [
+                    os.path.join(forecaster.model_dir, f"{category}.joblib"),
+                    os.path.join(forecaster.scaler_dir, f"{category}_scaler.joblib")
+                ]
+            )
+        return tasks
+    
+    @staticmethod
+    def _rss_bytes() -> Optional[int]:
+        """Current resident set size of this process (Linux only)"""
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError, AttributeError):
+            return None
+    
+    def warm_up(self, max_workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Load every model artifact and run one dummy prediction through it
+        
+        Artifacts (campaign, churn and cashier models, and one StockForecaster
+        model per category) load in parallel threads; joblib and XGBoost
+        release the GIL for most of the work. Marks the service ready when
+        done, even if some artifacts failed (they are listed in the report
+        and fall back to lazy loading).
+        
+        Args:
+            max_workers: Thread count (defaults to min(8, artifacts))
+        
+        Returns:
+            Report with per-artifact status, load and predict times (ms),
+            on-disk size, and process RSS before and after
+        """
+        with self._warmup_lock:
+            tasks = self._warmup_tasks()
+            started = time.perf_counter()
+            rss_before = self._rss_bytes()
+            self.warmup_report = {'state': 'running', 'started': datetime.now().isoformat(), 'artifacts': {}}
+            
+            def warm(name):
+                load, exercise, files = tasks[name]
+                entry = {'file_bytes': sum(os.path.getsize(f) for f in files if os.path.exists(f))}
+                try:
+                    t0 = time.perf_counter()
+                    load()
+                    t1 = time.perf_counter()
+                    result = exercise()
+                    t2 = time.perf_counter()
+                    status = result.get('status', 'ok') if isinstance(result, dict) else 'ok'
+                    entry.update({
+                        'status': 'ok' if status in ('ok', 'success') else status,
+                        'load_ms': round((t1 - t0) * 1000, 1),
+                        'predict_ms': round((t2 - t1) * 1000, 1)
+                    })
+                except Exception as e:
+                    entry.update({'status': 'error', 'error': f"{type(e).__name__}: {e}"})
+                return name, entry
+            
+            workers = max_workers or min(8, len(tasks)) or 1
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ml-warmup') as pool:
+                artifacts = dict(pool.map(warm, tasks))
+            
+            rss_after = self._rss_bytes()
+            self.warmup_report = {
+                'state': 'ready',
+                'started': self.warmup_report['started'],
+                'finished': datetime.now().isoformat(),
+                'seconds': round(time.perf_counter() - started, 3),
+                'workers': workers,
+                'rss_bytes_before': rss_before,
+                'rss_bytes_after': rss_after,
+                'rss_bytes_added': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+                'failed': sorted(name for name, entry in artifacts.items() if entry['status'] == 'error'),
+                'artifacts': artifacts
+            }
+            self.ready = True
+            return self.warmup_report
     
     def _load_model_artifacts(self, model_type: str) -> Dict[str, Any]:
         """Load model artifacts from disk"""
@@ -167,28 +367,18 @@ class MLPredictionService:
     # 1. DEMAND & STOCK FORECASTER
     # ========================================================================
     
-    def _map_item_to_category(self, item_name: str) -> Optional[str]:
+    def _map_item_to_category(self, item_name: str, item_id: Optional[int] = None) -> Optional[str]:
         """
         Map an item name to a trained category model using keyword matching
         
         Args:
             item_name: The item's name/title
+            item_id: The item's id (memoizes the result per item)
             
         Returns:
             Category name if found, None otherwise
         """
-        if not item_name:
-            return None
-            
-        item_lower = item_name.lower()
-        
-        # Check each category's keywords
-        for category, keywords in self.category_keywords.items():
-            for keyword in keywords:
-                if keyword.lower() in item_lower:
-                    return category
-        
-        return None
+        return categorize_item(item_id, item_name)
     
     def _load_item_forecast_model(self, item_name: str) -> Optional[Dict[str, Any]]:
         """Load item-specific forecast model and scaler"""
@@ -241,7 +431,10 @@ class MLPredictionService:
         is_weekend: bool = False,
         campaign_active: bool = False,
         price: Optional[float] = None,
-        item_name: Optional[str] = None
+        item_name: Optional[str] = None,
+        last_qty: Optional[float] = None,
+        precomputed: Optional[Dict[str, Any]] = None,
+        category: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Predict demand for an item over the next N days using category-based forecasting
@@ -254,6 +447,12 @@ class MLPredictionService:
             campaign_active: Whether a campaign will be running (for adjustments)
             price: Item price (optional, not used in new model)
             item_name: Item name (for category mapping)
+            last_qty: The item's most recent daily quantity (from the feature
+                store); DEFAULT_LAST_QTY when not given
+            precomputed: The item's stored nightly forecast (forecast_store);
+                served instead of live inference when it is fresh
+            category: The item's category from dim_item_category; mapped
+                from item_name when not given
         
         Returns:
             Dictionary with forecast data and recommendations
@@ -276,73 +475,32 @@ class MLPredictionService:
                 'forecast_days': forecast_days
             }
         
-        category = self._map_item_to_category(item_name)
+        category = category or self._map_item_to_category(item_name, item_id)
         if not category:
             # Use fallback category
             category = 'Other_Uncategorized'
         
         # Try to predict using category-based model
         try:
-            # Use average last_qty as baseline (could be improved by querying recent orders)
-            # For now, use a reasonable default based on category
-            last_qty = 50.0  # Default baseline
-            
-            # Generate daily predictions
-            predictions = []
+            last_qty = self._baseline_qty(last_qty)
+            start_date = self._forecast_start()
             
-            for day_offset in range(forecast_days):
-                pred_date = datetime.now() + timedelta(days=day_offset + 1)
-                
-                # Get day-specific features
-                day_of_week = pred_date.weekday()
-                is_weekend_day = 1 if day_of_week >= 5 else 0
-                is_holiday_day = 1 if is_holiday else 0
-                month = pred_date.month
-                
-                # Get prediction for this specific day with all features
-                daily_qty = self.stock_forecaster.predict(
-                    category_name=category,
-                    month=month,
-                    last_qty=last_qty,
-                    day_of_week=day_of_week,
-                    is_weekend=is_weekend_day,
-                    is_holiday=is_holiday_day
+            if precomputed and not is_holiday and not campaign_active and self._is_fresh(
+                precomputed, category, start_date, forecast_days
+            ):
+                response = self._forecast_response(
+                    item_id, forecast_days, category, precomputed['daily'][:forecast_days], start_date
                 )
-                
-                # Apply campaign boost if active
-                if campaign_active:
-                    daily_qty *= 1.2  # 20% boost for campaigns
-                
-                predictions.append({
-                    'date': pred_date.strftime('%Y-%m-%d'),
-                    'predicted_quantity': max(0, round(float(daily_qty), 2)),
-                    'day_of_week': pred_date.strftime('%A'),
-                    'is_weekend': pred_date.weekday() >= 5
-                })
-                
-                # Update last_qty for next iteration (use predicted value)
-                last_qty = daily_qty
+                response.update({'source': 'precomputed', 'run_id': precomputed['run_id']})
+                return response
             
-            # Calculate actual total from distributed predictions
-            total_predicted = sum(p['predicted_quantity'] for p in predictions)
+            # Daily predictions from one recursive pass (memoized); each
+            # day's prediction (with the 20% campaign boost) feeds the next day
+            daily = self._forecast_series(
+                [(category, last_qty)], forecast_days, start_date.date(), is_holiday, campaign_active
+            )[0]
             
-            # Get model accuracy (MAE) if available
-            mae = self.stock_forecaster.get_mean_absolute_error(category)
-            accuracy_note = f" (Model MAE: {mae:.2f})" if mae else ""
-            
-            return {
-                'status': 'success',
-                'item_id': item_id,
-                'forecast_days': forecast_days,
-                'category_used': category,
-                'message': f'Forecast based on {category} category model{accuracy_note}',
-                'predictions': predictions,
-                'summary': {
-                    'total_predicted_demand': round(total_predicted, 2),
-                    'avg_daily_demand': round(total_predicted / forecast_days, 2),
-                    'peak_day': max(predictions, key=lambda x: x['predicted_quantity']) if predictions else None
-                }
-            }
+            return {**self._forecast_response(item_id, forecast_days, category, daily, start_date), 'source': 'live'}
             
         except ValueError as e:
             # Category not found in models
@@ -367,6 +525,253 @@ class MLPredictionService:
                 'forecast_days': forecast_days
             }
     
+    @staticmethod
+    def _forecast_start() -> datetime:
+        """First forecast day: tomorrow in UTC, the day agg_item_daily and forecast accuracy score against"""
+        return datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=1)
+    
+    def _is_fresh(self, precomputed: Dict[str, Any], category: str, start_date: datetime, forecast_days: int) -> bool:
+        """Whether a stored forecast matches today's start date, the category and its current model"""
+        return (
+            precomputed['category'] == category
+            and precomputed['start_date'] == start_date.date().isoformat()
+            and precomputed['model_version'] == self.category_versions.get(category)
+            and len(precomputed['daily']) >= forecast_days
+        )
+    
+    def _baseline_qty(self, last_qty: Optional[float] = None) -> float:
+        """Starting quantity for a recursive forecast (DEFAULT_LAST_QTY when there is no recent demand)"""
+        if last_qty is None:
+            return self.DEFAULT_LAST_QTY
+        return float(last_qty)
+    
+    def _forecast_series(
+        self,
+        series: List[tuple],
+        forecast_days: int,
+        start_date,
+        is_holiday: bool = False,
+        campaign_active: bool = False
+    ) -> List[np.ndarray]:
+        """
+        Daily quantities per (category, starting quantity) series
+        
+        Series found in the forecast cache are reused; the rest go through
+        StockForecaster.predict_many together (split across a thread pool
+        above BULK_PARALLEL_SERIES series) and are cached. Raises ValueError
+        if a category has no model.
+        """
+        multiplier = 1.2 if campaign_active else 1.0
+        keys = [
+            forecast_key(
+                category, self.category_versions.get(category, self.model_version),
+                start_date, qty, forecast_days, is_holiday, multiplier
+            )
+            for category, qty in series
+        ]
+        daily = [self.forecast_cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(daily) if result is None]
+        if not missing:
+            return daily
+        
+        def run(rows):
+            # Forecast from the normalized starting quantity stored in the key
+            return self.stock_forecaster.predict_many(
+                [keys[i][0] for i in rows], [keys[i][3] for i in rows], forecast_days,
+                start_date=start_date,
+                is_holiday=1 if is_holiday else 0,
+                multiplier=multiplier
+            )
+        
+        if len(missing) > self.BULK_PARALLEL_SERIES:
+            chunks = [missing[i:i + self.BULK_PARALLEL_SERIES]
+                      for i in range(0, len(missing), self.BULK_PARALLEL_SERIES)]
+            with ThreadPoolExecutor(max_workers=min(len(chunks), os.cpu_count() or 1)) as pool:
+                results = list(pool.map(run, chunks))
+        else:
+            chunks = [missing]
+            results = [run(missing)]
+        for chunk, result in zip(chunks, results):
+            for row, i in enumerate(chunk):
+                self.forecast_cache.put(keys[i], result[row])
+                daily[i] = result[row]
+        return daily
+    
+    def _forecast_response(
+        self,
+        item_id: int,
+        forecast_days: int,
+        category: str,
+        daily: np.ndarray,
+        start_date: datetime
+    ) -> Dict[str, Any]:
+        """Build the forecast payload from an array of daily quantities"""
+        predictions = []
+        for day_offset, daily_qty in enumerate(daily):
+            pred_date = start_date + timedelta(days=day_offset)
+            predictions.append({
+                'date': pred_date.strftime('%Y-%m-%d'),
+                'predicted_quantity': max(0, round(float(daily_qty), 2)),
+                'day_of_week': pred_date.strftime('%A'),
+                'is_weekend': pred_date.weekday() >= 5
+            })
+        
+        # Calculate actual total from distributed predictions
+        total_predicted = sum(p['predicted_quantity'] for p in predictions)
+        
+        # Get model accuracy (MAE) if available
+        mae = self.stock_forecaster.get_mean_absolute_error(category)
+        accuracy_note = f" (Model MAE: {mae:.2f})" if mae else ""
+        
+        return {
+            'status': 'success',
+            'item_id': item_id,
+            'forecast_days': forecast_days,
+            'category_used': category,
+            'message': f'Forecast based on {category} category model{accuracy_note}',
+            'predictions': predictions,
+            'summary': {
+                'total_predicted_demand': round(total_predicted, 2),
+                'avg_daily_demand': round(total_predicted / forecast_days, 2),
+                'peak_day': max(predictions, key=lambda x: x['predicted_quantity']) if predictions else None
+            }
+        }
+    
+    def predict_demand_many(
+        self,
+        items: List[tuple],
+        forecast_days: int = 7,
+        is_holiday: bool = False,
+        campaign_active: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Demand forecasts for many items with batched inference
+        
+        Items without a given category are mapped from their name
+        (memoized per item id). Items that share a category and starting
+        quantity share one forecast series. Series not in the forecast
+        cache go through
+        StockForecaster.predict_many together (one model call per category
+        per day). Above BULK_PARALLEL_SERIES series the work is split across
+        a thread pool; XGBoost and numpy release the GIL while predicting.
+        
+        Args:
+            items: (item_id, item_name), (item_id, item_name, last_qty) or
+                (item_id, item_name, last_qty, category) tuples; item_name
+                None if unknown
+            forecast_days: Number of days to forecast ahead
+            is_holiday: Whether the forecast period includes holidays
+            campaign_active: Whether a campaign will be running
+        
+        Returns:
+            One predict_demand-style result per input item, in input order
+        """
+        if not self.stock_forecaster:
+            return [{
+                'status': 'error',
+                'error': 'Stock forecasting model not initialized. Cannot generate predictions.',
+                'item_id': item_id,
+                'forecast_days': forecast_days
+            } for item_id, *_ in items]
+        
+        # One series per distinct (category, starting quantity)
+        series_index = {}
+        item_series = []
+        for item_id, item_name, *rest in items:
+            if not item_name:
+                item_series.append(None)
+                continue
+            category = (rest[1] if len(rest) > 1 else None) or \
+                self._map_item_to_category(item_name, item_id) or 'Other_Uncategorized'
+            key = (category, self._baseline_qty(rest[0] if rest else None))
+            item_series.append(series_index.setdefault(key, len(series_index)))
+        
+        keys = list(series_index)
+        start_date = self._forecast_start()
+        daily, failed = {}, {}
+        
+        # Categories without a model fail per item instead of failing the batch
+        for category in {category for category, _ in keys} - set(self.stock_forecaster.categories):
+            failed[category] = (
+                f'No trained model found for category "{category}". '
+                f'Available categories: {", ".join(self.stock_forecaster.categories[:5])}...'
+            )
+        runnable = [i for i, (category, _) in enumerate(keys) if category not in failed]
+        
+        if runnable:
+            results = self._forecast_series(
+                [keys[i] for i in runnable], forecast_days, start_date.date(), is_holiday, campaign_active
+            )
+            daily.update(zip(runnable, results))
+        
+        forecasts = []
+        for (item_id, *_), series in zip(items, item_series):
+            if series is None:
+                forecasts.append({
+                    'status': 'error',
+                    'error': 'Item name is required for category-based forecasting. Cannot proceed without item information.',
+                    'item_id': item_id,
+                    'forecast_days': forecast_days
+                })
+                continue
+            category = keys[series][0]
+            if category in failed:
+                forecasts.append({
+                    'status': 'error',
+                    'error': failed[category],
+                    'item_id': item_id,
+                    'category_attempted': category,
+                    'forecast_days': forecast_days
+                })
+                continue
+            forecasts.append(self._forecast_response(item_id, forecast_days, category, daily[series], start_date))
+        return forecasts
+    
+    def predict_category_demand_many(
+        self,
+        series: List[tuple],
+        forecast_days: int = 7,
+        is_holiday: bool = False,
+        campaign_active: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Demand forecasts for whole categories with batched inference
+        
+        Args:
+            series: (category, last_qty) pairs; last_qty None for DEFAULT_LAST_QTY
+            forecast_days: Number of days to forecast ahead
+            is_holiday: Whether the forecast period includes holidays
+            campaign_active: Whether a campaign will be running
+        
+        Returns:
+            One predict_demand-style result (item_id None) per pair, in input order
+        """
+        if not self.stock_forecaster:
+            return [{
+                'status': 'error',
+                'error': 'Stock forecasting model not initialized. Cannot generate predictions.',
+                'category_attempted': category,
+                'forecast_days': forecast_days
+            } for category, _ in series]
+        
+        available = set(self.stock_forecaster.categories)
+        runnable = [(category, self._baseline_qty(qty)) for category, qty in series if category in available]
+        start_date = self._forecast_start()
+        daily = iter(self._forecast_series(runnable, forecast_days, start_date.date(), is_holiday, campaign_active))
+        
+        forecasts = []
+        for category, _ in series:
+            if category not in available:
+                forecasts.append({
+                    'status': 'error',
+                    'error': f'No trained model found for category "{category}".',
+                    'category_attempted': category,
+                    'forecast_days': forecast_days
+                })
+                continue
+            forecasts.append(self._forecast_response(None, forecast_days, category, next(daily), start_date))
+        return forecasts
+    
     def _generate_fallback_forecast(
         self, 
         forecast_days: int,
@@ -410,7 +815,10 @@ class MLPredictionService:
         current_stock: float,
         lead_time_days: int = 3,
         safety_stock_multiplier: float = 1.2,
-        item_name: Optional[str] = None
+        item_name: Optional[str] = None,
+        last_qty: Optional[float] = None,
+        precomputed: Optional[Dict[str, Any]] = None,
+        category: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Get stock reorder recommendations based on demand forecast
@@ -421,18 +829,47 @@ class MLPredictionService:
             lead_time_days: Days until new stock arrives
             safety_stock_multiplier: Safety stock factor (1.2 = 20% buffer)
             item_name: Item name for model loading
+            last_qty: The item's most recent daily quantity (feature store)
+            precomputed: The item's stored nightly forecast (forecast_store)
+            category: The item's category from dim_item_category
         
         Returns:
             Reorder recommendations
         """
         # Forecast for lead time + 7 days
         forecast_days = lead_time_days + 7
-        forecast = self.predict_demand(item_id, forecast_days, item_name=item_name)
+        forecast = self.predict_demand(
+            item_id, forecast_days, item_name=item_name, last_qty=last_qty, precomputed=precomputed,
+            category=category
+        )
         
         # Check if forecast failed
         if forecast.get('status') == 'error':
             return forecast  # Pass through the error
         
+        return self.reorder_from_forecast(item_id, current_stock, forecast, safety_stock_multiplier)
+    
+    def reorder_from_forecast(
+        self,
+        item_id: int,
+        current_stock: float,
+        forecast: Dict[str, Any],
+        safety_stock_multiplier: float = 1.2
+    ) -> Dict[str, Any]:
+        """
+        Reorder recommendation from a successful predict_demand result
+        
+        Args:
+            item_id: Item ID
+            current_stock: Current stock level
+            forecast: predict_demand result covering lead time + 7 days
+            safety_stock_multiplier: Safety stock factor (1.2 = 20% buffer)
+        
+        Returns:
+            Reorder recommendations
+        """
+        forecast_days = forecast['forecast_days']
+        
         # Calculate needed stock - handle both cases (with and without summary)
         if 'summary' in forecast and 'total_predicted_demand' in forecast['summary']:
             total_demand = forecast['summary']['total_predicted_demand']
@@ -462,6 +899,7 @@ class MLPredictionService:
             'current_stock': current_stock,
             'forecast_period_days': forecast_days,
             'predicted_demand': round(total_demand, 2),
+            'source': forecast.get('source', 'live'),
             'recommendations': {
                 'reorder_needed': reorder_qty > 0,
                 'reorder_quantity': round(reorder_qty, 2),
@@ -971,5 +1409,6 @@ class MLPredictionService:
             'models_available': available_models,
             'total_models': len(available_models),
             'ready_models': sum(available_models.values()),
-            'models_directory': self.models_dir
+            'models_directory': self.models_dir,
+            'forecast_cache': self.forecast_cache.stats()
         }
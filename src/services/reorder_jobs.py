@@ -0,0 +1,422 @@
+"""
+Fresh Flow Markets - Reorder Jobs
+Reorder recommendations for the whole active catalog as a background job.
+
+A job takes every active item (status 'Active' and sold in the last 90
+days), splits it into partitions of REORDER_PARTITION_ITEMS items and runs
+them on a process pool. Each worker process loads its own
+MLPredictionService once and forecasts a partition with predict_demand_many
+(one batched model call per category per day). Demand features are read
+once, as stored by the scheduler's refresh, when the job starts and travel
+with the partitions, so workers only read dim_items and stock levels. A
+coordinator thread in the process that started the job writes each
+partition to `reorder_job_results` as it finishes and updates the progress
+counters in `reorder_jobs`, so results can be read while the job runs.
+
+Cancelling sets the job's status to 'cancelling'. The coordinator checks
+it between partitions, drops the partitions not yet started and marks the
+job 'cancelled'; results already written stay. A job whose coordinator
+stops sending heartbeats (its process died) is marked 'error' when read.
+Items without a stock level (stock_tracked 0) get their forecast demand
+and safety stock but no reorder quantity, stockout day or urgency (NULL),
+so they stay out of the reorder counters and sort after every tracked
+item. Only the last REORDER_JOBS_KEPT jobs are kept.
+"""
+
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional
+
+from .feature_store import get_last_quantities
+from .forecast_store import get_stock_levels
+from .item_categories import load_item_categories, refresh_item_categories
+from .rollups import ensure_rollup_schema
+
+# Items per worker task
+REORDER_PARTITION_ITEMS = 1000
+
+# Worker processes per job when not given (capped by the partition count)
+REORDER_MAX_WORKERS = os.cpu_count() or 1
+
+# Workers are started fresh rather than forked from the threaded API process
+REORDER_START_METHOD = 'spawn'
+
+# Seconds between cancellation checks; heartbeat writes; heartbeat age after
+# which a running job counts as abandoned
+REORDER_POLL_SECONDS = 1.0
+REORDER_HEARTBEAT_SECONDS = 30
+REORDER_STALE_SECONDS = 300
+
+# Jobs (and their results) kept
+REORDER_JOBS_KEPT = 10
+
+ACTIVE_STATUSES = ('queued', 'running', 'cancelling')
+
+REORDER_JOB_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS reorder_jobs (
+        job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created INTEGER NOT NULL,
+        started INTEGER,
+        finished INTEGER,
+        heartbeat INTEGER,
+        status TEXT NOT NULL,
+        lead_time_days INTEGER NOT NULL,
+        safety_multiplier REAL NOT NULL,
+        workers INTEGER NOT NULL,
+        partitions INTEGER NOT NULL DEFAULT 0,
+        partitions_done INTEGER NOT NULL DEFAULT 0,
+        total_items INTEGER NOT NULL DEFAULT 0,
+        done_items INTEGER NOT NULL DEFAULT 0,
+        failed_items INTEGER NOT NULL DEFAULT 0,
+        reorder_items INTEGER NOT NULL DEFAULT 0,
+        error TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reorder_job_results (
+        job_id INTEGER NOT NULL,
+        item_id INTEGER NOT NULL,
+        category TEXT,
+        current_stock REAL,
+        stock_tracked INTEGER NOT NULL,
+        predicted_demand REAL,
+        reorder_quantity REAL,
+        safety_stock_level REAL,
+        days_until_stockout TEXT,
+        urgency TEXT,
+        PRIMARY KEY (job_id, item_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_reorder_job_results_quantity ON reorder_job_results(job_id, reorder_quantity)",
+]
+
+
+def ensure_reorder_job_schema(conn: sqlite3.Connection):
+    """Create reorder job tables and indexes if they do not exist"""
+    for statement in REORDER_JOB_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    return sqlite3.connect(db_path, timeout=30)
+
+
+# ============================================================================
+# WORKER PROCESSES
+# ============================================================================
+
+# Set once per worker process by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(db_path: str, models_dir: str):
+    # One BLAS/OpenMP thread per process; the pool already uses every core.
+    # numpy is loaded by the time this runs, so OMP_NUM_THREADS would be too late
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    from .ml_prediction_service import MLPredictionService
+    _worker['db_path'] = db_path
+    _worker['service'] = MLPredictionService(models_dir=models_dir)
+
+
+def _reorder_partition(items: List[tuple], lead_time_days: int, safety_multiplier: float) -> tuple:
+    """Result rows and failure count for one partition of (item_id, last_qty) pairs (runs in a worker)"""
+    service = _worker['service']
+    item_ids = [item_id for item_id, _ in items]
+    last_qty = dict(items)
+    conn = _connect(_worker['db_path'])
+    try:
+        titles = {}
+        for i in range(0, len(item_ids), 500):
+            batch = item_ids[i:i + 500]
+            titles.update(conn.execute(
+                f"SELECT id, title FROM dim_items WHERE id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall())
+        categories = load_item_categories(conn, item_ids, store=False)
+        stock = get_stock_levels(conn, item_ids)
+    finally:
+        conn.close()
+
+    forecasts = service.predict_demand_many(
+        [(item_id, titles.get(item_id), last_qty[item_id], categories[item_id]) for item_id in item_ids],
+        forecast_days=lead_time_days + 7
+    )
+    rows, failed = [], 0
+    for item_id, forecast in zip(item_ids, forecasts):
+        if forecast.get('status') == 'error':
+            failed += 1
+            continue
+        on_hand = stock.get(item_id)
+        result = service.reorder_from_forecast(item_id, on_hand or 0.0, forecast, safety_multiplier)
+        recommendation = result['recommendations']
+        if on_hand is None:
+            # Untracked stock: demand only, no reorder advice
+            rows.append((
+                item_id, forecast['category_used'], None, 0, result['predicted_demand'], None,
+                recommendation['safety_stock_level'], None, None
+            ))
+            continue
+        rows.append((
+            item_id, forecast['category_used'], on_hand, 1,
+            result['predicted_demand'], recommendation['reorder_quantity'],
+            recommendation['safety_stock_level'], recommendation['days_until_stockout'],
+            recommendation['urgency']
+        ))
+    return rows, failed
+
+
+# ============================================================================
+# COORDINATOR
+# ============================================================================
+
+def start_reorder_job(db_path: str, models_dir: str, lead_time_days: int = 3, safety_multiplier: float = 1.2,
+                      workers: Optional[int] = None, partition_items: int = REORDER_PARTITION_ITEMS) -> int:
+    """
+    Queue a reorder job for every active item and start its coordinator thread
+
+    Args:
+        db_path: SQLite database path (workers open their own connections)
+        models_dir: ML models directory for the workers' MLPredictionService
+        lead_time_days: Days until new stock arrives
+        safety_multiplier: Safety stock factor (1.2 = 20% buffer)
+        workers: Worker processes; REORDER_MAX_WORKERS by default
+        partition_items: Items per worker task
+
+    Returns:
+        The job id
+    """
+    conn = _connect(db_path)
+    try:
+        ensure_rollup_schema(conn)
+        ensure_reorder_job_schema(conn)
+        refresh_item_categories(conn)
+        item_ids = [row[0] for row in conn.execute(
+            """
+            SELECT s.item_id
+            FROM item_stats s
+            JOIN dim_items i ON i.id = s.item_id
+            WHERE i.status = 'Active' AND s.qty_90d > 0
+            ORDER BY s.item_id
+            """
+        ).fetchall()]
+        last_qty = get_last_quantities(conn)
+        # No stored features at all: start every item from the forecaster's default
+        items = [(item_id, last_qty.get(item_id, 0.0) if last_qty is not None else None) for item_id in item_ids]
+        partitions = [items[i:i + partition_items] for i in range(0, len(items), partition_items)]
+        workers = max(1, min(workers or REORDER_MAX_WORKERS, len(partitions) or 1))
+        now = int(time.time())
+        with conn:
+            job_id = conn.execute(
+                """
+                INSERT INTO reorder_jobs (
+                    created, heartbeat, status, lead_time_days, safety_multiplier, workers, partitions, total_items
+                ) VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)
+                """,
+                (now, now, lead_time_days, safety_multiplier, workers, len(partitions), len(item_ids))
+            ).lastrowid
+            old_jobs = "SELECT job_id FROM reorder_jobs ORDER BY job_id DESC LIMIT -1 OFFSET ?"
+            conn.execute(f"DELETE FROM reorder_job_results WHERE job_id IN ({old_jobs})", (REORDER_JOBS_KEPT,))
+            conn.execute(f"DELETE FROM reorder_jobs WHERE job_id IN ({old_jobs})", (REORDER_JOBS_KEPT,))
+    finally:
+        conn.close()
+
+    threading.Thread(
+        target=_run_job,
+        args=(db_path, models_dir, job_id, partitions, lead_time_days, safety_multiplier, workers),
+        name=f'ffm-reorder-job-{job_id}',
+        daemon=True
+    ).start()
+    return job_id
+
+
+def _run_job(db_path: str, models_dir: str, job_id: int, partitions: List[List[tuple]],
+             lead_time_days: int, safety_multiplier: float, workers: int):
+    conn = _connect(db_path)
+    try:
+        with conn:
+            started = conn.execute(
+                """
+                UPDATE reorder_jobs SET status = 'running', started = ?, heartbeat = ?
+                WHERE job_id = ? AND status = 'queued'
+                """,
+                (int(time.time()), int(time.time()), job_id)
+            ).rowcount
+        cancelled = not started
+        if partitions and not cancelled:
+            cancelled = _run_partitions(conn, db_path, models_dir, job_id, partitions,
+                                        lead_time_days, safety_multiplier, workers)
+        with conn:
+            conn.execute(
+                "UPDATE reorder_jobs SET status = ?, finished = ?, heartbeat = ? WHERE job_id = ?",
+                ('cancelled' if cancelled else 'success', int(time.time()), int(time.time()), job_id)
+            )
+    except Exception as e:
+        conn.rollback()
+        conn.execute(
+            "UPDATE reorder_jobs SET status = 'error', finished = ?, error = ? WHERE job_id = ?",
+            (int(time.time()), str(e) or type(e).__name__, job_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _run_partitions(conn: sqlite3.Connection, db_path: str, models_dir: str, job_id: int,
+                    partitions: List[List[tuple]], lead_time_days: int, safety_multiplier: float,
+                    workers: int) -> bool:
+    """Run every partition on a process pool, writing results as they arrive; True if cancelled"""
+    last_heartbeat = time.time()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context(REORDER_START_METHOD),
+        initializer=_init_worker,
+        initargs=(db_path, models_dir)
+    ) as pool:
+        pending = {pool.submit(_reorder_partition, partition, lead_time_days, safety_multiplier)
+                   for partition in partitions}
+        while pending:
+            finished, pending = wait(pending, timeout=REORDER_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in finished:
+                rows, failed = future.result()
+                with conn:
+                    conn.executemany(
+                        """
+                        INSERT OR REPLACE INTO reorder_job_results (
+                            job_id, item_id, category, current_stock, stock_tracked, predicted_demand,
+                            reorder_quantity, safety_stock_level, days_until_stockout, urgency
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        [(job_id, *row) for row in rows]
+                    )
+                    conn.execute(
+                        """
+                        UPDATE reorder_jobs
+                        SET partitions_done = partitions_done + 1, done_items = done_items + ?,
+                            failed_items = failed_items + ?, reorder_items = reorder_items + ?, heartbeat = ?
+                        WHERE job_id = ?
+                        """,
+                        (len(rows) + failed, failed, sum(1 for row in rows if (row[5] or 0) > 0), int(time.time()), job_id)
+                    )
+                last_heartbeat = time.time()
+            if time.time() - last_heartbeat >= REORDER_HEARTBEAT_SECONDS:
+                with conn:
+                    conn.execute("UPDATE reorder_jobs SET heartbeat = ? WHERE job_id = ?", (int(time.time()), job_id))
+                last_heartbeat = time.time()
+            status = conn.execute("SELECT status FROM reorder_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if status is None or status[0] == 'cancelling':
+                pool.shutdown(wait=False, cancel_futures=True)
+                return True
+    return False
+
+
+# ============================================================================
+# STATUS & RESULTS
+# ============================================================================
+
+def _job_row(conn: sqlite3.Connection, job_id: int) -> Optional[Dict[str, Any]]:
+    try:
+        cur = conn.execute("SELECT * FROM reorder_jobs WHERE job_id = ?", (job_id,))
+    except sqlite3.OperationalError:
+        return None  # no job yet
+    row = cur.fetchone()
+    return dict(zip([c[0] for c in cur.description], row)) if row else None
+
+
+def _with_progress(job: Dict[str, Any]) -> Dict[str, Any]:
+    now = time.time()
+    total, done = job['total_items'], job['done_items']
+    elapsed = ((job['finished'] or now) - job['started']) if job['started'] else 0
+    job['progress'] = {
+        'percent': round(100.0 * done / total, 1) if total else 100.0,
+        'elapsed_seconds': round(elapsed, 1),
+        'items_per_second': round(done / elapsed, 1) if elapsed > 0 else None,
+        'eta_seconds': round(elapsed * (total - done) / done, 1)
+        if done and job['status'] == 'running' else None
+    }
+    return job
+
+
+def get_reorder_job(conn: sqlite3.Connection, job_id: int) -> Optional[Dict[str, Any]]:
+    """A job's parameters, counters and progress (None if unknown)"""
+    job = _job_row(conn, job_id)
+    if job is None:
+        return None
+    if job['status'] in ACTIVE_STATUSES and (job['heartbeat'] or 0) < time.time() - REORDER_STALE_SECONDS:
+        with conn:
+            conn.execute(
+                """
+                UPDATE reorder_jobs SET status = 'error', finished = ?, error = ?
+                WHERE job_id = ? AND status IN ('queued', 'running', 'cancelling')
+                """,
+                (int(time.time()), 'Job coordinator stopped responding', job_id)
+            )
+        job = _job_row(conn, job_id)
+    return _with_progress(job)
+
+
+def list_reorder_jobs(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """Kept jobs, newest first"""
+    try:
+        cur = conn.execute("SELECT * FROM reorder_jobs ORDER BY job_id DESC")
+    except sqlite3.OperationalError:
+        return []  # no job yet
+    columns = [c[0] for c in cur.description]
+    return [_with_progress(dict(zip(columns, row))) for row in cur.fetchall()]
+
+
+def cancel_reorder_job(conn: sqlite3.Connection, job_id: int) -> Optional[Dict[str, Any]]:
+    """Ask a queued or running job to stop; returns the job (None if unknown)"""
+    if _job_row(conn, job_id) is None:
+        return None
+    with conn:
+        conn.execute(
+            "UPDATE reorder_jobs SET status = 'cancelling' WHERE job_id = ? AND status IN ('queued', 'running')",
+            (job_id,)
+        )
+    return get_reorder_job(conn, job_id)
+
+
+def iter_reorder_results(conn: sqlite3.Connection, job_id: int, reorder_only: bool = False,
+                         urgency: Optional[str] = None, limit: Optional[int] = None,
+                         offset: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    A job's result rows written so far, largest reorder quantity first
+    (untracked items, without a reorder quantity, last)
+
+    Args:
+        conn: Database connection
+        job_id: Job id
+        reorder_only: Only items with a positive reorder quantity
+        urgency: Only items with this urgency ('high', 'medium', 'low')
+        limit: Maximum rows (all when None)
+        offset: Rows skipped
+    """
+    clauses, params = ["r.job_id = ?"], [job_id]
+    if reorder_only:
+        clauses.append("r.reorder_quantity > 0")
+    if urgency:
+        clauses.append("r.urgency = ?")
+        params.append(urgency)
+    cur = conn.execute(
+        f"""
+        SELECT r.item_id, i.title, r.category, r.current_stock, r.stock_tracked, r.predicted_demand,
+               r.reorder_quantity, r.safety_stock_level, r.days_until_stockout, r.urgency
+        FROM reorder_job_results r
+        LEFT JOIN dim_items i ON i.id = r.item_id
+        WHERE {' AND '.join(clauses)}
+        ORDER BY r.reorder_quantity DESC, r.item_id
+        LIMIT ? OFFSET ?
+        """,
+        params + [-1 if limit is None else limit, offset]
+    )
+    columns = [c[0] for c in cur.description]
+    for row in cur:
+        result = dict(zip(columns, row))
+        result['stock_tracked'] = bool(result['stock_tracked'])
+        yield result
@@ -0,0 +1,863 @@
+"""
+Fresh Flow Markets - Analytics Rollups
+Incrementally maintained summary tables built from the fact tables.
+
+Every rollup keeps a watermark (the last fct_* rowid it has consumed) in
+`rollup_watermarks`, so a refresh only reads rows appended since the last run.
+Each chunk reads its watermark and commits its upserts in one BEGIN IMMEDIATE
+transaction, so concurrent refreshes queue on the write lock instead of
+counting the same rows twice. Refreshes run at ingest time and from the
+scheduler; request handlers only read the rollups.
+"""
+
+import sqlite3
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from .item_categories import FALLBACK_CATEGORY, load_item_categories
+from .sketches import HyperLogLog, HLL_PRECISION, hash64, register_updates
+
+# place_id used for sketches that cover all places
+GLOBAL_PLACE = 0
+
+# Orders are sampled with probability 1 / ORDER_SAMPLE_MOD (by hash of the id,
+# so the sample is stable across incremental refreshes)
+ORDER_SAMPLE_MOD = 32
+
+# z-score for the reported 95% confidence intervals
+Z_95 = 1.96
+
+# Heatmap cells are local shop time (day of week 0 = Monday, hour 0-23);
+# category '' holds whole-order totals
+HEATMAP_TIMEZONE = 'Europe/Copenhagen'
+ALL_CATEGORIES = ''
+
+ROLLUP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS rollup_watermarks (
+        name TEXT PRIMARY KEY,
+        last_rowid INTEGER NOT NULL DEFAULT 0,
+        updated INTEGER
+    )
+    """,
+    # Customer HyperLogLog sketches per day ('D', 'YYYY-MM-DD') and
+    # month ('M', 'YYYY-MM'), per place and for all places (place_id = 0)
+    """
+    CREATE TABLE IF NOT EXISTS agg_customer_sketches (
+        period TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        place_id INTEGER NOT NULL,
+        registers BLOB NOT NULL,
+        PRIMARY KEY (period, place_id, bucket)
+    )
+    """,
+    # Bernoulli sample of orders for approximate sums and averages
+    """
+    CREATE TABLE IF NOT EXISTS agg_order_sample (
+        order_id INTEGER PRIMARY KEY,
+        created INTEGER NOT NULL,
+        place_id INTEGER,
+        total_amount REAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_agg_order_sample_created ON agg_order_sample(created)",
+    # Orders and revenue (total_amount) per UTC day and status ('' = none)
+    """
+    CREATE TABLE IF NOT EXISTS agg_order_daily (
+        day TEXT NOT NULL,
+        status TEXT NOT NULL,
+        orders INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, status)
+    ) WITHOUT ROWID
+    """,
+    # Daily sales per item (UTC days)
+    """
+    CREATE TABLE IF NOT EXISTS agg_item_daily (
+        item_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        quantity REAL NOT NULL DEFAULT 0,
+        orders INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (item_id, day)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_agg_item_daily_day ON agg_item_daily(day)",
+    # Running per-item sales statistics; the windowed quantities are relative
+    # to windows_as_of and recomputed from agg_item_daily once per day
+    """
+    CREATE TABLE IF NOT EXISTS item_stats (
+        item_id INTEGER PRIMARY KEY,
+        times_ordered INTEGER NOT NULL DEFAULT 0,
+        total_qty REAL NOT NULL DEFAULT 0,
+        last_sold_at INTEGER,
+        qty_7d REAL NOT NULL DEFAULT 0,
+        qty_30d REAL NOT NULL DEFAULT 0,
+        qty_90d REAL NOT NULL DEFAULT 0,
+        windows_as_of TEXT
+    )
+    """,
+    # Orders, revenue and quantity per place (0 = all), category ('' = all),
+    # day of week and hour; at most 168 rows per (place, category)
+    """
+    CREATE TABLE IF NOT EXISTS agg_heatmap (
+        place_id INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        dow INTEGER NOT NULL,
+        hour INTEGER NOT NULL,
+        orders INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        quantity REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (place_id, category, dow, hour)
+    ) WITHOUT ROWID
+    """,
+]
+
+ROLLUP_TABLES = [
+    'agg_customer_sketches', 'agg_order_sample', 'agg_order_daily', 'agg_item_daily', 'item_stats', 'agg_heatmap'
+]
+
+# Watermarks owned by the rollups (other consumers keep their own)
+ROLLUP_SOURCES = ['orders', 'order_daily', 'order_items', 'heatmap_lines']
+
+# Trailing windows (days) maintained in item_stats
+ITEM_STAT_WINDOWS = (7, 30, 90)
+
+
+# ============================================================================
+# SCHEMA & WATERMARKS
+# ============================================================================
+
+def ensure_rollup_schema(conn: sqlite3.Connection):
+    """Create rollup tables and indexes if they do not exist"""
+    for statement in ROLLUP_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+def get_watermark(conn: sqlite3.Connection, name: str) -> int:
+    """Return the last source rowid consumed by a rollup"""
+    row = conn.execute(
+        "SELECT last_rowid FROM rollup_watermarks WHERE name = ?", (name,)
+    ).fetchone()
+    return int(row[0]) if row else 0
+
+
+def set_watermark(conn: sqlite3.Connection, name: str, last_rowid: int):
+    """Advance a rollup watermark (caller commits)"""
+    conn.execute(
+        """
+        INSERT INTO rollup_watermarks (name, last_rowid, updated)
+        VALUES (?, ?, strftime('%s', 'now'))
+        ON CONFLICT(name) DO UPDATE SET
+            last_rowid = excluded.last_rowid,
+            updated = excluded.updated
+        """,
+        (name, int(last_rowid))
+    )
+
+
+@contextmanager
+def immediate_transaction(conn: sqlite3.Connection):
+    """
+    Run a block in a BEGIN IMMEDIATE transaction (commit on success)
+
+    The write lock is taken before the first read, so a watermark read inside
+    the block is still current when the block's writes commit.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def reset_rollups(conn: sqlite3.Connection):
+    """Clear all rollups so the next refresh rebuilds them from scratch"""
+    ensure_rollup_schema(conn)
+    for table in ROLLUP_TABLES:
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute(
+        f"DELETE FROM rollup_watermarks WHERE name IN ({','.join('?' * len(ROLLUP_SOURCES))})",
+        ROLLUP_SOURCES
+    )
+    conn.commit()
+
+
+def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    return row is not None
+
+
+# ============================================================================
+# ORDER ROLLUPS (customer sketches, order sample, daily totals)
+# ============================================================================
+
+def _sketch_updates(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce a chunk of orders to one (register, rank) row per sketch
+
+    Returns a frame with columns period, bucket, place_id, idx, rank.
+    """
+    df = df.dropna(subset=['user_id', 'created'])
+    if df.empty:
+        return pd.DataFrame(columns=['period', 'bucket', 'place_id', 'idx', 'rank'])
+
+    idx, rank = register_updates(df['user_id'].to_numpy().astype(np.int64), HLL_PRECISION)
+    days = (df['created'].to_numpy().astype(np.int64) // 86400).astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    place = df['place_id'].to_numpy()
+
+    frames = []
+    for period, buckets in (('D', days.astype(str)), ('M', months.astype(str))):
+        base = pd.DataFrame({'period': period, 'bucket': buckets, 'idx': idx, 'rank': rank})
+        frames.append(base.assign(place_id=GLOBAL_PLACE))
+        has_place = ~pd.isna(place)
+        if has_place.any():
+            frames.append(base[has_place].assign(place_id=place[has_place].astype(np.int64)))
+
+    updates = pd.concat(frames, ignore_index=True)
+    return (
+        updates.groupby(['period', 'bucket', 'place_id', 'idx'], sort=False)['rank']
+        .max()
+        .reset_index()
+    )
+
+
+def refresh_order_rollups(conn: sqlite3.Connection, chunk_size: int = 200_000) -> int:
+    """
+    Fold new fct_orders rows into the customer sketches and the order sample
+
+    Args:
+        conn: SQLite connection
+        chunk_size: Orders read per transaction
+
+    Returns:
+        Number of orders consumed
+    """
+    ensure_rollup_schema(conn)
+    if not _table_exists(conn, 'fct_orders'):
+        return 0
+
+    consumed = 0
+    while True:
+        with immediate_transaction(conn):
+            watermark = get_watermark(conn, 'orders')
+            df = pd.read_sql_query(
+                """
+                SELECT rowid AS source_rowid, id, user_id, created, place_id, total_amount
+                FROM fct_orders
+                WHERE rowid > ?
+                ORDER BY rowid
+                LIMIT ?
+                """,
+                conn, params=(watermark, chunk_size)
+            )
+            if df.empty:
+                break
+
+            # Customer sketches: merge chunk registers into stored sketches
+            updates = _sketch_updates(df)
+            rows = []
+            for (period, bucket, place_id), group in updates.groupby(['period', 'bucket', 'place_id'], sort=False):
+                existing = conn.execute(
+                    "SELECT registers FROM agg_customer_sketches WHERE period = ? AND place_id = ? AND bucket = ?",
+                    (period, int(place_id), bucket)
+                ).fetchone()
+                sketch = HyperLogLog.from_bytes(existing[0]) if existing else HyperLogLog()
+                sketch.add_registers(
+                    group['idx'].to_numpy().astype(np.intp),
+                    group['rank'].to_numpy().astype(np.uint8)
+                )
+                rows.append((period, bucket, int(place_id), sketch.to_bytes()))
+            conn.executemany(
+                "INSERT OR REPLACE INTO agg_customer_sketches (period, bucket, place_id, registers) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+            # Order sample
+            ids = df['id'].fillna(-1).to_numpy().astype(np.int64)
+            sampled = df[(hash64(ids) % np.uint64(ORDER_SAMPLE_MOD)) == 0].dropna(subset=['id', 'created'])
+            conn.executemany(
+                "INSERT OR IGNORE INTO agg_order_sample (order_id, created, place_id, total_amount) VALUES (?, ?, ?, ?)",
+                [
+                    (int(r.id), int(r.created), None if pd.isna(r.place_id) else int(r.place_id),
+                     None if pd.isna(r.total_amount) else float(r.total_amount))
+                    for r in sampled.itertuples(index=False)
+                ]
+            )
+
+            set_watermark(conn, 'orders', int(df['source_rowid'].iloc[-1]))
+        consumed += len(df)
+
+    return consumed
+
+
+def refresh_order_daily_rollups(conn: sqlite3.Connection, chunk_size: int = 500_000) -> int:
+    """
+    Fold new fct_orders rows into agg_order_daily
+
+    Each chunk is one INSERT ... SELECT over a rowid range, so the rows never
+    leave SQLite.
+
+    Returns:
+        Number of orders consumed
+    """
+    ensure_rollup_schema(conn)
+    if not _table_exists(conn, 'fct_orders'):
+        return 0
+
+    consumed = 0
+    while True:
+        with immediate_transaction(conn):
+            watermark = get_watermark(conn, 'order_daily')
+            last_rowid, rows = conn.execute(
+                """
+                SELECT MAX(rowid), COUNT(*)
+                FROM (SELECT rowid FROM fct_orders WHERE rowid > ? ORDER BY rowid LIMIT ?)
+                """,
+                (watermark, chunk_size)
+            ).fetchone()
+            if not rows:
+                break
+            conn.execute(
+                """
+                INSERT INTO agg_order_daily (day, status, orders, revenue)
+                SELECT date(created, 'unixepoch'), COALESCE(status, ''), COUNT(*), COALESCE(SUM(total_amount), 0)
+                FROM fct_orders
+                WHERE rowid > ? AND rowid <= ? AND created IS NOT NULL
+                GROUP BY 1, 2
+                ON CONFLICT(day, status) DO UPDATE SET
+                    orders = orders + excluded.orders,
+                    revenue = revenue + excluded.revenue
+                """,
+                (watermark, last_rowid)
+            )
+            set_watermark(conn, 'order_daily', last_rowid)
+        consumed += rows
+
+    return consumed
+
+
+# ============================================================================
+# ORDER ITEM ROLLUPS (agg_item_daily + item_stats)
+# ============================================================================
+
+def _already_counted_pairs(conn: sqlite3.Connection, order_ids: np.ndarray, watermark: int) -> set:
+    """(order_id, item_id) pairs already consumed by an earlier refresh"""
+    if watermark == 0:
+        return set()
+    pairs = set()
+    ids = [int(x) for x in order_ids]
+    for i in range(0, len(ids), 500):
+        batch = ids[i:i + 500]
+        rows = conn.execute(
+            f"""
+            SELECT DISTINCT order_id, item_id FROM fct_order_items
+            WHERE order_id IN ({','.join('?' * len(batch))}) AND rowid <= ?
+            """,
+            batch + [watermark]
+        ).fetchall()
+        pairs.update((int(o), int(it)) for o, it in rows if o is not None and it is not None)
+    return pairs
+
+
+def refresh_item_rollups(conn: sqlite3.Connection, chunk_size: int = 200_000) -> int:
+    """
+    Fold new fct_order_items rows into agg_item_daily and item_stats
+
+    times_ordered counts distinct orders per item, including orders whose
+    lines straddle two refreshes.
+
+    Returns:
+        Number of order lines consumed
+    """
+    ensure_rollup_schema(conn)
+    if not _table_exists(conn, 'fct_order_items'):
+        return 0
+
+    consumed = 0
+    touched = set()
+    while True:
+        with immediate_transaction(conn):
+            watermark = get_watermark(conn, 'order_items')
+            df = pd.read_sql_query(
+                """
+                SELECT rowid AS source_rowid, order_id, item_id, created, quantity, price
+                FROM fct_order_items
+                WHERE rowid > ?
+                ORDER BY rowid
+                LIMIT ?
+                """,
+                conn, params=(watermark, chunk_size)
+            )
+            if df.empty:
+                break
+
+            lines = df.dropna(subset=['item_id', 'created']).copy()
+            lines['item_id'] = lines['item_id'].astype(np.int64)
+            lines['quantity'] = lines['quantity'].fillna(0)
+            lines['revenue'] = lines['quantity'] * lines['price'].fillna(0)
+            lines['day'] = (lines['created'].to_numpy().astype(np.int64) // 86400).astype('datetime64[D]').astype(str)
+
+            # First line of each (order, item) pair not seen in a previous refresh
+            first = lines.dropna(subset=['order_id']).drop_duplicates(['order_id', 'item_id'])
+            seen = _already_counted_pairs(conn, first['order_id'].unique(), watermark)
+            if seen:
+                keys = list(zip(first['order_id'].astype(np.int64), first['item_id']))
+                first = first[[k not in seen for k in keys]]
+            first_orders = first.groupby(['item_id', 'day']).size().rename('orders')
+
+            daily = lines.groupby(['item_id', 'day']).agg(
+                quantity=('quantity', 'sum'), revenue=('revenue', 'sum')
+            ).join(first_orders).fillna({'orders': 0}).reset_index()
+            conn.executemany(
+                """
+                INSERT INTO agg_item_daily (item_id, day, quantity, orders, revenue)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(item_id, day) DO UPDATE SET
+                    quantity = quantity + excluded.quantity,
+                    orders = orders + excluded.orders,
+                    revenue = revenue + excluded.revenue
+                """,
+                [(int(r.item_id), r.day, float(r.quantity), int(r.orders), float(r.revenue))
+                 for r in daily.itertuples(index=False)]
+            )
+
+            totals = lines.groupby('item_id').agg(
+                total_qty=('quantity', 'sum'), last_sold_at=('created', 'max')
+            ).join(first.groupby('item_id').size().rename('times_ordered')).fillna({'times_ordered': 0}).reset_index()
+            conn.executemany(
+                """
+                INSERT INTO item_stats (item_id, times_ordered, total_qty, last_sold_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(item_id) DO UPDATE SET
+                    times_ordered = times_ordered + excluded.times_ordered,
+                    total_qty = total_qty + excluded.total_qty,
+                    last_sold_at = MAX(COALESCE(last_sold_at, 0), excluded.last_sold_at)
+                """,
+                [(int(r.item_id), int(r.times_ordered), float(r.total_qty), int(r.last_sold_at))
+                 for r in totals.itertuples(index=False)]
+            )
+
+            set_watermark(conn, 'order_items', int(df['source_rowid'].iloc[-1]))
+        consumed += len(df)
+        touched.update(lines['item_id'].tolist())
+
+    refresh_item_windows(conn, sorted(touched))
+    return consumed
+
+
+def refresh_item_windows(conn: sqlite3.Connection, item_ids: Optional[List[int]] = None):
+    """
+    Recompute the 7/30/90-day quantities in item_stats from agg_item_daily
+
+    Every item is recomputed once per UTC day (the windows slide); otherwise
+    only item_ids, the items that just had new sales, are.
+    """
+    today = datetime.now(timezone.utc).date()
+    starts = [(today - timedelta(days=w - 1)).isoformat() for w in ITEM_STAT_WINDOWS]
+    window_sql = ",\n".join(
+        f"qty_{w}d = COALESCE((SELECT SUM(d.quantity) FROM agg_item_daily d "
+        f"WHERE d.item_id = item_stats.item_id AND d.day >= ?), 0)"
+        for w in ITEM_STAT_WINDOWS
+    )
+    update = f"UPDATE item_stats SET {window_sql}, windows_as_of = ?"
+    params = starts + [today.isoformat()]
+
+    # New items start with windows_as_of NULL and are always in item_ids
+    stale = conn.execute(
+        "SELECT 1 FROM item_stats WHERE windows_as_of < ? LIMIT 1", (today.isoformat(),)
+    ).fetchone()
+    if not stale and not item_ids:
+        return
+    with immediate_transaction(conn):
+        if stale:
+            conn.execute(update, params)
+        else:
+            ids = [int(i) for i in item_ids or []]
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                conn.execute(f"{update} WHERE item_id IN ({','.join('?' * len(batch))})", params + batch)
+
+
+# ============================================================================
+# HEATMAP ROLLUP (agg_heatmap)
+# ============================================================================
+
+def _with_global_place(cells: pd.DataFrame) -> pd.DataFrame:
+    """Add all-places copies of per-place cells (orders without a place only count globally)"""
+    per_place = cells[cells['place_id'] != GLOBAL_PLACE]
+    return pd.concat([per_place, cells.assign(place_id=GLOBAL_PLACE)], ignore_index=True)
+
+
+def _counted_before(conn: sqlite3.Connection, order_ids: np.ndarray, watermark: int) -> Tuple[set, set]:
+    """Orders and (order, category) pairs already counted through lines at or below the watermark"""
+    if watermark == 0:
+        return set(), set()
+    rows = []
+    ids = [int(x) for x in order_ids]
+    for i in range(0, len(ids), 500):
+        batch = ids[i:i + 500]
+        rows.extend(conn.execute(
+            f"""
+            SELECT order_id, item_id FROM fct_order_items
+            WHERE order_id IN ({','.join('?' * len(batch))}) AND rowid <= ?
+            """,
+            batch + [watermark]
+        ).fetchall())
+    categories = load_item_categories(conn, sorted({int(it) for _, it in rows if it is not None}))
+    orders = {int(o) for o, _ in rows}
+    pairs = {(int(o), FALLBACK_CATEGORY if it is None else categories[int(it)]) for o, it in rows}
+    return orders, pairs
+
+
+def refresh_heatmap_rollups(conn: sqlite3.Connection, chunk_size: int = 100_000) -> int:
+    """
+    Fold new fct_order_items rows into agg_heatmap
+
+    Driven by the fct_order_items rowid, so lines appended after their
+    order header was loaded are still counted. Each line is placed in the
+    cell of its order's place and timestamp (joined from fct_orders); lines
+    whose header has not arrived use their own timestamp and count for all
+    places only. An order (and an order within a category) counts once,
+    when its first line is consumed. Revenue is line revenue.
+
+    Returns:
+        Number of order lines consumed
+    """
+    ensure_rollup_schema(conn)
+    if not _table_exists(conn, 'fct_orders') or not _table_exists(conn, 'fct_order_items'):
+        return 0
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fct_orders_id ON fct_orders(id)")
+    conn.commit()
+
+    consumed = 0
+    while True:
+        with immediate_transaction(conn):
+            watermark = get_watermark(conn, 'heatmap_lines')
+            if watermark == 0:
+                # First run (or a watermark reset): rebuild from the first line,
+                # dropping cells from the older order-driven watermark
+                conn.execute("DELETE FROM agg_heatmap")
+                conn.execute("DELETE FROM rollup_watermarks WHERE name = 'heatmap'")
+            lines = pd.read_sql_query(
+                """
+                SELECT oi.rowid AS source_rowid, oi.order_id, oi.item_id, oi.quantity, oi.price,
+                       COALESCE(o.created, oi.created) AS created, o.place_id
+                FROM fct_order_items oi
+                LEFT JOIN fct_orders o ON o.id = oi.order_id
+                WHERE oi.rowid > ?
+                ORDER BY oi.rowid
+                LIMIT ?
+                """,
+                conn, params=(watermark, chunk_size)
+            )
+            if lines.empty:
+                break
+            last_rowid = int(lines['source_rowid'].iloc[-1])
+            consumed += len(lines)
+
+            # A header can match several fct_orders rows; keep one per line
+            lines = lines.drop_duplicates('source_rowid').dropna(subset=['order_id', 'created'])
+            if not lines.empty:
+                lines['order_id'] = lines['order_id'].astype(np.int64)
+                lines['quantity'] = lines['quantity'].fillna(0)
+                lines['revenue'] = lines['quantity'] * lines['price'].fillna(0)
+                item_ids = lines['item_id'].dropna().astype(np.int64).unique().tolist()
+                categories = load_item_categories(conn, item_ids)
+                lines['category'] = [
+                    FALLBACK_CATEGORY if pd.isna(item_id) else categories[int(item_id)]
+                    for item_id in lines['item_id']
+                ]
+                local = pd.to_datetime(lines['created'].astype(np.int64), unit='s', utc=True).dt.tz_convert(HEATMAP_TIMEZONE)
+                lines = lines.assign(
+                    place_id=lines['place_id'].fillna(GLOBAL_PLACE).astype(np.int64),
+                    dow=local.dt.dayofweek.to_numpy(),
+                    hour=local.dt.hour.to_numpy()
+                )
+                counted_orders, counted_pairs = _counted_before(conn, lines['order_id'].unique(), watermark)
+
+                # Whole-order cells: the order counts with its first line
+                totals = lines.groupby('order_id').agg(
+                    place_id=('place_id', 'first'), dow=('dow', 'first'), hour=('hour', 'first'),
+                    revenue=('revenue', 'sum'), quantity=('quantity', 'sum')
+                ).reset_index()
+                totals['category'] = ALL_CATEGORIES
+                totals['orders'] = [int(o not in counted_orders) for o in totals['order_id']]
+
+                # Category cells: one order per (order, category)
+                per_category = lines.groupby(['order_id', 'category']).agg(
+                    place_id=('place_id', 'first'), dow=('dow', 'first'), hour=('hour', 'first'),
+                    revenue=('revenue', 'sum'), quantity=('quantity', 'sum')
+                ).reset_index()
+                per_category['orders'] = [
+                    int((o, c) not in counted_pairs) for o, c in zip(per_category['order_id'], per_category['category'])
+                ]
+
+                columns = ['place_id', 'category', 'dow', 'hour', 'orders', 'revenue', 'quantity']
+                cells = _with_global_place(pd.concat([totals[columns], per_category[columns]], ignore_index=True))
+                cells = cells.groupby(['place_id', 'category', 'dow', 'hour']).sum().reset_index()
+
+                conn.executemany(
+                    """
+                    INSERT INTO agg_heatmap (place_id, category, dow, hour, orders, revenue, quantity)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(place_id, category, dow, hour) DO UPDATE SET
+                        orders = orders + excluded.orders,
+                        revenue = revenue + excluded.revenue,
+                        quantity = quantity + excluded.quantity
+                    """,
+                    [(int(r.place_id), r.category, int(r.dow), int(r.hour), int(r.orders), float(r.revenue),
+                      float(r.quantity)) for r in cells.itertuples(index=False)]
+                )
+
+            set_watermark(conn, 'heatmap_lines', last_rowid)
+
+    return consumed
+
+
+def refresh_rollups(conn: sqlite3.Connection, rebuild: bool = False) -> Dict[str, int]:
+    """
+    Bring every rollup up to date with the fact tables
+
+    Args:
+        conn: SQLite connection
+        rebuild: Clear all rollups first (use after the fact tables are reloaded)
+
+    Returns:
+        Rows consumed per rollup source
+    """
+    if rebuild:
+        reset_rollups(conn)
+    return {
+        'orders': refresh_order_rollups(conn),
+        'order_daily': refresh_order_daily_rollups(conn),
+        'order_items': refresh_item_rollups(conn),
+        'heatmap': refresh_heatmap_rollups(conn),
+    }
+
+
+# ============================================================================
+# APPROXIMATE READS
+# ============================================================================
+
+def _utc_date(ts: int):
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc).date()
+
+
+def _range_buckets(start_ts: Optional[int], end_ts: Optional[int]) -> Tuple[List[str], List[str], bool]:
+    """
+    Cover [start_ts, end_ts) with whole months plus the edge days
+
+    The first and last day are included whole, so the covered window can be
+    up to one day wider than requested at each end.
+
+    Returns:
+        (months, days, all_time) - all_time is True when no bounds are given
+    """
+    if start_ts is None and end_ts is None:
+        return [], [], True
+
+    start_day = _utc_date(start_ts) if start_ts is not None else _utc_date(0)
+    end_day = _utc_date(end_ts - 1) if end_ts is not None else datetime.now(timezone.utc).date()
+
+    months, days = [], []
+    day = start_day
+    while day <= end_day:
+        month_end = (day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        if day.day == 1 and month_end <= end_day:
+            months.append(day.strftime('%Y-%m'))
+            day = month_end + timedelta(days=1)
+        else:
+            days.append(day.isoformat())
+            day += timedelta(days=1)
+    return months, days, False
+
+
+def _sketch_query(place_ids: List[int], months: List[str], days: List[str], all_time: bool):
+    place_sql = ",".join("?" * len(place_ids))
+    if all_time:
+        return (
+            f"SELECT place_id, registers FROM agg_customer_sketches WHERE period = 'M' AND place_id IN ({place_sql})",
+            list(place_ids)
+        )
+    clauses, params = [], list(place_ids)
+    if months:
+        clauses.append(f"(period = 'M' AND bucket IN ({','.join('?' * len(months))}))")
+        params.extend(months)
+    if days:
+        clauses.append(f"(period = 'D' AND bucket IN ({','.join('?' * len(days))}))")
+        params.extend(days)
+    if not clauses:
+        clauses.append("0")
+    return (
+        f"SELECT place_id, registers FROM agg_customer_sketches "
+        f"WHERE place_id IN ({place_sql}) AND ({' OR '.join(clauses)})",
+        params
+    )
+
+
+def estimate_unique_customers_by_place(
+    conn: sqlite3.Connection,
+    place_ids: List[int],
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None
+) -> Dict[int, float]:
+    """
+    Estimate distinct customers per place by merging stored sketches
+
+    Args:
+        conn: SQLite connection
+        place_ids: Places to estimate (GLOBAL_PLACE for all places combined)
+        start_ts: Window start (UNIX seconds), None for all time
+        end_ts: Window end (UNIX seconds, exclusive), None for now
+
+    Returns:
+        Mapping of place_id to estimated distinct customers
+    """
+    months, days, all_time = _range_buckets(start_ts, end_ts)
+    sketches = {int(pid): HyperLogLog() for pid in place_ids}
+    ids = list(sketches)
+
+    # Stay well below SQLite's bound-parameter limit
+    for i in range(0, len(ids), 200):
+        batch = ids[i:i + 200]
+        query, params = _sketch_query(batch, months, days, all_time)
+        for place_id, blob in conn.execute(query, params):
+            sketches[int(place_id)].merge_bytes(blob)
+
+    return {pid: round(sketch.cardinality()) for pid, sketch in sketches.items()}
+
+
+def estimate_unique_customers(
+    conn: sqlite3.Connection,
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None,
+    place_id: int = GLOBAL_PLACE
+) -> Dict[str, float]:
+    """Estimate distinct customers for one place (or all places) with its error bound"""
+    estimate = estimate_unique_customers_by_place(conn, [place_id], start_ts, end_ts)[place_id]
+    relative_error = HyperLogLog().relative_error
+    return {
+        'estimate': estimate,
+        'relative_error': round(relative_error, 4),
+        'ci95': [
+            max(0, round(estimate * (1 - Z_95 * relative_error))),
+            round(estimate * (1 + Z_95 * relative_error))
+        ]
+    }
+
+
+def estimate_order_totals(
+    conn: sqlite3.Connection,
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None,
+    place_id: Optional[int] = None
+) -> Dict[str, Dict[str, float]]:
+    """
+    Estimate order count, revenue and average order value from the order sample
+
+    Uses Horvitz-Thompson estimators for Bernoulli sampling; the AOV interval
+    is the linearized variance of the ratio estimator. All of them are built
+    from one SQL aggregate (count, sum, sum of squares) over the sample.
+
+    Returns:
+        Dict with 'total_orders', 'total_revenue' and 'avg_order_value', each
+        holding an 'estimate' and a 95% 'ci95' interval
+    """
+    where, params = ["1=1"], []
+    if start_ts is not None:
+        where.append("created >= ?")
+        params.append(int(start_ts))
+    if end_ts is not None:
+        where.append("created < ?")
+        params.append(int(end_ts))
+    if place_id is not None:
+        where.append("place_id = ?")
+        params.append(int(place_id))
+
+    # The estimators only need the sample's count, sum and sum of squares
+    n_sample, n_amounts, total, total_sq = conn.execute(
+        f"""
+        SELECT COUNT(*), COUNT(total_amount), TOTAL(total_amount), TOTAL(total_amount * total_amount)
+        FROM agg_order_sample WHERE {' AND '.join(where)}
+        """,
+        params
+    ).fetchone()
+
+    q = 1.0 / ORDER_SAMPLE_MOD
+    weight = (1 - q) / (q * q)
+
+    orders = n_sample / q
+    orders_se = np.sqrt(weight * n_sample)
+    revenue = total / q
+    revenue_se = np.sqrt(weight * total_sq)
+    if orders > 0 and n_amounts:
+        aov = revenue / orders
+        # sum((y - aov)^2) expanded; clamped against rounding below zero
+        residual_sq = max(total_sq - 2 * aov * total + n_amounts * aov * aov, 0.0)
+        aov_se = np.sqrt(weight * residual_sq) / orders
+    else:
+        aov, aov_se = None, None
+
+    def interval(estimate, se, digits=2):
+        if estimate is None:
+            return {'estimate': None, 'ci95': None}
+        return {
+            'estimate': round(float(estimate), digits),
+            'ci95': [round(float(max(0.0, estimate - Z_95 * se)), digits),
+                     round(float(estimate + Z_95 * se), digits)]
+        }
+
+    return {
+        'total_orders': interval(orders, orders_se, 0),
+        'total_revenue': interval(revenue, revenue_se),
+        'avg_order_value': interval(aov, aov_se),
+        'sample_size': n_sample,
+        'sampling_rate': q
+    }
+
+
+def get_heatmap(
+    conn: sqlite3.Connection,
+    place_id: int = GLOBAL_PLACE,
+    category: str = ALL_CATEGORIES
+) -> Dict[str, Any]:
+    """
+    Day-of-week x hour-of-day matrices for a place and category
+
+    Reads at most 168 rows from the agg_heatmap primary key.
+
+    Returns:
+        Dict with 7x24 lists for orders, revenue and quantity (row 0 = Monday)
+    """
+    matrices = {name: np.zeros((7, 24)) for name in ('orders', 'revenue', 'quantity')}
+    rows = conn.execute(
+        """
+        SELECT dow, hour, orders, revenue, quantity
+        FROM agg_heatmap
+        WHERE place_id = ? AND category = ?
+        """,
+        (int(place_id), category)
+    ).fetchall()
+    for dow, hour, orders, revenue, quantity in rows:
+        matrices['orders'][dow, hour] = orders
+        matrices['revenue'][dow, hour] = revenue
+        matrices['quantity'][dow, hour] = quantity
+
+    return {
+        'orders': matrices['orders'].astype(int).tolist(),
+        'revenue': np.round(matrices['revenue'], 2).tolist(),
+        'quantity': matrices['quantity'].tolist(),
+        'timezone': HEATMAP_TIMEZONE
+    }
@@ -0,0 +1,352 @@
+"""
+Fresh Flow Markets - Background Scheduler
+In-process, thread-based job runner with job state persisted in SQLite.
+
+Each job runs on its own interval (or once a day at a fixed hour) with
+random jitter so jobs started together drift apart. Overlap is prevented
+twice: an in-process lock per job, and a lease row in `scheduler_jobs`
+that only one process can hold at a time, so several API workers sharing
+one database never run the same job concurrently.
+
+Per-process jobs (per_process=True) maintain state that lives in each
+process, such as loaded models. They take no lease and keep their next run
+in memory, so every worker runs them on its own schedule; the shared row
+only records the latest run of any process.
+"""
+
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+SCHEDULER_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS scheduler_jobs (
+        name TEXT PRIMARY KEY,
+        interval_seconds INTEGER,
+        daily_at_hour INTEGER,
+        jitter_seconds INTEGER NOT NULL DEFAULT 0,
+        enabled INTEGER NOT NULL DEFAULT 1,
+        next_run INTEGER,
+        last_started INTEGER,
+        last_finished INTEGER,
+        last_status TEXT,
+        last_error TEXT,
+        last_result TEXT,
+        last_duration_ms REAL,
+        run_count INTEGER NOT NULL DEFAULT 0,
+        error_count INTEGER NOT NULL DEFAULT 0,
+        lease_owner TEXT,
+        lease_expires INTEGER
+    )
+"""
+
+# Idle wait between checks for due jobs (seconds)
+POLL_SECONDS = 5
+
+
+class Job:
+    """A registered job: a callable taking a fresh SQLite connection"""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[sqlite3.Connection], Any],
+        interval_seconds: Optional[int] = None,
+        daily_at_hour: Optional[int] = None,
+        jitter_seconds: int = 0,
+        lease_seconds: int = 3600,
+        run_on_start: bool = False,
+        per_process: bool = False
+    ):
+        if (interval_seconds is None) == (daily_at_hour is None):
+            raise ValueError(f"Job '{name}' needs exactly one of interval_seconds or daily_at_hour")
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self.daily_at_hour = daily_at_hour
+        self.jitter_seconds = jitter_seconds
+        self.lease_seconds = lease_seconds
+        self.run_on_start = run_on_start
+        self.per_process = per_process
+        # Next due time of a per-process job in this process
+        self.next_run: Optional[int] = None
+        self.lock = threading.Lock()
+
+    def next_run_after(self, now: float) -> int:
+        """Next due time (UNIX seconds) after `now`, including jitter"""
+        jitter = random.uniform(0, self.jitter_seconds) if self.jitter_seconds else 0
+        if self.interval_seconds is not None:
+            return int(now + self.interval_seconds + jitter)
+        current = datetime.fromtimestamp(now)
+        due = current.replace(hour=self.daily_at_hour, minute=0, second=0, microsecond=0)
+        if due <= current:
+            due += timedelta(days=1)
+        return int(due.timestamp() + jitter)
+
+
+class Scheduler:
+    """
+    Runs registered jobs on background threads
+
+    Usage:
+        scheduler = Scheduler('database/fresh_flow_markets.db')
+        scheduler.register(Job('refresh_rollups', refresh, interval_seconds=300, jitter_seconds=30))
+        scheduler.start()
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.jobs: Dict[str, Job] = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute(SCHEDULER_SCHEMA)
+        return conn
+
+    def register(self, job: Job):
+        """Add a job and create its row (existing rows keep their schedule)"""
+        self.jobs[job.name] = job
+        now = time.time()
+        first_run = int(now) if job.run_on_start else job.next_run_after(now)
+        if job.per_process:
+            job.next_run = first_run
+        conn = self._connect()
+        try:
+            conn.execute(
+                """
+                INSERT INTO scheduler_jobs (name, interval_seconds, daily_at_hour, jitter_seconds, next_run)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    interval_seconds = excluded.interval_seconds,
+                    daily_at_hour = excluded.daily_at_hour,
+                    jitter_seconds = excluded.jitter_seconds,
+                    next_run = CASE WHEN ? THEN MIN(COALESCE(next_run, excluded.next_run), excluded.next_run)
+                                    ELSE COALESCE(next_run, excluded.next_run) END
+                """,
+                (job.name, job.interval_seconds, job.daily_at_hour, job.jitter_seconds, first_run, job.run_on_start)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start the scheduler loop on a daemon thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        # Leases are held per process; a scheduler built before a fork takes
+        # the pid of the process that starts it
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='ffm-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the loop; running jobs finish on their own threads"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                for name in self._due_jobs():
+                    self._spawn(name)
+            except Exception:
+                traceback.print_exc()
+            self._wake.wait(POLL_SECONDS)
+            self._wake.clear()
+
+    def _due_jobs(self) -> List[str]:
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT name, next_run FROM scheduler_jobs WHERE enabled = 1").fetchall()
+        finally:
+            conn.close()
+        now = int(time.time())
+        due = []
+        for name, next_run in rows:
+            job = self.jobs.get(name)
+            if job is None:
+                continue
+            if job.per_process:
+                next_run = job.next_run
+            if next_run is not None and next_run <= now:
+                due.append(name)
+        return due
+
+    def _spawn(self, name: str):
+        job = self.jobs[name]
+        if job.lock.locked():
+            return
+        threading.Thread(target=self.run_job, args=(name,), name=f'ffm-job-{name}', daemon=True).start()
+
+    # ------------------------------------------------------------------
+    # Running jobs
+    # ------------------------------------------------------------------
+
+    def _acquire_lease(self, conn: sqlite3.Connection, job: Job, now: int) -> bool:
+        """Take the job's lease unless another live owner holds it"""
+        cur = conn.execute(
+            """
+            UPDATE scheduler_jobs
+            SET lease_owner = ?, lease_expires = ?, last_started = ?, last_status = 'running'
+            WHERE name = ? AND (lease_owner IS NULL OR lease_expires < ?)
+            """,
+            (self.owner, now + job.lease_seconds, now, job.name, now)
+        )
+        conn.commit()
+        return cur.rowcount == 1
+
+    def run_job(self, name: str) -> Dict[str, Any]:
+        """
+        Run a job now on the calling thread, respecting overlap protection
+
+        Returns:
+            The job's status row after the run (last_status 'skipped' if it
+            was already running here or, unless per-process, in another
+            process)
+        """
+        job = self.jobs.get(name)
+        if job is None:
+            raise KeyError(f"Unknown job '{name}'")
+
+        if not job.lock.acquire(blocking=False):
+            return {'name': name, 'last_status': 'skipped', 'reason': 'already running in this process'}
+        try:
+            conn = self._connect()
+            try:
+                started = time.time()
+                if job.per_process:
+                    conn.execute(
+                        "UPDATE scheduler_jobs SET last_started = ?, last_status = 'running' WHERE name = ?",
+                        (int(started), name)
+                    )
+                    conn.commit()
+                elif not self._acquire_lease(conn, job, int(started)):
+                    # Someone else is running it; look again after the next interval
+                    conn.execute(
+                        "UPDATE scheduler_jobs SET next_run = ? WHERE name = ?",
+                        (job.next_run_after(started), name)
+                    )
+                    conn.commit()
+                    return {'name': name, 'last_status': 'skipped', 'reason': 'lease held by another process'}
+
+                status, error, result = 'ok', None, None
+                try:
+                    result = job.func(conn)
+                except Exception as e:
+                    conn.rollback()
+                    status, error = 'error', f"{type(e).__name__}: {e}"
+                    traceback.print_exc()
+
+                finished = time.time()
+                next_run = job.next_run_after(finished)
+                if job.per_process:
+                    # Other processes keep their own schedule and never held a lease
+                    job.next_run = next_run
+                    shared = ""
+                else:
+                    shared = ", next_run = :next_run, lease_owner = NULL, lease_expires = NULL"
+                conn.execute(
+                    f"""
+                    UPDATE scheduler_jobs SET
+                        last_finished = :finished, last_status = :status, last_error = :error,
+                        last_result = :result, last_duration_ms = :duration, run_count = run_count + 1,
+                        error_count = error_count + :failed{shared}
+                    WHERE name = :name
+                    """,
+                    {
+                        'finished': int(finished), 'status': status, 'error': error,
+                        'result': json.dumps(result, default=str) if result is not None else None,
+                        'duration': round((finished - started) * 1000, 1), 'failed': int(status == 'error'),
+                        'next_run': next_run, 'name': name
+                    }
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        finally:
+            job.lock.release()
+        return self.get_job(name)
+
+    def trigger(self, name: str):
+        """Make a job due now; it runs on the scheduler thread shortly (only in this process if per-process)"""
+        if name not in self.jobs:
+            raise KeyError(f"Unknown job '{name}'")
+        if self.jobs[name].per_process:
+            self.jobs[name].next_run = int(time.time())
+            self._wake.set()
+            return
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE scheduler_jobs SET next_run = ? WHERE name = ?", (int(time.time()), name))
+            conn.commit()
+        finally:
+            conn.close()
+        self._wake.set()
+
+    def set_enabled(self, name: str, enabled: bool):
+        """Pause or resume a job"""
+        if name not in self.jobs:
+            raise KeyError(f"Unknown job '{name}'")
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE scheduler_jobs SET enabled = ? WHERE name = ?", (int(enabled), name))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # Status
+    # ------------------------------------------------------------------
+
+    def _rows(self, where: str = "", params=()) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            cur = conn.execute(f"SELECT * FROM scheduler_jobs {where} ORDER BY name", params)
+            columns = [c[0] for c in cur.description]
+            rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+        finally:
+            conn.close()
+        for row in rows:
+            if row.get('last_result'):
+                row['last_result'] = json.loads(row['last_result'])
+            job = self.jobs.get(row['name'])
+            row['registered'] = job is not None
+            row['running_here'] = bool(job and job.lock.locked())
+            row['per_process'] = bool(job and job.per_process)
+            if job and job.per_process:
+                row['next_run'] = job.next_run
+        return rows
+
+    def get_job(self, name: str) -> Optional[Dict[str, Any]]:
+        rows = self._rows("WHERE name = ?", (name,))
+        return rows[0] if rows else None
+
+    def status(self) -> Dict[str, Any]:
+        """Scheduler state and one status row per job"""
+        return {
+            'running': self.running,
+            'owner': self.owner,
+            'poll_seconds': POLL_SECONDS,
+            'jobs': self._rows()
+        }
@@ -0,0 +1,290 @@
+"""
+Fresh Flow Markets - Probabilistic Sketches
+Compact, mergeable summaries used by the analytics rollups
+"""
+
+import numpy as np
+from typing import Iterable, Tuple
+
+# 2^12 registers -> ~1.6% standard error, 4 KB dense / a few bytes per entry sparse
+HLL_PRECISION = 12
+
+_FORMAT_DENSE = b'D'
+_FORMAT_SPARSE = b'S'
+
+
+def hash64(values) -> np.ndarray:
+    """
+    Hash integer ids to well-mixed 64-bit values (splitmix64 finalizer)
+
+    Args:
+        values: Iterable or array of integer ids
+
+    Returns:
+        uint64 array of hashes
+    """
+    x = np.asarray(values, dtype=np.int64).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return x
+
+
+def register_updates(values, p: int = HLL_PRECISION) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute HyperLogLog (register index, rank) pairs for a batch of ids
+
+    Args:
+        values: Integer ids
+        p: Precision (number of index bits)
+
+    Returns:
+        Tuple of (uint16 register indexes, uint8 ranks)
+    """
+    h = hash64(values)
+    q = 64 - p
+    idx = (h >> np.uint64(q)).astype(np.uint16)
+    w = (h & np.uint64((1 << q) - 1)).astype(np.float64)  # exact: q <= 52 bits
+
+    # rank = position of the leftmost 1-bit in the remaining q bits
+    _, exponent = np.frexp(w)
+    rank = np.where(w > 0, q - exponent + 1, q + 1).astype(np.uint8)
+    return idx, rank
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter with lossless union
+
+    Registers are stored densely in memory and serialized sparsely when most
+    of them are empty, which keeps per-place, per-day sketches to a few bytes.
+    """
+
+    def __init__(self, p: int = HLL_PRECISION, registers: np.ndarray = None):
+        self.p = p
+        self.m = 1 << p
+        if registers is None:
+            registers = np.zeros(self.m, dtype=np.uint8)
+        self.registers = registers
+
+    @property
+    def relative_error(self) -> float:
+        """Standard error of the cardinality estimate (1.04 / sqrt(m))"""
+        return 1.04 / np.sqrt(self.m)
+
+    def add_many(self, values) -> 'HyperLogLog':
+        """Add a batch of integer ids"""
+        values = np.asarray(values)
+        if values.size:
+            idx, rank = register_updates(values, self.p)
+            np.maximum.at(self.registers, idx, rank)
+        return self
+
+    def add_registers(self, idx: np.ndarray, rank: np.ndarray) -> 'HyperLogLog':
+        """Fold precomputed (index, rank) pairs into the sketch"""
+        if len(idx):
+            np.maximum.at(self.registers, idx, rank)
+        return self
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """Union with another sketch of the same precision (in place)"""
+        if other.p != self.p:
+            raise ValueError(f"Cannot merge HLL with p={other.p} into p={self.p}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def merge_bytes(self, blob: bytes) -> 'HyperLogLog':
+        """Union with a serialized sketch without materializing a second object"""
+        fmt, payload = blob[:1], blob[1:]
+        if fmt == _FORMAT_SPARSE:
+            packed = np.frombuffer(payload, dtype='<u4')
+            idx = (packed >> 8).astype(np.intp)
+            rank = (packed & 0xFF).astype(np.uint8)
+            # Indexes are unique within one blob, so fancy assignment is safe
+            self.registers[idx] = np.maximum(self.registers[idx], rank)
+        elif fmt == _FORMAT_DENSE:
+            np.maximum(self.registers, np.frombuffer(payload, dtype=np.uint8), out=self.registers)
+        else:
+            raise ValueError(f"Unknown HLL serialization format: {fmt!r}")
+        return self
+
+    def cardinality(self) -> float:
+        """Estimate the number of distinct ids added"""
+        m = self.m
+        if m == 16:
+            alpha = 0.673
+        elif m == 32:
+            alpha = 0.697
+        elif m == 64:
+            alpha = 0.709
+        else:
+            alpha = 0.7213 / (1 + 1.079 / m)
+
+        registers = self.registers.astype(np.float64)
+        estimate = alpha * m * m / np.sum(np.exp2(-registers))
+
+        # Small-range correction (linear counting)
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+    def to_bytes(self) -> bytes:
+        """Serialize, choosing the sparse layout when it is smaller"""
+        nonzero = np.flatnonzero(self.registers)
+        if len(nonzero) * 4 < self.m:
+            packed = (nonzero.astype('<u4') << 8) | self.registers[nonzero].astype('<u4')
+            return _FORMAT_SPARSE + packed.tobytes()
+        return _FORMAT_DENSE + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, blob: bytes, p: int = HLL_PRECISION) -> 'HyperLogLog':
+        """Deserialize a sketch produced by to_bytes"""
+        return cls(p).merge_bytes(blob)
+
+    @classmethod
+    def union(cls, blobs: Iterable[bytes], p: int = HLL_PRECISION) -> 'HyperLogLog':
+        """Merge any number of serialized sketches into one"""
+        sketch = cls(p)
+        for blob in blobs:
+            sketch.merge_bytes(blob)
+        return sketch
+
+
+# ============================================================================
+# HEAVY HITTERS
+# ============================================================================
+
+# 4 rows x 256 counters: overestimates by at most ~1% of the stream
+# (e / width) with probability 1 - e^-4, in 4 KB
+CM_WIDTH = 256
+CM_DEPTH = 4
+
+
+class CountMinSketch:
+    """
+    Count-Min sketch for approximate per-key counts
+
+    Estimates never undercount; sketches with the same shape merge by
+    adding their tables.
+    """
+
+    def __init__(self, width: int = CM_WIDTH, depth: int = CM_DEPTH, table: np.ndarray = None):
+        self.width = width
+        self.depth = depth
+        if table is None:
+            table = np.zeros((depth, width), dtype=np.int32)
+        self.table = table
+        self.total = int(table[0].sum())
+
+    def _indexes(self, keys) -> np.ndarray:
+        """Column per row for each key (double hashing from one 64-bit hash)"""
+        h = hash64(keys)
+        h1 = (h & np.uint64(0xFFFFFFFF)).astype(np.int64)
+        h2 = (h >> np.uint64(32)).astype(np.int64) | 1
+        rows = np.arange(self.depth, dtype=np.int64)[:, None]
+        return (h1[None, :] + rows * h2[None, :]) % self.width
+
+    def add_many(self, keys, counts=None) -> 'CountMinSketch':
+        """Add a batch of integer keys (with optional per-key counts)"""
+        keys = np.asarray(keys)
+        if keys.size == 0:
+            return self
+        counts = np.ones(keys.size, dtype=np.int32) if counts is None else np.asarray(counts, dtype=np.int32)
+        columns = self._indexes(keys)
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], counts)
+        self.total += int(counts.sum())
+        return self
+
+    def estimate(self, keys) -> np.ndarray:
+        """Upper-bound count estimates for a batch of keys"""
+        keys = np.asarray(keys)
+        if keys.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        columns = self._indexes(keys)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0).astype(np.int64)
+
+    def merge(self, other: 'CountMinSketch') -> 'CountMinSketch':
+        """Add another sketch of the same shape into this one (in place)"""
+        if other.table.shape != self.table.shape:
+            raise ValueError(f"Cannot merge Count-Min {other.table.shape} into {self.table.shape}")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters with a fixed number of counters
+
+    Counters are grouped in buckets by count, so a unit increment and an
+    eviction of the smallest counter are O(1). Every key whose true count
+    exceeds total / capacity is guaranteed to be tracked; `error` bounds how
+    much a counter may overestimate.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.buckets = {}
+        self.min_count = 0
+        self.total = 0
+
+    def _move(self, key, old: int, new: int):
+        if old:
+            bucket = self.buckets[old]
+            bucket.discard(key)
+            if not bucket:
+                del self.buckets[old]
+                if old == self.min_count:
+                    # Unit steps land in the next bucket; larger steps search the (<= capacity) buckets
+                    self.min_count = new if new == old + 1 or not self.buckets else min(min(self.buckets), new)
+        self.buckets.setdefault(new, set()).add(key)
+        if not self.min_count or new < self.min_count:
+            self.min_count = new
+
+    def add(self, key, count: int = 1):
+        """Count `count` occurrences of key"""
+        self.total += count
+        current = self.counts.get(key)
+        if current is not None:
+            self.counts[key] = current + count
+            self._move(key, current, current + count)
+            return
+
+        if len(self.counts) < self.capacity:
+            self.counts[key] = count
+            self.errors[key] = 0
+            self._move(key, 0, count)
+            return
+
+        # Replace a key with the smallest counter; the newcomer inherits its count as error
+        floor = self.min_count
+        evicted = self.buckets[floor].pop()
+        if not self.buckets[floor]:
+            del self.buckets[floor]
+        del self.counts[evicted]
+        del self.errors[evicted]
+        self.counts[key] = floor + count
+        self.errors[key] = floor
+        self.buckets.setdefault(floor + count, set()).add(key)
+        if floor not in self.buckets:
+            self.min_count = floor + 1 if count == 1 else min(self.buckets)
+
+    def upper_bound(self, key) -> int:
+        """Most times key can have occurred: its counter, or the smallest counter once untracked keys were evicted"""
+        count = self.counts.get(key)
+        if count is not None:
+            return count
+        return self.min_count if len(self.counts) >= self.capacity else 0
+
+    def items(self):
+        """(key, count, error) tuples, largest count first"""
+        return sorted(
+            ((key, count, self.errors[key]) for key, count in self.counts.items()),
+            key=lambda entry: entry[1], reverse=True
+        )
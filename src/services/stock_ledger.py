@@ -0,0 +1,330 @@
+"""
+Fresh Flow Markets - Stock Ledger
+Append-only stock movements with materialized on-hand levels.
+
+Every change in stock is a row in `fct_stock_movements` (receipt, sale,
+adjustment or waste). `stock_levels` holds the running on-hand quantity per
+item and is updated in the same transaction as the movement, so the two never
+disagree. A partial index on `on_hand < minimum_stock` keeps the low-stock
+lookup proportional to the number of low items, not the catalog size.
+
+Sales depletion is driven by the fct_order_items watermark and runs from
+the scheduler (refresh_rollups job), never from read requests.
+"""
+
+import sqlite3
+import pandas as pd
+from typing import Any, Dict, List, Optional
+
+from .rollups import ensure_rollup_schema, get_watermark, immediate_transaction, set_watermark
+
+MOVEMENT_TYPES = ('receipt', 'sale', 'adjustment', 'waste')
+
+# Movement types whose quantity always reduces stock
+OUTBOUND_TYPES = ('sale', 'waste')
+
+LEDGER_SCHEMA = [
+    f"""
+    CREATE TABLE IF NOT EXISTS fct_stock_movements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_id INTEGER NOT NULL,
+        movement_type TEXT NOT NULL CHECK(movement_type IN ({', '.join(repr(t) for t in MOVEMENT_TYPES)})),
+        quantity REAL NOT NULL,
+        reference TEXT,
+        note TEXT,
+        created INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_stock_movements_item_created ON fct_stock_movements(item_id, created)",
+    """
+    CREATE TABLE IF NOT EXISTS stock_levels (
+        item_id INTEGER PRIMARY KEY,
+        on_hand REAL NOT NULL DEFAULT 0,
+        minimum_stock REAL NOT NULL DEFAULT 0,
+        stock_unit TEXT,
+        updated INTEGER
+    )
+    """,
+    # Only low items are indexed; item_id is the rowid, so the index covers
+    # (item_id, on_hand, minimum_stock) for the low-stock scan
+    """
+    CREATE INDEX IF NOT EXISTS idx_stock_levels_low
+    ON stock_levels(on_hand, minimum_stock)
+    WHERE on_hand < minimum_stock
+    """,
+]
+
+
+def ensure_ledger_schema(conn: sqlite3.Connection):
+    """
+    Create ledger tables and indexes if they do not exist
+
+    The first time the ledger is created, sales depletion starts from the
+    current end of fct_order_items; historical sales are not replayed
+    against opening balances.
+    """
+    ensure_rollup_schema(conn)
+    for statement in LEDGER_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+    baseline_sql = "SELECT 1 FROM rollup_watermarks WHERE name = 'stock_sales'"
+    if conn.execute(baseline_sql).fetchone():
+        return
+    with immediate_transaction(conn):
+        if conn.execute(baseline_sql).fetchone():
+            return
+        has_items = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'fct_order_items'"
+        ).fetchone()
+        last_rowid = 0
+        if has_items:
+            last_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM fct_order_items").fetchone()[0]
+        set_watermark(conn, 'stock_sales', last_rowid)
+
+
+def _signed_quantity(movement_type: str, quantity: float) -> float:
+    """Apply the sign convention: receipts add, sales/waste remove, adjustments as given"""
+    if movement_type not in MOVEMENT_TYPES:
+        raise ValueError(f"Unknown movement_type '{movement_type}'. Allowed: {', '.join(MOVEMENT_TYPES)}")
+    quantity = float(quantity)
+    if movement_type == 'adjustment':
+        return quantity
+    if quantity < 0:
+        raise ValueError(f"quantity must be positive for {movement_type} movements")
+    return -quantity if movement_type in OUTBOUND_TYPES else quantity
+
+
+def _apply_level_delta(conn: sqlite3.Connection, item_id: int, delta: float):
+    conn.execute(
+        """
+        INSERT INTO stock_levels (item_id, on_hand, updated)
+        VALUES (?, ?, strftime('%s', 'now'))
+        ON CONFLICT(item_id) DO UPDATE SET
+            on_hand = on_hand + excluded.on_hand,
+            updated = excluded.updated
+        """,
+        (int(item_id), float(delta))
+    )
+
+
+def item_exists(conn: sqlite3.Connection, item_id: int) -> bool:
+    """True if the item is in dim_items"""
+    return conn.execute("SELECT 1 FROM dim_items WHERE id = ?", (int(item_id),)).fetchone() is not None
+
+
+def get_stock_level(conn: sqlite3.Connection, item_id: int) -> Optional[Dict[str, Any]]:
+    """Current on-hand and minimum for an item, or None if it is not tracked"""
+    row = conn.execute(
+        "SELECT item_id, on_hand, minimum_stock, stock_unit, updated FROM stock_levels WHERE item_id = ?",
+        (int(item_id),)
+    ).fetchone()
+    if row is None:
+        return None
+    return dict(zip(('item_id', 'on_hand', 'minimum_stock', 'stock_unit', 'updated'), row))
+
+
+def record_movement(
+    conn: sqlite3.Connection,
+    item_id: int,
+    movement_type: str,
+    quantity: float,
+    reference: Optional[str] = None,
+    note: Optional[str] = None,
+    created: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Append a stock movement and update the item's on-hand level atomically
+
+    Args:
+        conn: SQLite connection
+        item_id: Item the movement applies to
+        movement_type: 'receipt', 'sale', 'adjustment' or 'waste'
+        quantity: Units moved (positive; adjustments may be signed)
+        reference: External reference (order id, delivery note, ...)
+        note: Free-text note
+        created: UNIX timestamp of the movement (defaults to now)
+
+    Returns:
+        The item's stock level after the movement, or None if the item does
+        not exist
+    """
+    delta = _signed_quantity(movement_type, quantity)
+    if not item_exists(conn, item_id):
+        return None
+    ensure_ledger_schema(conn)
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO fct_stock_movements (item_id, movement_type, quantity, reference, note, created)
+            VALUES (?, ?, ?, ?, ?, COALESCE(?, strftime('%s', 'now')))
+            """,
+            (int(item_id), movement_type, delta, reference, note, created)
+        )
+        _apply_level_delta(conn, item_id, delta)
+    return get_stock_level(conn, item_id)
+
+
+def set_on_hand(conn: sqlite3.Connection, item_id: int, on_hand: float, note: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Bring an item's on-hand quantity to a counted value via an adjustment
+
+    The delta is computed inside the write transaction, so concurrent
+    movements cannot be lost. Returns None if the item does not exist.
+    """
+    if not item_exists(conn, item_id):
+        return None
+    ensure_ledger_schema(conn)
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO fct_stock_movements (item_id, movement_type, quantity, note, created)
+            SELECT ?, 'adjustment',
+                   ? - COALESCE((SELECT on_hand FROM stock_levels WHERE item_id = ?), 0),
+                   ?, strftime('%s', 'now')
+            """,
+            (int(item_id), float(on_hand), int(item_id), note or 'Stock count')
+        )
+        conn.execute(
+            """
+            INSERT INTO stock_levels (item_id, on_hand, updated)
+            VALUES (?, ?, strftime('%s', 'now'))
+            ON CONFLICT(item_id) DO UPDATE SET
+                on_hand = excluded.on_hand,
+                updated = excluded.updated
+            """,
+            (int(item_id), float(on_hand))
+        )
+    return get_stock_level(conn, item_id)
+
+
+def set_stock_settings(
+    conn: sqlite3.Connection,
+    item_id: int,
+    minimum_stock: Optional[float] = None,
+    stock_unit: Optional[str] = None
+) -> Dict[str, Any]:
+    """Set the reorder threshold and/or unit for an item (starts tracking it; None if the item does not exist)"""
+    if not item_exists(conn, item_id):
+        return None
+    ensure_ledger_schema(conn)
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO stock_levels (item_id, minimum_stock, stock_unit, updated)
+            VALUES (?, COALESCE(?, 0), ?, strftime('%s', 'now'))
+            ON CONFLICT(item_id) DO UPDATE SET
+                minimum_stock = COALESCE(?, minimum_stock),
+                stock_unit = COALESCE(?, stock_unit),
+                updated = excluded.updated
+            """,
+            (int(item_id), minimum_stock, stock_unit, minimum_stock, stock_unit)
+        )
+    return get_stock_level(conn, item_id)
+
+
+def get_movements(conn: sqlite3.Connection, item_id: int, limit: int = 100) -> List[Dict[str, Any]]:
+    """Most recent movements for an item"""
+    cur = conn.execute(
+        """
+        SELECT id, item_id, movement_type, quantity, reference, note, created
+        FROM fct_stock_movements
+        WHERE item_id = ?
+        ORDER BY created DESC, id DESC
+        LIMIT ?
+        """,
+        (int(item_id), int(limit))
+    )
+    columns = [c[0] for c in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def apply_sales_depletion(conn: sqlite3.Connection, chunk_size: int = 200_000) -> int:
+    """
+    Deplete stock for order lines appended since the last run
+
+    Only items under stock control (present in stock_levels) are depleted;
+    one 'sale' movement is written per (order, item). Each chunk reads the
+    watermark and writes its movements in one BEGIN IMMEDIATE transaction,
+    so overlapping runs never deplete the same line twice.
+
+    Returns:
+        Number of order lines consumed
+    """
+    ensure_ledger_schema(conn)
+    consumed = 0
+    while True:
+        with immediate_transaction(conn):
+            watermark = get_watermark(conn, 'stock_sales')
+            df = pd.read_sql_query(
+                """
+                SELECT oi.rowid AS source_rowid, oi.order_id, oi.item_id, oi.quantity, oi.created,
+                       s.item_id IS NOT NULL AS tracked
+                FROM fct_order_items oi
+                LEFT JOIN stock_levels s ON s.item_id = oi.item_id
+                WHERE oi.rowid > ?
+                ORDER BY oi.rowid
+                LIMIT ?
+                """,
+                conn, params=(watermark, chunk_size)
+            )
+            if df.empty:
+                break
+
+            sales = df[df['tracked'] == 1].dropna(subset=['item_id'])
+            if not sales.empty:
+                per_order = sales.groupby(['order_id', 'item_id'], dropna=False).agg(
+                    quantity=('quantity', 'sum'), created=('created', 'max')
+                ).reset_index()
+                conn.executemany(
+                    """
+                    INSERT INTO fct_stock_movements (item_id, movement_type, quantity, reference, created)
+                    VALUES (?, 'sale', ?, ?, ?)
+                    """,
+                    [
+                        (int(r.item_id), -float(r.quantity or 0),
+                         None if pd.isna(r.order_id) else str(int(r.order_id)),
+                         int(r.created) if not pd.isna(r.created) else None)
+                        for r in per_order.itertuples(index=False)
+                    ]
+                )
+                for item_id, qty in sales.groupby('item_id')['quantity'].sum().items():
+                    _apply_level_delta(conn, int(item_id), -float(qty))
+            set_watermark(conn, 'stock_sales', int(df['source_rowid'].iloc[-1]))
+        consumed += len(df)
+
+    return consumed
+
+
+def get_low_stock(conn: sqlite3.Connection, limit: int = 100) -> List[Dict[str, Any]]:
+    """
+    Active items whose on-hand quantity is below their minimum
+
+    The stock condition matches idx_stock_levels_low exactly, so SQLite scans
+    the partial index without touching healthy items and looks each low item
+    up in dim_items by primary key to drop inactive ones.
+    """
+    cur = conn.execute(
+        """
+        SELECT
+            s.item_id AS id,
+            i.title,
+            i.number AS barcode,
+            i.price,
+            i.status,
+            s.on_hand,
+            s.minimum_stock,
+            s.minimum_stock - s.on_hand AS shortfall,
+            s.stock_unit,
+            st.qty_30d AS quantity_30d
+        FROM stock_levels s
+        JOIN dim_items i ON i.id = s.item_id
+        LEFT JOIN item_stats st ON st.item_id = s.item_id
+        WHERE s.on_hand < s.minimum_stock AND i.status = 'Active'
+        ORDER BY s.on_hand
+        LIMIT ?
+        """,
+        (int(limit),)
+    )
+    columns = [c[0] for c in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
@@ -0,0 +1,240 @@
+"""
+Fresh Flow Markets - Stockout Risk
+Monte Carlo stockout risk and service-level reorder quantities.
+
+Each simulated demand path is the item's point forecast plus normal noise
+per day, clipped at zero. The noise comes from the category's forecast
+error in the forecaster's MSE.json. Its root is taken relative to the
+category's mean daily demand (feature store mean_28), so noise scales with
+the item's forecast:
+
+    sigma = max(rmse / category_mean_28 * forecast, sqrt(forecast))
+
+The sqrt term is a Poisson floor for items too small for the category
+error to mean much. A category without recent sales uses the plain rmse.
+Categories without an MSE.json entry use the median entry.
+
+Paths cover lead time + review period. Stockout probability is the share
+of paths whose demand over the lead time exceeds current stock. The
+reorder quantity tops stock up to the service-level quantile of demand
+over the whole horizon. All paths for a chunk of items are drawn as one
+(items, paths, days) array. Chunks are capped at MAX_DRAWS_PER_CHUNK values.
+"""
+
+import re
+import sqlite3
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from .feature_store import get_category_features, get_items_features
+from .item_categories import broad_category, load_item_categories
+from .rollups import ensure_rollup_schema
+from .stock_ledger import ensure_ledger_schema
+
+DEFAULT_SERVICE_LEVEL = 0.95
+DEFAULT_SIMULATIONS = 2000
+DEFAULT_REVIEW_DAYS = 7
+
+# Values per simulation chunk (items x paths x days float64 = 32 MB)
+MAX_DRAWS_PER_CHUNK = 4_000_000
+
+# Items per predict_demand_many call
+RISK_BATCH_ITEMS = 2000
+
+
+def _error_key(category: str) -> str:
+    return re.sub(r'[^a-z0-9]', '', category.lower())
+
+
+def category_rmse(errors: Dict[str, float], category: str) -> Dict[str, Any]:
+    """
+    Root of a category's MSE.json entry
+
+    MSE.json is keyed by display name ("Main Courses"); specific
+    categories ("Sodavand") use their broad category's entry. Falls back to
+    the median entry (source 'default') when there is none.
+    """
+    lookup = {_error_key(name): float(value) for name, value in errors.items() if value is not None}
+    for key in (_error_key(category), _error_key(broad_category(category))):
+        if key in lookup:
+            return {'rmse': float(np.sqrt(lookup[key])), 'source': 'category'}
+    if not lookup:
+        return {'rmse': 0.0, 'source': 'none'}
+    return {'rmse': float(np.sqrt(np.median(list(lookup.values())))), 'source': 'default'}
+
+
+def simulate_stockout(forecast, sigma, current_stock, lead_time_days: int,
+                      service_level: float = DEFAULT_SERVICE_LEVEL,
+                      simulations: int = DEFAULT_SIMULATIONS,
+                      seed: Optional[int] = None,
+                      max_draws: int = MAX_DRAWS_PER_CHUNK) -> Dict[str, np.ndarray]:
+    """
+    Simulate demand paths and summarize them per item
+
+    Args:
+        forecast: (items, days) point forecasts; days >= lead_time_days
+        sigma: Noise standard deviation, (items, days) or (items,)
+        current_stock: Stock on hand per item
+        lead_time_days: Days until an order placed now arrives
+        service_level: Probability the reorder quantity covers the horizon
+        simulations: Paths per item
+        seed: Random seed (reproducible results)
+        max_draws: Values per chunk of items
+
+    Returns:
+        Arrays per item: stockout_probability (within the lead time),
+        expected_shortfall (within the lead time), expected_demand and
+        service_level_demand (whole horizon), reorder_quantity, and
+        stockout_day (median first day demand exceeds stock, 1-based,
+        0 when the median path does not run out within the horizon)
+    """
+    forecast = np.atleast_2d(np.asarray(forecast, dtype=np.float64))
+    n_items, days = forecast.shape
+    sigma = np.asarray(sigma, dtype=np.float64)
+    sigma = np.broadcast_to(sigma[:, None] if sigma.ndim == 1 else sigma, (n_items, days))
+    stock = np.broadcast_to(np.asarray(current_stock, dtype=np.float64), (n_items,))
+    lead = min(max(int(lead_time_days), 1), days)
+    rng = np.random.default_rng(seed)
+
+    result = {name: np.zeros(n_items) for name in (
+        'stockout_probability', 'expected_shortfall', 'expected_demand', 'service_level_demand', 'stockout_day'
+    )}
+    chunk = max(1, max_draws // (simulations * days))
+    for start in range(0, n_items, chunk):
+        rows = slice(start, start + chunk)
+        demand = rng.standard_normal((len(forecast[rows]), simulations, days))
+        demand *= sigma[rows, None, :]
+        demand += forecast[rows, None, :]
+        np.maximum(demand, 0, out=demand)
+        np.cumsum(demand, axis=2, out=demand)
+
+        on_hand = stock[rows, None]
+        lead_demand = demand[:, :, lead - 1]
+        total = demand[:, :, -1]
+        result['stockout_probability'][rows] = (lead_demand > on_hand).mean(axis=1)
+        result['expected_shortfall'][rows] = np.maximum(lead_demand - on_hand, 0).mean(axis=1)
+        result['expected_demand'][rows] = total.mean(axis=1)
+        result['service_level_demand'][rows] = np.quantile(total, service_level, axis=1)
+
+        ran_out = demand > on_hand[:, :, None]
+        first = np.where(ran_out[:, :, -1], ran_out.argmax(axis=2) + 1, days + 1)
+        median = np.median(first, axis=1)
+        result['stockout_day'][rows] = np.where(median <= days, np.ceil(median), 0)
+
+    result['reorder_quantity'] = np.maximum(result['service_level_demand'] - stock, 0)
+    return result
+
+
+def _active_stock(conn: sqlite3.Connection) -> Dict[int, float]:
+    """On-hand quantity of every Active item in the stock ledger that sold in the last 90 days"""
+    ensure_rollup_schema(conn)
+    ensure_ledger_schema(conn)
+    return dict(conn.execute(
+        """
+        SELECT l.item_id, l.on_hand
+        FROM stock_levels l
+        JOIN item_stats s ON s.item_id = l.item_id
+        JOIN dim_items i ON i.id = l.item_id
+        WHERE i.status = 'Active' AND s.qty_90d > 0
+        ORDER BY l.item_id
+        """
+    ).fetchall())
+
+
+def assess_stockout_risk(conn: sqlite3.Connection, ml_service, stock: Optional[Dict[int, float]] = None,
+                         lead_time_days: int = 3, review_days: int = DEFAULT_REVIEW_DAYS,
+                         service_level: float = DEFAULT_SERVICE_LEVEL,
+                         simulations: int = DEFAULT_SIMULATIONS,
+                         seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Stockout risk for items from their demand forecasts
+
+    Args:
+        conn: Database connection
+        ml_service: MLPredictionService used for the point forecasts
+        stock: Current stock per item id; every active item in the stock
+            ledger when None
+        lead_time_days: Days until an order placed now arrives
+        review_days: Days after arrival the order should also cover
+        service_level: Target probability of covering demand
+        simulations: Paths per item
+        seed: Random seed
+
+    Returns:
+        Dict with the parameters, per-category error scales, per-item
+        results (items that could not be forecast are listed in `failed`)
+    """
+    stock = _active_stock(conn) if stock is None else {int(k): float(v) for k, v in stock.items()}
+    item_ids = list(stock)
+    horizon = lead_time_days + review_days
+    titles = {}
+    for i in range(0, len(item_ids), 500):
+        batch = item_ids[i:i + 500]
+        titles.update(conn.execute(
+            f"SELECT id, title FROM dim_items WHERE id IN ({','.join('?' * len(batch))})", batch
+        ).fetchall())
+    categories = load_item_categories(conn, item_ids, store=False)
+    features = get_items_features(conn, item_ids)
+
+    forecasts = []
+    for start in range(0, len(item_ids), RISK_BATCH_ITEMS):
+        batch = item_ids[start:start + RISK_BATCH_ITEMS]
+        forecasts.extend(ml_service.predict_demand_many(
+            [(item_id, titles.get(item_id), features[item_id]['last_qty'], categories[item_id]) for item_id in batch],
+            forecast_days=horizon
+        ))
+
+    errors = ml_service.stock_forecaster.errors if ml_service.stock_forecaster else {}
+    scales, failed, rows = {}, [], []
+    for item_id, forecast in zip(item_ids, forecasts):
+        if forecast.get('status') == 'error':
+            failed.append({'item_id': item_id, 'error': forecast.get('error')})
+            continue
+        category = forecast['category_used']
+        if category not in scales:
+            mean_28 = get_category_features(conn, category)['mean_28']
+            scale = category_rmse(errors, category)
+            scales[category] = {**scale, 'category_mean_28': mean_28,
+                                'relative_error': scale['rmse'] / mean_28 if mean_28 else None}
+        rows.append((item_id, category, [p['predicted_quantity'] for p in forecast['predictions']],
+                     forecast['predictions'][0]['date']))
+
+    results = []
+    if rows:
+        point = np.array([daily for _, _, daily, _ in rows], dtype=np.float64)
+        relative = np.array([scales[category]['relative_error'] or 0.0 for _, category, _, _ in rows])
+        absolute = np.array([
+            scales[category]['rmse'] if scales[category]['relative_error'] is None else 0.0
+            for _, category, _, _ in rows
+        ])
+        sigma = np.maximum(np.maximum(relative[:, None] * point, absolute[:, None]), np.sqrt(point))
+        on_hand = np.array([stock[item_id] for item_id, _, _, _ in rows])
+        risk = simulate_stockout(point, sigma, on_hand, lead_time_days, service_level, simulations, seed)
+
+        for i, (item_id, category, _, start_date) in enumerate(rows):
+            probability = float(risk['stockout_probability'][i])
+            day = int(risk['stockout_day'][i])
+            results.append({
+                'item_id': item_id,
+                'category': category,
+                'current_stock': float(on_hand[i]),
+                'expected_demand': round(float(risk['expected_demand'][i]), 2),
+                'service_level_demand': round(float(risk['service_level_demand'][i]), 2),
+                'reorder_quantity': round(float(risk['reorder_quantity'][i]), 2),
+                'stockout_probability': round(probability, 4),
+                'expected_shortfall': round(float(risk['expected_shortfall'][i]), 2),
+                'stockout_date': (datetime.strptime(start_date, '%Y-%m-%d') + timedelta(days=day - 1))
+                .strftime('%Y-%m-%d') if day else None,
+                'urgency': 'high' if probability >= 0.5 else 'medium' if probability > 1 - service_level else 'low'
+            })
+
+    return {
+        'lead_time_days': lead_time_days,
+        'review_days': review_days,
+        'service_level': service_level,
+        'simulations': simulations,
+        'error_scales': scales,
+        'items': results,
+        'failed': failed
+    }
@@ -0,0 +1,43 @@
+"""
+?compare= windows: half-open, anchored on the current window's start, and
+never overlapping the current window.
+"""
+
+import pytest
+from flask import Flask
+
+from src.api.routes import comparison_window
+
+DAY = 86400
+START = 1_700_000_000
+
+
+def _window(days, mode):
+    with Flask(__name__).test_request_context(f'/?compare={mode}'):
+        return comparison_window(days, START)
+
+
+def test_previous_period_ends_where_the_current_window_starts():
+    window = _window(30, 'previous_period')
+    assert window['prev_end'] == START
+    assert window['prev_start'] == START - 30 * DAY
+
+
+@pytest.mark.parametrize('days', [30, 364, 365])
+def test_previous_year_does_not_overlap(days):
+    window = _window(days, 'previous_year')
+    assert window['prev_end'] <= START
+    assert window['prev_end'] - window['prev_start'] == days * DAY
+    assert window['prev_start'] == START - 365 * DAY
+
+
+def test_previous_year_boundary_is_exact():
+    # [start - 365d, start) against created >= start: adjacent, not overlapping
+    assert _window(365, 'previous_year')['prev_end'] == START
+
+
+def test_previous_year_rejects_longer_windows():
+    with pytest.raises(ValueError):
+        _window(366, 'previous_year')
+    with pytest.raises(ValueError):
+        _window(730, 'previous_year')
@@ -0,0 +1,88 @@
+"""
+Compiled stock forecaster: the lookup tables give the same forecasts as the
+XGBoost model path, on both sides of every split threshold, and months the
+tables do not cover fall back to the model.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from sklearn.preprocessing import StandardScaler
+from xgboost import XGBRegressor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'New_ML_Models', 'Guide_to_use'))
+
+from guide import BoosterPredictor, StockForecaster, _scaler_functions, qty_thresholds
+
+CATEGORY = 'Tiny'
+DAYS = 30
+
+
+@pytest.fixture(scope='module')
+def forecaster():
+    rng = np.random.default_rng(0)
+    months = rng.integers(1, 13, 2000)
+    qty = rng.gamma(2.0, 40.0, 2000)
+    target = 0.8 * qty + 5 * np.sin(months) + rng.normal(0, 3, 2000)
+    scaler = StandardScaler().fit(qty.reshape(-1, 1))
+    X = np.column_stack([months, scaler.transform(qty.reshape(-1, 1))[:, 0]])
+    model = XGBRegressor(n_estimators=25, max_depth=3, learning_rate=0.3, random_state=0)
+    model.fit(X, scaler.transform(target.reshape(-1, 1))[:, 0])
+
+    forecaster = StockForecaster.__new__(StockForecaster)
+    forecaster.model = {CATEGORY: BoosterPredictor(model)}
+    forecaster.scaler = {CATEGORY: scaler}
+    forecaster.compiled = None
+    forecaster.compile()
+    return forecaster
+
+
+def _quantities(forecaster):
+    """Starting quantities on both sides of every threshold, plus a grid over the whole range"""
+    transform, inverse = _scaler_functions(forecaster.scaler[CATEGORY])
+    thresholds = qty_thresholds(forecaster.model[CATEGORY].booster)
+    edges = np.concatenate([
+        thresholds,
+        np.nextafter(thresholds, np.float32(-np.inf)),
+        np.nextafter(thresholds, np.float32(np.inf)),
+    ]).astype(np.float64)
+    qty = np.concatenate([inverse(edges), np.linspace(-50, 2 * inverse(thresholds.astype(np.float64)).max(), 500)])
+    return qty, thresholds, transform
+
+
+def test_quantities_hit_every_interval(forecaster):
+    qty, thresholds, transform = _quantities(forecaster)
+    assert len(thresholds) > 10
+    intervals = np.searchsorted(thresholds, transform(qty).astype(np.float32), side='right')
+    assert set(intervals.tolist()) == set(range(len(thresholds) + 1))
+
+
+@pytest.mark.parametrize('month', range(1, 13))
+def test_compiled_matches_models(forecaster, month):
+    qty, _, _ = _quantities(forecaster)
+    categories = [CATEGORY] * len(qty)
+    assert forecaster.compiled.covers(categories, month)
+    compiled = forecaster.predict_many(categories, month, qty, DAYS)
+    expected = forecaster.predict_many(categories, month, qty, DAYS, use_compiled=False)
+    np.testing.assert_allclose(compiled, expected, rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize('month', [np.nan, 0, 13, 6.5])
+def test_uncovered_months_use_the_models(forecaster, month):
+    qty, _, _ = _quantities(forecaster)
+    categories = [CATEGORY] * len(qty)
+    assert not forecaster.compiled.covers(categories, month)
+    served = forecaster.predict_many(categories, month, qty, DAYS)
+    expected = forecaster.predict_many(categories, month, qty, DAYS, use_compiled=False)
+    np.testing.assert_array_equal(served, expected)
+    assert forecaster.predict(CATEGORY, month, float(qty[0]), DAYS) == pytest.approx(expected[0, -1], rel=1e-9)
+
+
+def test_mixed_months_fall_back_together(forecaster):
+    months = np.array([6, 13, np.nan, 1])
+    assert not forecaster.compiled.covers([CATEGORY] * 4, months)
+    served = forecaster.predict_many([CATEGORY] * 4, months, 40.0, DAYS)
+    expected = forecaster.predict_many([CATEGORY] * 4, months, 40.0, DAYS, use_compiled=False)
+    np.testing.assert_array_equal(served, expected)
@@ -0,0 +1,117 @@
+"""
+Item categories: the keyword automaton gives the same category as checking
+each category's keywords in order, and a changed keyword table reclassifies
+stored rows.
+"""
+
+import random
+import sqlite3
+
+import pytest
+
+from src.services import item_categories
+from src.services.item_categories import (
+    CATEGORY_KEYWORDS, FALLBACK_CATEGORY, KEYWORDS_VERSION, categorize, load_item_categories,
+    refresh_item_categories
+)
+
+
+def reference_categorize(title, default=None):
+    """The nested loops the automaton replaces: first category with any keyword in the title wins"""
+    if not title:
+        return default
+    lower = title.lower()
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if any(keyword in lower for keyword in keywords):
+            return category
+    return default
+
+
+OVERLAPPING_TITLES = [
+    'Iced Latte',               # 'te' (Beverages) inside 'latte' (Cappuccino, earlier)
+    'Latte',
+    'Green Tea',                # 'te' and 'tea', both Beverages
+    'Lille box',                # 'lille box' and 'lille', same category
+    'Lille',
+    'Lille Mellem box',         # Lille_box comes before Mellem_box
+    'Mellem box med cola',      # Sodavand comes first of all
+    'Beer battered fish',       # Øl before Beverages ('te') and Main_Courses
+    'Ginger shot',              # 'gin' inside a word
+    'Drumstick',                # 'rum' inside a word
+    'Pale Ale',
+    'Sparkling water',          # Vand before the 'te' in 'water'
+    'Hot Dog',                  # 'hot dog' with a space
+    'ØL',                       # non-ASCII, upper case
+    'Fadøl 40cl',               # 'fadøl' and 'øl'
+    'Chicken Caesar Salad',     # Main_Courses before Salads_&_Greens
+    'Tempura rulle',            # 'te' (Beverages) before Handhelds and Sushi_&_Asian
+    'Service charge',
+    'Unknown thing',            # no keyword
+    'tttttt',
+    '',
+    None,
+]
+
+
+@pytest.mark.parametrize('title', OVERLAPPING_TITLES)
+def test_matches_reference_on_overlapping_keywords(title):
+    assert categorize(title) == reference_categorize(title)
+    assert categorize(title, FALLBACK_CATEGORY) == reference_categorize(title, FALLBACK_CATEGORY)
+
+
+def test_matches_reference_on_random_titles():
+    keywords = [keyword for words in CATEGORY_KEYWORDS.values() for keyword in words]
+    # Keyword fragments make near misses and keywords split across words
+    pieces = keywords + [keyword[:len(keyword) // 2] for keyword in keywords] + ['', ' ', 'x', 'Ø', 'æ']
+    rng = random.Random(0)
+    for _ in range(5000):
+        title = ''.join(rng.choice(pieces) for _ in range(rng.randint(1, 4)))
+        if rng.random() < 0.5:
+            title = title.upper()
+        assert categorize(title) == reference_categorize(title), title
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE dim_items (id INTEGER PRIMARY KEY, title TEXT)")
+    conn.executemany(
+        "INSERT INTO dim_items (id, title) VALUES (?, ?)",
+        [(item_id, title) for item_id, title in enumerate(OVERLAPPING_TITLES, start=1)]
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def _stored(conn):
+    return dict(conn.execute("SELECT item_id, category FROM dim_item_category").fetchall())
+
+
+def test_refresh_classifies_every_item_once(conn):
+    assert refresh_item_categories(conn) == len(OVERLAPPING_TITLES)
+    assert refresh_item_categories(conn) == 0
+    assert _stored(conn) == {
+        item_id: reference_categorize(title, FALLBACK_CATEGORY)
+        for item_id, title in enumerate(OVERLAPPING_TITLES, start=1)
+    }
+
+
+def test_keyword_table_change_reclassifies_stored_rows(conn, monkeypatch):
+    refresh_item_categories(conn)
+    expected = _stored(conn)
+
+    # Rows written under an older keyword table, with a category it gave
+    conn.execute("UPDATE dim_item_category SET category = 'Stale', keywords_version = 'older'")
+    conn.commit()
+    assert set(load_item_categories(conn, list(expected), store=False).values()) != {'Stale'}
+    assert load_item_categories(conn, list(expected), store=False) == expected
+
+    assert refresh_item_categories(conn) == len(expected)
+    assert _stored(conn) == expected
+    assert {row[0] for row in conn.execute("SELECT keywords_version FROM dim_item_category")} == {KEYWORDS_VERSION}
+
+    # A new version (the keyword table changed) makes every current row stale again
+    monkeypatch.setattr(item_categories, 'KEYWORDS_VERSION', 'newer')
+    assert refresh_item_categories(conn) == len(expected)
+    assert refresh_item_categories(conn) == 0
@@ -0,0 +1,117 @@
+"""
+Rollup refreshes: every order line is counted exactly once, even when two
+refreshes run over the same database at the same time.
+"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from src.services.rollups import refresh_heatmap_rollups, refresh_item_rollups
+
+DAY = 86400
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'rollups.db')
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """
+        CREATE TABLE fct_order_items (
+            id INTEGER PRIMARY KEY, order_id INTEGER, item_id INTEGER,
+            created INTEGER, quantity REAL, price REAL
+        )
+        """
+    )
+    conn.executemany(
+        "INSERT INTO fct_order_items (order_id, item_id, created, quantity, price) VALUES (?, ?, ?, ?, ?)",
+        [(order_id, order_id % 7, 1_700_000_000 + (order_id % 30) * DAY, 1 + order_id % 3, 10.0)
+         for order_id in range(2000)]
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _totals(path):
+    conn = sqlite3.connect(path)
+    try:
+        rolled = conn.execute("SELECT SUM(quantity), SUM(orders), SUM(revenue) FROM agg_item_daily").fetchone()
+        stats = conn.execute("SELECT SUM(total_qty), SUM(times_ordered) FROM item_stats").fetchone()
+        source = conn.execute("SELECT SUM(quantity), COUNT(*), SUM(quantity * price) FROM fct_order_items").fetchone()
+    finally:
+        conn.close()
+    return rolled, stats, source
+
+
+def test_concurrent_refreshes_count_each_line_once(db_path):
+    barrier = threading.Barrier(2)
+    errors = []
+
+    def refresh():
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            barrier.wait()
+            refresh_item_rollups(conn, chunk_size=50)
+        except Exception as e:  # surfaced by the assertion below
+            errors.append(e)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=refresh) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    rolled, stats, source = _totals(db_path)
+    assert rolled == pytest.approx(source)
+    assert stats == pytest.approx(source[:2])
+
+
+def test_repeated_refresh_only_consumes_new_lines(db_path):
+    conn = sqlite3.connect(db_path)
+    assert refresh_item_rollups(conn) == 2000
+    assert refresh_item_rollups(conn) == 0
+
+    conn.execute(
+        "INSERT INTO fct_order_items (order_id, item_id, created, quantity, price) VALUES (5000, 1, ?, 4, 2.5)",
+        (1_700_000_000,)
+    )
+    conn.commit()
+    assert refresh_item_rollups(conn) == 1
+    conn.close()
+
+    rolled, stats, source = _totals(db_path)
+    assert rolled == pytest.approx(source)
+    assert stats == pytest.approx(source[:2])
+
+
+def test_heatmap_counts_lines_added_after_their_order(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE dim_items (id INTEGER PRIMARY KEY, title TEXT)")
+    conn.execute("CREATE TABLE fct_orders (id INTEGER, place_id INTEGER, created INTEGER, total_amount REAL)")
+    conn.execute("DELETE FROM fct_order_items")
+    conn.execute("INSERT INTO fct_orders VALUES (1, 10, 1700000000, 30.0)")
+    conn.execute(
+        "INSERT INTO fct_order_items (order_id, item_id, created, quantity, price) VALUES (1, 5, 1700000000, 2, 10.0)"
+    )
+    conn.commit()
+    assert refresh_heatmap_rollups(conn) == 1
+
+    # A late line for the same order adds quantity and revenue, not a second order
+    conn.execute(
+        "INSERT INTO fct_order_items (order_id, item_id, created, quantity, price) VALUES (1, 6, 1700000060, 1, 10.0)"
+    )
+    conn.commit()
+    assert refresh_heatmap_rollups(conn) == 1
+
+    rows = conn.execute(
+        "SELECT place_id, SUM(orders), SUM(quantity), SUM(revenue) FROM agg_heatmap "
+        "WHERE category = '' GROUP BY place_id ORDER BY place_id"
+    ).fetchall()
+    conn.close()
+    assert rows == [(0, 1, 3.0, 30.0), (10, 1, 3.0, 30.0)]